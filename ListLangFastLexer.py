@@ -0,0 +1,173 @@
+import re
+from antlr4 import Token
+from antlr4.CommonTokenFactory import CommonTokenFactory
+from antlr4.Token import CommonToken
+from antlr4.error.ErrorListener import ConsoleErrorListener, ProxyErrorListener
+from antlr4.Lexer import TokenSource
+
+from ListLangDenterHelper import ListLangDenterHelper
+from gen.ListLangLexer import ListLangLexer
+from gen.ListLangParser import ListLangParser
+
+
+class ListLangFastLexerBase(TokenSource):
+    """
+    Лексер на регулярных выражениях, выдающий те же токены, что и сгенерированный ListLangLexer
+    (без INDENT/DEDENT — их добавляет ListLangDenterHelper в ListLangFastLexer).
+
+    Правило ANTLR «самое длинное совпадение, при равенстве — первое правило» воспроизводится порядком
+    альтернатив в общем регулярном выражении.
+    """
+
+    # Типы токенов берутся из сгенерированного лексера, чтобы не разойтись с грамматикой
+    NEWLINE = ListLangLexer.NEWLINE
+    NAME = ListLangLexer.NAME
+    OPEN_PAREN, CLOSE_PAREN = ListLangLexer.OPEN_PAREN, ListLangLexer.CLOSE_PAREN
+    OPEN_BRACE, CLOSE_BRACE = ListLangLexer.OPEN_BRACE, ListLangLexer.CLOSE_BRACE
+    OPEN_BRACKET, CLOSE_BRACKET = ListLangLexer.OPEN_BRACKET, ListLangLexer.CLOSE_BRACKET
+
+    KEYWORDS = {
+        'func': ListLangLexer.FUNC, 'return': ListLangLexer.RETURN, 'if': ListLangLexer.IF,
+        'else': ListLangLexer.ELSE, 'switch': ListLangLexer.SWITCH, 'case': ListLangLexer.CASE,
+        'while': ListLangLexer.WHILE, 'for': ListLangLexer.FOR, 'in': ListLangLexer.IN,
+        'default': ListLangLexer.DEFAULT, 'break': ListLangLexer.BREAK,
+        'true': ListLangLexer.BOOLEAN, 'false': ListLangLexer.BOOLEAN,
+    }
+    # Операторы и разделители: литералы грамматики -> тип токена
+    OPERATORS = {name.strip("'"): i for i, name in enumerate(ListLangParser.literalNames) if name.startswith("'")}
+
+    SKIP = None
+    # Порядок групп важен: номер группы (lastindex) определяет тип токена
+    TOKEN_RE = re.compile(r'''
+        ([ \t]+)                                  # 1 WS (skip)
+      | (\r?\n)                                   # 2 NEWLINE
+      | ([A-Za-z][A-Za-z0-9_]*)                   # 3 NAME / ключевые слова / BOOLEAN
+      | ([0-9]*\.[0-9]+|[0-9]+\.)                 # 4 FLOAT_NUMBER
+      | ([1-9][0-9]*|0+)                          # 5 DECIMAL_INTEGER
+      | ("(?:[^"\\]|\\.)*")                       # 6 STRING
+      | (\#[^\r\n]*)                              # 7 COMMENT (skip)
+      | (&&|\|\||==|<=|>=|!=|[!&<>=+\-*/%.,:;(){}\[\]])   # 8 операторы и разделители
+    ''', re.VERBOSE | re.DOTALL)
+    GROUP_TYPES = (None, SKIP, ListLangLexer.NEWLINE, ListLangLexer.NAME, ListLangLexer.FLOAT_NUMBER,
+                   ListLangLexer.DECIMAL_INTEGER, ListLangLexer.STRING, SKIP, None)
+
+    def __init__(self, input=None):
+        self._input = input
+        self._data = input.strdata
+        self._pos = 0
+        self.line = 1
+        self.column = 0
+        self._factory = CommonTokenFactory.DEFAULT
+        self._listeners = [ConsoleErrorListener.INSTANCE]
+        self._source = (self, input)
+
+    # --- Совместимость с интерфейсом лексера ANTLR ---
+    def getSourceName(self):
+        return self._input.getSourceName()
+
+    def getInputStream(self):
+        return self._input
+
+    def addErrorListener(self, listener):
+        self._listeners.append(listener)
+
+    def removeErrorListeners(self):
+        self._listeners = []
+
+    def getErrorListenerDispatch(self):
+        return ProxyErrorListener(self._listeners)
+
+    def nextToken(self):
+        text = self._data
+        size = len(text)
+        match = self.TOKEN_RE.match
+        while True:
+            pos = self._pos
+            if pos >= size:
+                return self._make_token(Token.EOF, pos, pos - 1, "<EOF>")
+
+            m = match(text, pos)
+            if m is None:
+                self._recover(pos)
+                continue
+
+            end = m.end()
+            group = m.lastindex
+            token_type = self.GROUP_TYPES[group]
+            value = m.group(group)
+            if group == 3:
+                token_type = self.KEYWORDS.get(value, self.NAME)
+            elif group == 8:
+                token_type = self.OPERATORS[value]
+
+            token = None
+            if token_type is not self.SKIP:
+                token = self._make_token(token_type, pos, end - 1, value)
+            self._advance(value, end)
+            if token is not None:
+                return token
+
+    def _make_token(self, token_type, start, stop, value):
+        # Поля заполняются напрямую: конструктор CommonToken заметно медленнее на сотнях тысяч токенов
+        token = CommonToken.__new__(CommonToken)
+        token.source = self._source
+        token.type = token_type
+        token.channel = Token.DEFAULT_CHANNEL
+        token.start = start
+        token.stop = stop
+        token.tokenIndex = -1
+        token.line = self.line
+        token.column = self.column
+        token._text = value
+        return token
+
+    def _advance(self, consumed, end):
+        newlines = consumed.count('\n')
+        if newlines:
+            self.line += newlines
+            self.column = len(consumed) - consumed.rfind('\n') - 1
+        else:
+            self.column += len(consumed)
+        self._pos = end
+
+    def _recover(self, pos):
+        """Ошибка распознавания: повторяет поведение ANTLR (сообщение и пропуск тех же символов)."""
+        text = self._data
+        size = len(text)
+        # Сколько символов успевает поглотить ATN до отказа: '|' и '\r' — префиксы '||' и '\r\n',
+        # незакрытая строка читается до конца файла, остальные символы отвергаются сразу
+        char = text[pos]
+        if char in '|\r':
+            stop = pos + 1
+        elif char == '"':
+            stop = size
+        else:
+            stop = pos
+        shown = text[pos:stop + 1]
+        message = "token recognition error at: '" + self.getErrorDisplay(shown) + "'"
+        self.getErrorListenerDispatch().syntaxError(self, None, self.line, self.column, message, None)
+        # recover(): пропускает еще один символ, если не достигнут конец файла
+        end = min(stop + 1, size)
+        self._advance(text[pos:end], end)
+
+    ERROR_DISPLAY = {'\n': '\\n', '\t': '\\t', '\r': '\\r'}
+
+    def getErrorDisplay(self, s):
+        return ''.join(self.ERROR_DISPLAY.get(c, c) for c in s)
+
+
+class ListLangFastLexer(ListLangFastLexerBase):
+    """Быстрый лексер с обработкой отступов: drop-in замена ListLangLexer для CommonTokenStream."""
+
+    denter = None
+
+    def nextToken(self):
+        if not self.denter:
+            self.denter = ListLangDenterHelper(
+                self,
+                self.NEWLINE,
+                ListLangParser.INDENT,
+                ListLangParser.DEDENT,
+                False
+            )
+        return self.denter.next_token()
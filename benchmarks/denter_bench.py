@@ -0,0 +1,103 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from antlr4 import Token
+from antlr4.Token import CommonToken
+
+from ListLangDenterHelper import ListLangDenterHelper
+from gen.ListLangLexer import ListLangLexer
+from gen.ListLangParser import ListLangParser
+
+# Микробенчмарк ListLangDenterHelper: синтетический поток токенов (строки с вложенностью до MAX_DEPTH уровней,
+# периодические выходы на нулевой отступ — пачки DEDENT, скобки с переносом строки) подается через лексер-заглушку.
+# Тот же поток без помощника дает базовое время генерации токенов; разница — накладные расходы помощника.
+
+MAX_DEPTH = 30
+LINE = (ListLangLexer.NAME, ListLangLexer.ASSIGNMENT, ListLangLexer.NAME, ListLangLexer.ADD,
+        ListLangLexer.DECIMAL_INTEGER)
+BRACKETED = (ListLangLexer.NAME, ListLangLexer.OPEN_PAREN, ListLangLexer.NAME, ListLangLexer.COMMA,
+             ListLangLexer.NEWLINE, ListLangLexer.NAME, ListLangLexer.CLOSE_PAREN)
+
+
+def make_token(token_type, line, column):
+    token = CommonToken(type=token_type)
+    token.line, token.column = line, column
+    return token
+
+
+def synthetic_tokens(count):
+    """Ровно count токенов без EOF: отступ растет на каждой строке и сбрасывается каждые MAX_DEPTH строк."""
+    produced = 0
+    line = 1
+    while produced < count:
+        column = 4 * (line % MAX_DEPTH)
+        for token_type in (BRACKETED if line % 7 == 0 else LINE):
+            yield make_token(token_type, line, column)
+            column += 2
+            produced += 1
+        yield make_token(ListLangLexer.NEWLINE, line, column)
+        produced += 1
+        line += 1
+
+
+class StubLexerBase:
+    OPEN_PAREN, CLOSE_PAREN = ListLangLexer.OPEN_PAREN, ListLangLexer.CLOSE_PAREN
+    OPEN_BRACE, CLOSE_BRACE = ListLangLexer.OPEN_BRACE, ListLangLexer.CLOSE_BRACE
+    OPEN_BRACKET, CLOSE_BRACKET = ListLangLexer.OPEN_BRACKET, ListLangLexer.CLOSE_BRACKET
+    # Позиция лексера: CommonToken читает ее у источника при создании INDENT/DEDENT
+    line = column = 0
+
+    def __init__(self, count):
+        self._input = None
+        self._tokens = synthetic_tokens(count)
+        self._eof = make_token(Token.EOF, 0, 0)
+
+    def nextToken(self):
+        return next(self._tokens, self._eof)
+
+
+class StubLexer(StubLexerBase):
+    """Заглушка с обработкой отступов — так же, как ListLangLexer и ListLangFastLexer."""
+
+    denter = None
+
+    def nextToken(self):
+        if not self.denter:
+            self.denter = ListLangDenterHelper(self, ListLangLexer.NEWLINE, ListLangParser.INDENT,
+                                               ListLangParser.DEDENT, False)
+        return self.denter.next_token()
+
+
+def drain(lexer):
+    """Время чтения всех токенов до EOF и хэш последовательности (тип, строка, столбец)."""
+    digest = hashlib.sha256()
+    start = time.perf_counter()
+    while True:
+        token = lexer.nextToken()
+        digest.update(f'{token.type},{token.line},{token.column};'.encode('ascii'))
+        if token.type == Token.EOF: break
+    return time.perf_counter() - start, digest.hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ListLangDenterHelper micro-benchmark")
+    parser.add_argument("--tokens", help="Number of synthetic tokens", type=int, default=1_000_000)
+    parser.add_argument("--repeat", help="Runs of each variant; the best time is reported", type=int, default=3)
+    args = parser.parse_args()
+
+    baseline = min(drain(StubLexerBase(args.tokens))[0] for _ in range(args.repeat))
+    runs = [drain(StubLexer(args.tokens)) for _ in range(args.repeat)]
+    denter = min(seconds for seconds, _ in runs)
+    print(f"tokens:       {args.tokens}")
+    print(f"pass-through: {baseline:.3f} s")
+    print(f"denter:       {denter:.3f} s (overhead {denter - baseline:.3f} s)")
+    print(f"stream hash:  {runs[0][1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import parse_source
+from compiler.compiler import WASMCompiler
+
+# Бенчмарк кодогенерации длинного выражения 'y = x * 2 + x * 2 + ...': дерево BinaryOp глубиной в число слагаемых.
+# Если типы выводятся заново на каждом уровне, время растет квадратично; с аннотацией типов — линейно.
+
+# Рекурсивные проходы по дереву глубиной ~N требуют больше стандартного предела рекурсии
+RECURSION_LIMIT = 100_000
+
+
+def expression_source(terms):
+    return "x = 3\ny = " + " + ".join(["x * 2"] * terms) + "\nwrite(y)\n"
+
+
+def codegen_time(terms, repeat):
+    """Лучшее время WASMCompiler.compile (без разбора) для выражения из terms слагаемых."""
+    source = expression_source(terms)
+    best = None
+    for _ in range(repeat):
+        # Компилятор аннотирует узлы на месте, поэтому AST строится для каждого прогона заново
+        ast = parse_source(source)
+        start = time.perf_counter()
+        WASMCompiler().compile(ast, io.StringIO())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Codegen benchmark on a long expression")
+    parser.add_argument("terms", help="Expression sizes in terms", type=int, nargs="*",
+                        default=[1000, 2000, 5000, 10000])
+    parser.add_argument("--repeat", help="Runs per size; the best time is reported", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(RECURSION_LIMIT)
+    for terms in args.terms:
+        seconds = codegen_time(terms, args.repeat)
+        print(f"{terms:>7} terms: codegen {seconds:.3f} s, {seconds / terms * 1e6:.1f} us/term")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from run import compile_source, WasmWorker
+
+# Бенчмарк выноса инвариантов из циклов: вложенные циклы, в теле которых пересчитываются выражения от
+# неизменяемых переменных и длина неизменяемого списка. -O1 (без IR) сравнивается с -O2; вывод обоих должен совпасть.
+
+
+def loop_source(iterations):
+    return (
+        "a = 3\n"
+        "b = 7\n"
+        "x = 0.5\n"
+        "L = []\n"
+        "L.add(1)\n"
+        "L.add(2)\n"
+        "s = 0\n"
+        "f = 0.0\n"
+        "i = 0\n"
+        f"while i < {iterations}:\n"
+        "    j = 0\n"
+        "    while j < 100:\n"
+        "        s = s + (a * b + a % 5) * L.len() + j\n"
+        "        f = f + x * 2.5 + a\n"
+        "        j = j + 1\n"
+        "    k = a * b - L.len()\n"
+        "    s = s - k\n"
+        "    i = i + 1\n"
+        "write(s)\n"
+        "write(f)\n"
+    )
+
+
+def measure(source, opt_level, worker, repeat):
+    """(лучшее время компиляции, лучшее время выполнения, вывод) на уровне opt_level."""
+    compiled = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        wasm_code = compile_source(source, opt_level=opt_level)
+        elapsed = time.perf_counter() - start
+        compiled = elapsed if compiled is None else min(compiled, elapsed)
+    best, output = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = worker.run(wasm_code)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return compiled, best, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loop-invariant code motion benchmark (-O1 vs -O2)")
+    parser.add_argument("iterations", help="Outer loop trip counts (the inner loop runs 100 times)", type=int,
+                        nargs="*", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", help="Runs per level; the best time is reported", type=int, default=3)
+    args = parser.parse_args()
+
+    with WasmWorker() as worker:
+        for iterations in args.iterations:
+            source = loop_source(iterations)
+            results = {level: measure(source, level, worker, args.repeat) for level in (1, 2)}
+            if results[1][2] != results[2][2]:
+                sys.exit(f"output differs between -O1 and -O2 for {iterations} iterations")
+            for level, (compiled, run_time, _) in results.items():
+                print(f"{iterations:>8} x 100, -O{level}: compile {compiled * 1000:.1f} ms, run {run_time:.3f} s")
+            print(f"{'':>8}        speedup {results[1][1] / results[2][1]:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import hashlib
+import os
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from antlr4 import InputStream, CommonTokenStream
+
+from ListLangFastLexer import ListLangFastLexer
+from run import parse_tree
+
+# Бенчмарк двухэтапного разбора: сгенерированная программа из функций с вложенными логическими и арифметическими
+# выражениями разбирается сначала SLL с откатом на LL (как по умолчанию), затем сразу в режиме LL. Кэш DFA у
+# парсеров ANTLR общий для процесса, поэтому каждый режим замеряется в отдельном интерпретаторе.
+
+MODES = ('sll', 'll')
+
+
+def expression(rng, depth):
+    if depth == 0 or rng.random() < 0.2:
+        return rng.choice(['a', 'b', 'n', str(rng.randint(0, 99)), 'ls.len()', 'g(a, 1)'])
+    op = rng.choice(['+', '-', '*', '/', '%', '<', '>=', '==', '!=', '&&', '||'])
+    left, right = expression(rng, depth - 1), expression(rng, depth - 1)
+    if rng.random() < 0.3: return f"!({left} {op} {right})"
+    return f"({left} {op} {right})" if rng.random() < 0.5 else f"{left} {op} {right}"
+
+
+def program_source(functions, seed=1):
+    """functions функций по ~12 строк: присваивания, if/else, while и return с выражениями глубины до 4."""
+    rng = random.Random(seed)
+    lines = ["func g(p, q):", "    return p + q", ""]
+    for i in range(functions):
+        lines += [
+            f"func f{i}(a, b):",
+            "    ls = []",
+            f"    n = {expression(rng, 3)}",
+            f"    if {expression(rng, 4)}:",
+            f"        n = {expression(rng, 4)}",
+            "    else:",
+            f"        ls.add({expression(rng, 3)})",
+            f"    while n < {rng.randint(1, 9)} && {expression(rng, 2)}:",
+            f"        n = n + {expression(rng, 2)}",
+            f"    a, b = {expression(rng, 2)}, {expression(rng, 2)}",
+            f"    return {expression(rng, 4)}",
+            "",
+        ]
+    lines += [f"write(f{i}(1, 2))" for i in range(0, functions, 50)]
+    return "\n".join(lines) + "\n"
+
+
+def parse_times(source, mode, repeat):
+    """Время разбора каждого прогона (первый — с пустым DFA) и хэш построенного AST."""
+    times, digest = [], None
+    for _ in range(repeat):
+        stream = CommonTokenStream(ListLangFastLexer(InputStream(source)))
+        stream.fill()
+        start = time.perf_counter()
+        listener, parser = parse_tree(stream, two_stage=mode == 'sll', build_tree=False)
+        times.append(time.perf_counter() - start)
+        if parser.getNumberOfSyntaxErrors():
+            sys.exit("generated program has syntax errors")
+        digest = hashlib.sha256(repr(listener.get_ast()).encode('utf-8')).hexdigest()[:16]
+    return times, digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SLL-first vs full LL parsing benchmark")
+    parser.add_argument("--functions", help="Number of generated functions", type=int, default=1000)
+    parser.add_argument("--repeat", help="Parses per mode in one process", type=int, default=3)
+    parser.add_argument("--mode", help=argparse.SUPPRESS, choices=MODES)
+    args = parser.parse_args()
+
+    source = program_source(args.functions)
+    if args.mode:
+        times, digest = parse_times(source, args.mode, args.repeat)
+        print(f"{args.mode:>3}: " + " / ".join(f"{seconds:.2f}" for seconds in times) + f" s, ast {digest}")
+        return
+    print(f"program: {args.functions} functions, {source.count(chr(10))} lines")
+    for mode in MODES:
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode, "--functions", str(args.functions),
+                        "--repeat", str(args.repeat)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
-from compiler.ast_nodes import Program, Function, Parameter, Assignment, ReturnStatement, BreakStatement, IfStatement, \
+from compiler.ast_nodes import ASTNode, Program, Function, Parameter, Assignment, ReturnStatement, BreakStatement, IfStatement, \
     WhileStatement, ForStatement, SwitchStatement, CaseBlock, UnaryOp, BinaryOp, MethodCall, MemberAccess, FunctionCall, \
     Variable, Literal, Type
+from antlr4.tree.Tree import ParseTreeListener
+
 from gen.ListLangParser import ListLangParser
 from gen.ListLangParserVisitor import ListLangParserVisitor
 
@@ -9,6 +11,13 @@ class ASTBuilder(ListLangParserVisitor):
     def __init__(self):
         self.errors = []
 
+    def visit(self, tree):
+        node = tree.accept(self)
+        # Позиция узла — первый токен правила (узел, пришедший из вложенного правила, ее уже имеет)
+        if isinstance(node, ASTNode) and not node.line:
+            set_position(node, tree)
+        return node
+
     def visitProgram(self, ctx: ListLangParser.ProgramContext):
         functions = []
         statements = []
@@ -216,32 +225,224 @@ class ASTBuilder(ListLangParserVisitor):
         return arguments
 
     def visitLiteral(self, ctx: ListLangParser.LiteralContext):
-        if ctx.DECIMAL_INTEGER():
-            value = int(ctx.DECIMAL_INTEGER().getText())
-            return Literal(value=value, value_type=Type.INT)
-
-        if ctx.FLOAT_NUMBER():
-            text = ctx.FLOAT_NUMBER().getText()
-            if text.endswith('.'):
-                text += '0'
-            elif text.startswith('.'):
-                text = '0' + text
-            value = float(text)
-            return Literal(value=value, value_type=Type.FLOAT)
-
-        if ctx.STRING():
-            text = ctx.STRING().getText()
-            # delete "
-            value = text[1:-1]
-            value = value.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace('\\\\', '\\')
-            return Literal(value=value, value_type=Type.STRING)
-
-        if ctx.BOOLEAN():
-            value = ctx.BOOLEAN().getText() == 'true'
-            return Literal(value=value, value_type=Type.BOOL)
-
-        # empty list
-        if ctx.OPEN_BRACKET():
-            return Literal(value=[], value_type=Type.LIST)
+        return build_literal(ctx)
 
-        return None
+
+def set_position(node: ASTNode, ctx):
+    start = ctx.start
+    node.line = start.line
+    node.column = start.column
+
+
+def build_literal(ctx: ListLangParser.LiteralContext):
+    """Literal по контексту правила literal (нужны только токены, поэтому годится и без дерева разбора)"""
+    if ctx.DECIMAL_INTEGER():
+        value = int(ctx.DECIMAL_INTEGER().getText())
+        return Literal(value=value, value_type=Type.INT)
+
+    if ctx.FLOAT_NUMBER():
+        text = ctx.FLOAT_NUMBER().getText()
+        if text.endswith('.'):
+            text += '0'
+        elif text.startswith('.'):
+            text = '0' + text
+        value = float(text)
+        return Literal(value=value, value_type=Type.FLOAT)
+
+    if ctx.STRING():
+        text = ctx.STRING().getText()
+        # delete "
+        value = text[1:-1]
+        value = value.replace('\\n', '\n').replace('\\t', '\t').replace('\\"', '"').replace('\\\\', '\\')
+        return Literal(value=value, value_type=Type.STRING)
+
+    if ctx.BOOLEAN():
+        value = ctx.BOOLEAN().getText() == 'true'
+        return Literal(value=value, value_type=Type.BOOL)
+
+    # empty list
+    if ctx.OPEN_BRACKET():
+        return Literal(value=[], value_type=Type.LIST)
+
+    return None
+
+
+
+class ASTListener(ParseTreeListener):
+    """
+    Построение AST прямо во время разбора (parser.addParseListener, parser.buildParseTrees = False).
+
+    Дерево разбора не хранится: контекст правила живет, пока правило разбирается, а готовые узлы AST
+    копятся на стеке значений. На входе в правило запоминается высота стека, на выходе правило забирает
+    значения своих подправил и кладет свой узел. Токены доступны через ctx: при наличии слушателей
+    парсер добавляет их в контекст и без построения дерева.
+
+    Леворекурсивное expression: левый операнд завершается (exit) раньше, чем начинается (enter) контекст
+    бинарной операции, поэтому выражения берут со стека фиксированное число значений, а не «все с отметки».
+    """
+
+    def __init__(self):
+        self.values = []
+        self.marks = []
+        self.ast = None
+        # Исключение при построении; при синтаксической ошибке (или отказе SLL-прохода) события выхода
+        # приходят для недоразобранных правил — тогда результат все равно отбрасывается
+        self.error = None
+        self.handlers = {
+            ListLangParser.RULE_program: self._exit_program,
+            ListLangParser.RULE_simple_stmt: None,
+            ListLangParser.RULE_assignment_stmt: self._exit_assignment_stmt,
+            ListLangParser.RULE_target_list: self._exit_target_list,
+            ListLangParser.RULE_expression_stmt: None,
+            ListLangParser.RULE_return_stmt: self._exit_return_stmt,
+            ListLangParser.RULE_break_stmt: self._exit_break_stmt,
+            ListLangParser.RULE_compound_statement: None,
+            ListLangParser.RULE_suite: self._exit_suite,
+            ListLangParser.RULE_statement: self._exit_statement,
+            ListLangParser.RULE_stmt_list: self._collect,
+            ListLangParser.RULE_func_decl: self._exit_func_decl,
+            ListLangParser.RULE_parameter_list: self._collect,
+            ListLangParser.RULE_param: self._exit_param,
+            ListLangParser.RULE_if_statement: self._exit_if_statement,
+            ListLangParser.RULE_while_statement: self._exit_while_statement,
+            ListLangParser.RULE_for_statement: self._exit_for_statement,
+            ListLangParser.RULE_switch_statement: self._exit_switch_statement,
+            ListLangParser.RULE_case_block: self._exit_case_block,
+            ListLangParser.RULE_default_block: None,
+            ListLangParser.RULE_expression_list: self._collect,
+            ListLangParser.RULE_expression: self._exit_expression,
+            ListLangParser.RULE_atom: self._exit_atom,
+            ListLangParser.RULE_arg_list: self._collect,
+            ListLangParser.RULE_literal: self._exit_literal,
+        }
+
+    def get_ast(self):
+        """Готовый Program; вызывать только если разбор прошел без ошибок"""
+        if self.error is not None:
+            raise self.error
+        return self.ast
+
+    def enterEveryRule(self, ctx):
+        self.marks.append(len(self.values))
+
+    def exitEveryRule(self, ctx):
+        mark = self.marks.pop()
+        handler = self.handlers[ctx.getRuleIndex()]
+        # None — правило просто передает значение единственного подправила
+        if handler is None or self.error is not None:
+            return
+        try:
+            handler(ctx, mark)
+            values = self.values
+            if values and isinstance(values[-1], ASTNode) and not values[-1].line:
+                set_position(values[-1], ctx)
+        except Exception as e:
+            self.error = e
+
+    def _take(self, mark):
+        values = self.values[mark:]
+        del self.values[mark:]
+        return values
+
+    def _collect(self, ctx, mark):
+        # Списки: stmt_list, parameter_list, expression_list, arg_list
+        self.values.append(self._take(mark))
+
+    def _exit_program(self, ctx, mark):
+        functions = []
+        statements = []
+        for group in self._take(mark):
+            for stmt in group:
+                if isinstance(stmt, Function):
+                    functions.append(stmt)
+                else:
+                    statements.append(stmt)
+        self.ast = Program(functions=functions, statements=statements)
+        set_position(self.ast, ctx)
+
+    def _exit_statement(self, ctx, mark):
+        # stmt_list дает список, compound_statement — один узел, пустая строка — ничего
+        values = self._take(mark)
+        if not values:
+            self.values.append([])
+        elif isinstance(values[0], list):
+            self.values.append(values[0])
+        else:
+            self.values.append(values)
+
+    def _exit_suite(self, ctx, mark):
+        self.values.append([stmt for group in self._take(mark) for stmt in group])
+
+    def _exit_assignment_stmt(self, ctx, mark):
+        targets, values = self._take(mark)
+        self.values.append(Assignment(targets=targets, values=values))
+
+    def _exit_target_list(self, ctx, mark):
+        self.values.append([name.getText() for name in ctx.NAME()])
+
+    def _exit_return_stmt(self, ctx, mark):
+        self.values.append(ReturnStatement(values=self.values.pop()))
+
+    def _exit_break_stmt(self, ctx, mark):
+        self.values.append(BreakStatement())
+
+    def _exit_func_decl(self, ctx, mark):
+        values = self._take(mark)
+        parameters = values[0] if len(values) == 2 else []
+        self.values.append(Function(name=ctx.NAME().getText(), parameters=parameters, body=values[-1]))
+
+    def _exit_param(self, ctx, mark):
+        self.values.append(Parameter(name=ctx.NAME().getText(), by_reference=ctx.AMP() is not None))
+
+    def _exit_if_statement(self, ctx, mark):
+        values = self._take(mark)
+        else_body = values[2] if len(values) == 3 else []
+        self.values.append(IfStatement(condition=values[0], then_body=values[1], else_body=else_body))
+
+    def _exit_while_statement(self, ctx, mark):
+        condition, body = self._take(mark)
+        self.values.append(WhileStatement(condition=condition, body=body))
+
+    def _exit_for_statement(self, ctx, mark):
+        targets, iterables, body = self._take(mark)
+        self.values.append(ForStatement(targets=targets, iterables=iterables, body=body))
+
+    def _exit_switch_statement(self, ctx, mark):
+        values = self._take(mark)
+        # default_block оставляет список операторов, case_block — CaseBlock
+        default_case = values.pop() if isinstance(values[-1], list) else None
+        self.values.append(SwitchStatement(expression=values[0], cases=values[1:], default_case=default_case))
+
+    def _exit_case_block(self, ctx, mark):
+        value, body = self._take(mark)
+        self.values.append(CaseBlock(value=value, body=body))
+
+    def _exit_expression(self, ctx, mark):
+        values = self.values
+        if ctx.op is not None:
+            right = values.pop()
+            left = values.pop()
+            values.append(BinaryOp(operator=ctx.op.text, left=left, right=right))
+        elif ctx.NOT() is not None:
+            values.append(UnaryOp(operator="!", operand=values.pop()))
+        # atom: значение уже на стеке
+
+    def _exit_atom(self, ctx, mark):
+        values = self._take(mark)
+        names = ctx.NAME()
+        if not names:
+            # literal или выражение в скобках
+            node = values[0]
+        elif len(names) == 2 and ctx.OPEN_PAREN():
+            node = MethodCall(object_name=names[0].getText(), method_name=names[1].getText(),
+                              arguments=values[0] if values else [])
+        elif len(names) == 2:
+            node = MemberAccess(object_name=names[0].getText(), member_name=names[1].getText())
+        elif ctx.OPEN_PAREN():
+            node = FunctionCall(name=names[0].getText(), arguments=values[0] if values else [])
+        else:
+            node = Variable(name=names[0].getText())
+        self.values.append(node)
+
+    def _exit_literal(self, ctx, mark):
+        self.values.append(build_literal(ctx))
@@ -1,4 +1,4 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import List, Optional, Any
 from enum import Enum
 
@@ -36,42 +36,64 @@ class Type(Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
 class ASTNode:
-    """Base AST node."""
-    node_type: NodeType
-    line: int = 0
-    column: int = 0
+    """Base AST node.
+
+    Nodes use __slots__ instead of a per-instance __dict__: an AST of a large program holds hundreds of
+    thousands of them. `_fields` of a node class are its syntax fields: node_type/line/column followed by the
+    slots declared along its MRO (everything except inferred_type); __eq__, __repr__ and ir.clone go through them.
+    line/column are the position of the first token of the node (0 if unknown).
+    inferred_type is filled by the compiler's type-annotation pass and is not compared by __eq__.
+    """
+    __slots__ = ('node_type', 'line', 'column', 'inferred_type')
+    _fields = ('node_type', 'line', 'column')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = ASTNode._fields + tuple(name for klass in reversed(cls.__mro__) if klass is not ASTNode
+                                              for name in klass.__dict__.get('__slots__', ()))
+
+    def __init__(self, node_type: NodeType, line: int = 0, column: int = 0):
+        self.node_type = node_type
+        self.line = line
+        self.column = column
+        self.inferred_type = None
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None
+
+    def __repr__(self):
+        args = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{self.__class__.__name__}({args})'
 
 
-@dataclass
 class Program(ASTNode):
     """Root node of the AST. """
-    functions: List['Function'] = field(default_factory=list)
-    statements: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('functions', 'statements')
 
     def __init__(self, functions=None, statements=None):
         super().__init__(NodeType.PROGRAM)
-        self.functions = functions or []
-        self.statements = statements or []
+        self.functions: List['Function'] = functions or []
+        self.statements: List[ASTNode] = statements or []
 
 
-@dataclass
 class Function(ASTNode):
     """AST node representing a function."""
-    name: str = ""
-    parameters: List['Parameter'] = field(default_factory=list)
-    body: List[ASTNode] = field(default_factory=list)
-    return_type: Type = Type.VOID
+    __slots__ = ('name', 'parameters', 'body', 'return_type')
 
     def __init__(self, name, parameters=None, body=None):
         super().__init__(NodeType.FUNCTION)
-        self.name = name
-        self.parameters = parameters or []
-        self.body = body or []
+        self.name: str = name
+        self.parameters: List['Parameter'] = parameters or []
+        self.body: List[ASTNode] = body or []
+        self.return_type: Type = Type.VOID
 
 
-@dataclass
+@dataclass(slots=True)
 class Parameter:
     """Function parameter."""
     name: str = ""
@@ -79,166 +101,139 @@ class Parameter:
     type: Type = Type.UNKNOWN
 
 
-@dataclass
 class Assignment(ASTNode):
     """Assignment statement."""
-    targets: List[str] = field(default_factory=list)
-    values: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('targets', 'values')
 
     def __init__(self, targets, values):
         super().__init__(NodeType.ASSIGNMENT)
-        self.targets = targets
-        self.values = values
+        self.targets: List[str] = targets
+        self.values: List[ASTNode] = values
 
 
-@dataclass
 class IfStatement(ASTNode):
-    condition: ASTNode = None
-    then_body: List[ASTNode] = field(default_factory=list)
-    else_body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('condition', 'then_body', 'else_body')
 
     def __init__(self, condition, then_body, else_body=None):
         super().__init__(NodeType.IF_STATEMENT)
-        self.condition = condition
-        self.then_body = then_body
-        self.else_body = else_body or []
+        self.condition: ASTNode = condition
+        self.then_body: List[ASTNode] = then_body
+        self.else_body: List[ASTNode] = else_body or []
 
 
-@dataclass
 class WhileStatement(ASTNode):
-    condition: ASTNode = None
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('condition', 'body')
 
     def __init__(self, condition, body):
         super().__init__(NodeType.WHILE_STATEMENT)
-        self.condition = condition
-        self.body = body
+        self.condition: ASTNode = condition
+        self.body: List[ASTNode] = body
 
 
-@dataclass
 class ForStatement(ASTNode):
-    targets: List[str] = field(default_factory=list)
-    iterables: List[ASTNode] = field(default_factory=list)
-    body: List[ASTNode] = field(default_factory=list)
+    __slots__ = ('targets', 'iterables', 'body')
 
     def __init__(self, targets, iterables, body):
         super().__init__(NodeType.FOR_STATEMENT)
-        self.targets = targets
-        self.iterables = iterables
-        self.body = body
+        self.targets: List[str] = targets
+        self.iterables: List[ASTNode] = iterables
+        self.body: List[ASTNode] = body
 
 
-@dataclass
 class SwitchStatement(ASTNode):
-    expression: ASTNode = None
-    cases: List['CaseBlock'] = field(default_factory=list)
-    default_case: Optional[List[ASTNode]] = None
+    __slots__ = ('expression', 'cases', 'default_case')
 
     def __init__(self, expression, cases, default_case=None):
         super().__init__(NodeType.SWITCH_STATEMENT)
-        self.expression = expression
-        self.cases = cases
-        self.default_case = default_case
+        self.expression: ASTNode = expression
+        self.cases: List['CaseBlock'] = cases
+        self.default_case: Optional[List[ASTNode]] = default_case
 
 
-@dataclass
+@dataclass(slots=True)
 class CaseBlock:
     value: ASTNode
-    body: List[ASTNode] = field(default_factory=list)
+    body: List[ASTNode]
 
 
-@dataclass
 class ReturnStatement(ASTNode):
-    values: Optional[ASTNode] = field(default_factory=list)
+    __slots__ = ('values',)
 
     def __init__(self, values):
         super().__init__(NodeType.RETURN_STATEMENT)
-        self.values = values
+        self.values: List[ASTNode] = values
 
 
-@dataclass
 class BreakStatement(ASTNode):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(NodeType.BREAK_STATEMENT)
 
 
-@dataclass
 class Literal(ASTNode):
-    value: Any = None
-    type: Type = Type.UNKNOWN
+    __slots__ = ('value', 'type')
 
     def __init__(self, value, value_type):
         super().__init__(NodeType.LITERAL)
-        self.value = value
-        self.type = value_type
+        self.value: Any = value
+        self.type: Type = value_type
 
 
-@dataclass
 class Variable(ASTNode):
-    name: str = ""
-    var_type: Type = Type.UNKNOWN
+    __slots__ = ('name', 'var_type')
 
     def __init__(self, name):
         super().__init__(NodeType.VARIABLE)
-        self.name = name
+        self.name: str = name
+        self.var_type: Type = Type.UNKNOWN
 
 
-@dataclass
 class BinaryOp(ASTNode):
-    operator: str = ""
-    left: ASTNode = None
-    right: ASTNode = None
+    __slots__ = ('operator', 'left', 'right')
 
     def __init__(self, operator, left, right):
         super().__init__(NodeType.BINARY_OP)
-        self.operator = operator
-        self.left = left
-        self.right = right
+        self.operator: str = operator
+        self.left: ASTNode = left
+        self.right: ASTNode = right
 
 
-@dataclass
 class UnaryOp(ASTNode):
-    operator: str = ""
-    operand: ASTNode = None
-    result_type: Type = Type.UNKNOWN
+    __slots__ = ('operator', 'operand', 'result_type')
 
     def __init__(self, operator, operand):
         super().__init__(NodeType.UNARY_OP)
-        self.operator = operator
-        self.operand = operand
+        self.operator: str = operator
+        self.operand: ASTNode = operand
+        self.result_type: Type = Type.UNKNOWN
 
 
-@dataclass
 class FunctionCall(ASTNode):
-    name: str = ""
-    arguments: List[ASTNode] = field(default_factory=list)
-    return_type: Type = Type.UNKNOWN
+    __slots__ = ('name', 'arguments', 'return_type')
 
     def __init__(self, name, arguments):
         super().__init__(NodeType.CALL)
-        self.name = name
-        self.arguments = arguments
+        self.name: str = name
+        self.arguments: List[ASTNode] = arguments
+        self.return_type: Type = Type.UNKNOWN
 
 
-@dataclass
 class MethodCall(ASTNode):
-    object_name: str = ""
-    method_name: str = ""
-    arguments: List[ASTNode] = field(default_factory=list)
-    return_type: Type = Type.UNKNOWN
+    __slots__ = ('object_name', 'method_name', 'arguments', 'return_type')
 
     def __init__(self, object_name, method_name, arguments):
         super().__init__(NodeType.METHOD_CALL)
-        self.object_name = object_name
-        self.method_name = method_name
-        self.arguments = arguments
+        self.object_name: str = object_name
+        self.method_name: str = method_name
+        self.arguments: List[ASTNode] = arguments
+        self.return_type: Type = Type.UNKNOWN
+
 
 class MemberAccess(ASTNode):
-    object_name: str = ""
-    member_name: str = ""
+    __slots__ = ('object_name', 'member_name')
 
     def __init__(self, object_name, member_name):
         super().__init__(NodeType.VARIABLE)
-        self.object_name = object_name
-        self.member_name = member_name
-
+        self.object_name: str = object_name
+        self.member_name: str = member_name
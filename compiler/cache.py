@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Кэш скомпилированных модулей на диске.
+# Ключ: хэш исходного кода + отпечаток компилятора (исходники compiler/, gen/, лексера и run.py) + опции компиляции.
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINGERPRINT_DIRS = ('compiler', 'gen')
+# Модули в корне, от которых тоже зависит результат: токены (лексер и отступы) и порядок проходов (run.py)
+FINGERPRINT_FILES = ('ListLangFastLexer.py', 'ListLangDenterHelper.py', 'run.py')
+
+_fingerprint = None
+
+
+def fingerprint_files():
+    """Исходники, входящие в отпечаток компилятора (пути относительно корня пакета)."""
+    paths = []
+    for folder in FINGERPRINT_DIRS:
+        names = os.listdir(os.path.join(PACKAGE_ROOT, folder))
+        paths.extend(f'{folder}/{name}' for name in sorted(names) if name.endswith('.py'))
+    paths.extend(FINGERPRINT_FILES)
+    return paths
+
+
+def compiler_fingerprint():
+    """Хэш исходников лексера, парсера и компилятора: любое их изменение делает старые записи кэша недействительными."""
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256()
+        for path in fingerprint_files():
+            h.update(f'{path}\0'.encode('utf-8'))
+            with open(os.path.join(PACKAGE_ROOT, path), 'rb') as f:
+                h.update(f.read())
+            h.update(b'\0')
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'listlang')
+
+
+class CompileCache:
+    """Контентно-адресуемый кэш: kind — 'wasm' (байты модуля) или 'wat' (текст)."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+
+    def key(self, source_code, options, kind):
+        h = hashlib.sha256()
+        h.update(compiler_fingerprint().encode('ascii'))
+        h.update(kind.encode('ascii') + b'\0')
+        h.update(json.dumps(options, sort_keys=True).encode('utf-8') + b'\0')
+        h.update(source_code.encode('utf-8'))
+        return h.hexdigest()
+
+    def _path(self, key, kind):
+        return os.path.join(self.directory, key[:2], f'{key}.{kind}')
+
+    def get(self, source_code, options, kind='wasm'):
+        try:
+            with open(self._path(self.key(source_code, options, kind), kind), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        return data.decode('utf-8') if kind == 'wat' else data
+
+    def put(self, source_code, options, data, kind='wasm'):
+        path = self._path(self.key(source_code, options, kind), kind)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Атомарная запись: параллельные процессы не увидят недописанный файл
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Кэш — только ускорение: недоступный каталог не должен ломать компиляцию
+            pass
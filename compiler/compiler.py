@@ -1,7 +1,74 @@
+import io
+import re
+import shutil
 import struct
+import tempfile
 from .ast_nodes import *
 
 
+# Вложенные списки операторов составного оператора — общая таблица для обходов по операторам
+# (объявление локальных переменных, поиск return со значением)
+STATEMENT_BODIES = {
+    IfStatement: lambda stmt: (stmt.then_body, stmt.else_body),
+    WhileStatement: lambda stmt: (stmt.body,),
+    ForStatement: lambda stmt: (stmt.body,),
+    SwitchStatement: lambda stmt: [case.body for case in stmt.cases] + [stmt.default_case or []],
+}
+
+# Дочерние узлы по классу узла, в порядке исходного текста: типизированный обход AST без рефлексии
+NODE_CHILDREN = {
+    Program: lambda node: node.functions + node.statements,
+    Function: lambda node: node.body,
+    Assignment: lambda node: node.values,
+    IfStatement: lambda node: [node.condition, *node.then_body, *node.else_body],
+    WhileStatement: lambda node: [node.condition, *node.body],
+    ForStatement: lambda node: [*node.iterables, *node.body],
+    SwitchStatement: lambda node: [node.expression, *(item for case in node.cases for item in (case.value, *case.body)),
+                                   *(node.default_case or ())],
+    ReturnStatement: lambda node: node.values or (),
+    Literal: lambda node: node.value if node.type == Type.LIST else (),
+    BinaryOp: lambda node: (node.left, node.right),
+    UnaryOp: lambda node: (node.operand,),
+    FunctionCall: lambda node: node.arguments,
+    MethodCall: lambda node: node.arguments,
+}
+
+
+COMPARISON_OPERATORS = frozenset(('==', '!=', '<', '>', '<=', '>='))
+
+
+def binary_type(operator, left, right):
+    """Тип результата бинарной операции по типам операндов (сравнение дает i32 и для f32-операндов)."""
+    if left == Type.LIST or right == Type.LIST: return Type.LIST
+    if operator in COMPARISON_OPERATORS: return Type.BOOL
+    if left == Type.FLOAT or right == Type.FLOAT: return Type.FLOAT
+    return Type.INT
+
+
+def wrap_i32(value):
+    """Целое, приведенное к знаковому i32 (так его видит i32.const)."""
+    return (value + 0x80000000) % 0x100000000 - 0x80000000
+
+
+def _int_case_key(value):
+    """Значение ветки switch как знаковое i32, если это целый или логический литерал; иначе None."""
+    if value.__class__ is not Literal:
+        return None
+    if value.type == Type.INT:
+        return wrap_i32(value.value)
+    if value.type == Type.BOOL:
+        return 1 if value.value else 0
+    return None
+
+
+class _Indents(dict):
+    """Кэш префиксов отступа: строка из пробелов строится один раз на уровень вложенности."""
+
+    def __missing__(self, indent):
+        prefix = self[indent] = "  " * indent
+        return prefix
+
+
 class SymbolTable:
     def __init__(self):
         self.scopes = [{}]
@@ -38,43 +105,140 @@ class SymbolTable:
 
 
 class WASMCompiler:
-    def __init__(self):
-        self.wat = []
+    MAX_PAGES = 65536
+    # Нижняя граница начала кучи; если строковые константы не помещаются ниже, куча начинается после них
+    HEAP_BASE = 1024
+    PAGE_SIZE = 65536
+    # Куча начинается с таблицы голов списков свободных блоков (по одному i32 на класс размера)
+    SIZE_CLASSES = 32
+    MIN_SIZE_CLASS = 3  # 8 байт — размер ячейки {type, value}
+    MAX_SIZE_CLASS = 30
+
+    VALUE_REPRS = ('boxed', 'tagged')
+    # Функции окружения (runner.js): имя и сигнатура
+    IMPORTS = (
+        ('print_i32', '(param i32)'),
+        ('print_f32', '(param f32)'),
+        ('print_string', '(param i32)'),
+        ('read_i32', '(result i32)'),
+        ('print_char', '(param i32)'),
+        ('print_num', '(param i32)'),
+        ('out_of_memory', '(param i32)'),
+    )
+    CALL_RE = re.compile(r'\bcall \$([\w.]+)')
+    # switch по целым литералам: br_table, если значений не меньше JUMP_TABLE_MIN_CASES и они занимают
+    # не меньше половины диапазона; иначе — бинарный поиск, пока в отрезке больше SWITCH_LINEAR_CASES значений
+    JUMP_TABLE_MIN_CASES = 3
+    SWITCH_LINEAR_CASES = 3
+    # Выражения, оставляющие значение на стеке: как оператор их результат сбрасывается
+    VALUE_NODES = frozenset((Literal, Variable, BinaryOp, UnaryOp))
+
+    def __init__(self, memory_pages=1, max_memory_pages=None, value_repr='boxed', bulk_memory=True, tree_shake=True):
+        if memory_pages < 1 or memory_pages > self.MAX_PAGES:
+            raise ValueError(f"memory_pages must be in [1, {self.MAX_PAGES}], got {memory_pages}")
+        if max_memory_pages is not None and not memory_pages <= max_memory_pages <= self.MAX_PAGES:
+            raise ValueError(f"max_memory_pages must be in [{memory_pages}, {self.MAX_PAGES}], got {max_memory_pages}")
+        if value_repr not in self.VALUE_REPRS:
+            raise ValueError(f"value_repr must be one of {self.VALUE_REPRS}, got {value_repr!r}")
+        self.memory_pages = memory_pages
+        self.value_repr = value_repr
+        self.bulk_memory = bulk_memory
+        self.tree_shake = tree_shake
+        self.max_memory_pages = max_memory_pages
+        self.out = None
+        self._write = None
+        self._indents = _Indents()
         self.symbols = SymbolTable()
         self.strings = {}
-        self.string_offset_counter = 0
+        self.string_data = []
+        self.heap_base = self.HEAP_BASE
         self.loop_stack = []
         self.func_locals = []
         self.current_func_return_type = Type.VOID
         self.last_expr_type = Type.UNKNOWN
         self.void_functions = set()
         self.for_loop_counter = 0
+        self.switch_counter = 0
+        self.owned_lists = set()
+        self.list_kinds = {}
 
     def emit(self, line, indent=0):
-        self.wat.append("  " * indent + line)
-
-    def compile(self, program: Program):
-        self.emit("(module")
-        # Импорты
-        self.emit('(import "env" "print_i32" (func $print_i32 (param i32)))', 1)
-        self.emit('(import "env" "print_f32" (func $print_f32 (param f32)))', 1)
-        self.emit('(import "env" "print_string" (func $print_string (param i32)))', 1)
-        self.emit('(import "env" "read_i32" (func $read_i32 (result i32)))', 1)
-        self.emit('(import "env" "print_char" (func $print_char (param i32)))', 1)
-        self.emit('(import "env" "print_num" (func $print_num (param i32)))', 1)
-
-        # Память
-        self.emit('(memory $memory 1)', 1)
-        self.emit('(export "memory" (memory $memory))', 1)
-        self.emit('(global $heap_ptr (mut i32) (i32.const 1024))', 1)
-
-        # Глобальные переменные
-        self.emit('(global $temp_ptr (mut i32) (i32.const 0))', 1)
-        self.emit('(global $temp_i32 (mut i32) (i32.const 0))', 1)
-        self.emit('(global $temp_f32 (mut f32) (f32.const 0.0))', 1)
-
-        self._collect_strings(program)
+        self._write(self._indents[indent] + line + "\n")
+
+    def compile(self, program: Program, out=None):
+        """
+        Генерирует WAT. out — текстовый поток (файл, StringIO): строки пишутся в него по мере генерации,
+        не накапливаясь в памяти, и возвращается None. Без out возвращается текст модуля.
+        """
+        if out is None:
+            buffer = io.StringIO()
+            self.compile(program, buffer)
+            return buffer.getvalue()[:-1]
+        self.out = out
+
+        # Строковые константы лежат с адреса 0, куча — сразу за ними (но не ниже HEAP_BASE)
+        pool_end = self._layout_strings(self._collect_strings(program))
+        self.heap_base = max(self.HEAP_BASE, (pool_end + 7) & ~7)
+        # Начальный размер памяти вмещает константы и таблицу свободных блоков
+        heap_start = self.heap_base + self.SIZE_CLASSES * 4
+        memory_pages = max(self.memory_pages, -(-heap_start // self.PAGE_SIZE))
+        if self.max_memory_pages is not None and memory_pages > self.max_memory_pages:
+            raise ValueError(f"string constants need {memory_pages} memory pages, "
+                             f"but max_memory_pages is {self.max_memory_pages}")
+
+        # Функции рантайма и пользовательский код сначала пишутся в буферы: импорты должны идти в модуле первыми,
+        # а в модуль попадают только импорты и функции рантайма, достижимые по вызовам из пользовательского кода
+        helpers = io.StringIO()
+        self._write = helpers.write
+        self._emit_allocator()
         self._emit_list_helpers()
+        self._emit_flat_list_helpers()
+
+        # Пользовательский код буферизуется там же, где окажется вывод: в памяти, если вывод — StringIO,
+        # иначе во временном файле (потоковая запись большого модуля не держит его код в памяти)
+        if isinstance(out, io.StringIO):
+            code = io.StringIO()
+        else:
+            code = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        with code:
+            self._write = code.write
+            self._emit_user_code(program)
+            code.seek(0)
+            helper_funcs = self._split_functions(helpers.getvalue())
+            used = self._reachable_functions(self._called_functions(code), helper_funcs)
+
+            self._write = out.write
+            self.emit("(module")
+            # Импорты
+            for name, signature in self.IMPORTS:
+                if used is None or name in used:
+                    self.emit(f'(import "env" "{name}" (func ${name} {signature}))', 1)
+
+            # Память (растет по требованию в $malloc)
+            limits = f'{memory_pages}'
+            if self.max_memory_pages is not None:
+                limits += f' {self.max_memory_pages}'
+            self.emit(f'(memory $memory {limits})', 1)
+            self.emit('(export "memory" (memory $memory))', 1)
+            self.emit(f'(global $heap_ptr (mut i32) (i32.const {heap_start}))', 1)
+
+            # Глобальные переменные
+            self.emit('(global $temp_ptr (mut i32) (i32.const 0))', 1)
+            self.emit('(global $temp_i32 (mut i32) (i32.const 0))', 1)
+            self.emit('(global $temp_f32 (mut f32) (f32.const 0.0))', 1)
+
+            for name, text in helper_funcs:
+                if used is None or name in used:
+                    out.write(text)
+            code.seek(0)
+            shutil.copyfileobj(code, out)
+
+        for offset, s_val in self.string_data:
+            self.emit(f'(data (i32.const {offset}) "{self._escape_data(s_val)}\\00")', 1)
+
+        self.emit(")")
+
+    def _emit_user_code(self, program: Program):
         self._prescan_function_signatures(program.functions)
 
         for func in program.functions:
@@ -84,8 +248,13 @@ class WASMCompiler:
         self.symbols.enter_scope()
 
         self.for_loop_counter = 0
+        self.switch_counter = 0
+        self.list_kinds = self._infer_list_kinds(program.statements)
         self._scan_and_declare_locals(program.statements)
         self.for_loop_counter = 0
+        self.switch_counter = 0
+        self.owned_lists = self._find_owned_lists(program.statements)
+        for stmt in program.statements: self._annotate_types(stmt)
 
         for stmt in program.statements:
             self._visit_statement(stmt, indent=2)
@@ -93,29 +262,217 @@ class WASMCompiler:
         self.symbols.exit_scope()
         self.emit(')', 1)
 
-        for s_val, offset in self.strings.items():
-            escaped = s_val.replace('"', '\\"').replace('\n', '\\0A')
-            self.emit(f'(data (i32.const {offset}) "{escaped}\\00")', 1)
-
-        self.emit(")")
-        return "\n".join(self.wat)
-
-    # --- LIST HELPERS ---
-    def _emit_list_helpers(self):
+    # --- TREE SHAKING ---
+    def _split_functions(self, text):
+        """Разбивает текст функций рантайма на [(имя, текст функции)]."""
+        funcs = []
+        for line in text.splitlines(keepends=True):
+            if line.startswith('  (func '):
+                funcs.append([line.split()[1][1:], [line]])
+            else:
+                funcs[-1][1].append(line)
+        return [(name, ''.join(lines)) for name, lines in funcs]
+
+    def _called_functions(self, stream):
+        """Имена функций из инструкций call в потоке WAT."""
+        called = set()
+        while True:
+            # Чтение целыми строками: имя в `call $...` не разрывается между порциями
+            lines = stream.readlines(1 << 16)
+            if not lines: return called
+            called.update(self.CALL_RE.findall(''.join(lines)))
+
+    def _reachable_functions(self, roots, helper_funcs):
+        """Импорты и функции рантайма, достижимые из roots по графу вызовов; None — если tree shaking выключен."""
+        if not self.tree_shake: return None
+        calls = {name: self.CALL_RE.findall(text) for name, text in helper_funcs}
+        used = set()
+        stack = list(roots)
+        while stack:
+            name = stack.pop()
+            if name in used: continue
+            used.add(name)
+            stack.extend(calls.get(name, ()))
+        return used
+
+    # --- ALLOCATOR ---
+    def _emit_allocator(self):
         indent = 1
-        # $malloc
-        self.emit('(func $malloc (param $size i32) (result i32)', indent)
+        # $bump_alloc: отрезает блок от вершины кучи, при нехватке памяти вызывает memory.grow
+        self.emit('(func $bump_alloc (param $size i32) (result i32)', indent)
+        self.emit('  (local $ptr i32) (local $end i32) (local $pages i32)', indent)
         self.emit('  global.get $heap_ptr', indent)
+        self.emit('  local.tee $ptr', indent)
         self.emit('  local.get $size', indent)
-        self.emit('  global.get $heap_ptr', indent)
         self.emit('  i32.add', indent)
+        self.emit('  local.tee $end', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.lt_u', indent)  # Переполнение адресного пространства
+        self.emit('  if', indent)
+        self.emit('    local.get $size', indent)
+        self.emit('    call $out_of_memory', indent)
+        self.emit('    unreachable', indent)
+        self.emit('  end', indent)
+
+        # Сколько страниц нужно, чтобы вместить [0, end)
+        self.emit('  local.get $end', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.sub', indent)
+        self.emit('  i32.const 16', indent)
+        self.emit('  i32.shr_u', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  memory.size', indent)
+        self.emit('  i32.sub', indent)
+        self.emit('  local.tee $pages', indent)
+        self.emit('  i32.const 0', indent)
+        self.emit('  i32.gt_s', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $pages', indent)
+        self.emit('    memory.grow', indent)
+        self.emit('    i32.const -1', indent)
+        self.emit('    i32.eq', indent)
+        self.emit('    if', indent)
+        self.emit('      local.get $size', indent)
+        self.emit('      call $out_of_memory', indent)
+        self.emit('      unreachable', indent)
+        self.emit('    end', indent)
+        self.emit('  end', indent)
+
+        self.emit('  local.get $end', indent)
         self.emit('  global.set $heap_ptr', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit(')', indent)
+
+        # $malloc: блоки размера 2^class с 4-байтовым заголовком [class], свободные блоки
+        # хранятся в односвязных списках по классам (ссылка на следующий — в первых 4 байтах).
+        self.emit('(func $malloc (param $size i32) (result i32)', indent)
+        self.emit('  (local $class i32) (local $slot i32) (local $ptr i32)', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.eqz', indent)
+        self.emit('  if', indent)
+        self.emit('    i32.const 0', indent)  # Пустой массив (например, у [] с емкостью 0)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+        self.emit('  local.get $size', indent)
+        self.emit(f'  i32.const {1 << self.MAX_SIZE_CLASS}', indent)
+        self.emit('  i32.gt_u', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $size', indent)
+        self.emit('    call $out_of_memory', indent)
+        self.emit('    unreachable', indent)
+        self.emit('  end', indent)
+
+        # class = max(MIN_SIZE_CLASS, ceil(log2(size)))
+        self.emit('  i32.const 32', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.sub', indent)
+        self.emit('  i32.clz', indent)
+        self.emit('  i32.sub', indent)
+        self.emit('  local.tee $class', indent)
+        self.emit(f'  i32.const {self.MIN_SIZE_CLASS}', indent)
+        self.emit('  local.get $class', indent)
+        self.emit(f'  i32.const {self.MIN_SIZE_CLASS}', indent)
+        self.emit('  i32.gt_u', indent)
+        self.emit('  select', indent)
+        self.emit('  local.set $class', indent)
+
+        # Берем блок из списка свободных, если он не пуст
+        self.emit('  local.get $class', indent)
+        self.emit('  i32.const 2', indent)
+        self.emit('  i32.shl', indent)
+        self.emit(f'  i32.const {self.heap_base}', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.tee $slot', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.tee $ptr', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $slot', indent)
+        self.emit('    local.get $ptr', indent)
+        self.emit('    i32.load', indent)
+        self.emit('    i32.store', indent)
+        self.emit('    local.get $ptr', indent)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+
+        # Иначе выделяем новый блок на вершине кучи
+        self.emit('  i32.const 1', indent)
+        self.emit('  local.get $class', indent)
+        self.emit('  i32.shl', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  call $bump_alloc', indent)
+        self.emit('  local.tee $ptr', indent)
+        self.emit('  local.get $class', indent)
+        self.emit('  i32.store', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  i32.add', indent)
+        self.emit(')', indent)
+
+        # $free: возвращает блок в список свободных его класса
+        self.emit('(func $free (param $ptr i32)', indent)
+        self.emit('  (local $slot i32)', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.eqz', indent)
+        self.emit('  if', indent)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  i32.sub', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  i32.const 2', indent)
+        self.emit('  i32.shl', indent)
+        self.emit(f'  i32.const {self.heap_base}', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.tee $slot', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  i32.store', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.store', indent)
         self.emit(')', indent)
 
-        # $list_new
+        # $mem_copy: копирует $len байт (кратно 4); memory.copy из bulk-memory либо цикл по словам
+        self.emit('(func $mem_copy (param $dst i32) (param $src i32) (param $len i32)', indent)
+        if self.bulk_memory:
+            self.emit('  local.get $dst', indent)
+            self.emit('  local.get $src', indent)
+            self.emit('  local.get $len', indent)
+            self.emit('  memory.copy', indent)
+        else:
+            self.emit('  (local $i i32)', indent)
+            self.emit('  (block $break (loop $loop', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    local.get $len', indent)
+            self.emit('    i32.ge_u', indent)
+            self.emit('    br_if $break', indent)
+            self.emit('    local.get $dst', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.add', indent)
+            self.emit('    local.get $src', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.add', indent)
+            self.emit('    i32.load', indent)
+            self.emit('    i32.store', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.const 4', indent)
+            self.emit('    i32.add', indent)
+            self.emit('    local.set $i', indent)
+            self.emit('    br $loop', indent)
+            self.emit('  ))', indent)
+        self.emit(')', indent)
+
+    # --- LIST HELPERS ---
+    def _emit_list_helpers(self):
+        indent = 1
+        # $list_new: Заголовок 12 байт [size, data, capacity]
         self.emit('(func $list_new (param $capacity i32) (result i32)', indent)
         self.emit('  (local $head i32) (local $data i32)', indent)
-        self.emit('  i32.const 8', indent)
+        self.emit('  i32.const 12', indent)
         self.emit('  call $malloc', indent)
         self.emit('  local.set $head', indent)
         self.emit('  local.get $capacity', indent)
@@ -124,18 +481,138 @@ class WASMCompiler:
         self.emit('  call $malloc', indent)
         self.emit('  local.set $data', indent)
         self.emit('  local.get $head', indent)
-        self.emit('  local.get $capacity', indent)
+        self.emit('  i32.const 0', indent)
         self.emit('  i32.store', indent)
         self.emit('  local.get $head', indent)
         self.emit('  local.get $data', indent)
         self.emit('  i32.store offset=4', indent)
         self.emit('  local.get $head', indent)
+        self.emit('  local.get $capacity', indent)
+        self.emit('  i32.store offset=8', indent)
+        self.emit('  local.get $head', indent)
+        self.emit(')', indent)
+
+        # $list_reserve: Гарантирует место под еще один элемент, возвращает текущий размер.
+        # Емкость растет геометрически (x2, минимум 4), поэтому добавление в среднем O(1).
+        self.emit('(func $list_reserve (param $head i32) (param $slot i32) (result i32)', indent)
+        self.emit('  (local $size i32) (local $cap i32) (local $old_ptr i32) (local $new_ptr i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.set $size', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load offset=8', indent)
+        self.emit('  local.set $cap', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  local.get $cap', indent)
+        self.emit('  i32.lt_u', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $size', indent)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+
+        self.emit('  local.get $cap', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.shl', indent)
+        self.emit('  local.tee $cap', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  local.get $cap', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  i32.gt_u', indent)
+        self.emit('  select', indent)
+        self.emit('  local.set $cap', indent)
+
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.set $old_ptr', indent)
+        self.emit('  local.get $cap', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  call $malloc', indent)
+        self.emit('  local.set $new_ptr', indent)
+
+        # Копирование (слот — 4 или 8 байт)
+        self.emit('  local.get $new_ptr', indent)
+        self.emit('  local.get $old_ptr', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  call $mem_copy', indent)
+
+        # Старый массив больше не нужен — возвращаем его аллокатору
+        self.emit('  local.get $old_ptr', indent)
+        self.emit('  call $free', indent)
+
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $new_ptr', indent)
+        self.emit('  i32.store offset=4', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $cap', indent)
+        self.emit('  i32.store offset=8', indent)
+        self.emit('  local.get $size', indent)
         self.emit(')', indent)
 
+        # $list_concat: Копирует слоты обоих списков (4 или 8 байт) в новый список
+        self.emit('(func $list_concat (param $h1 i32) (param $h2 i32) (param $slot i32) (result i32)', indent)
+        self.emit('  (local $s1 i32) (local $s2 i32) (local $total i32) (local $new_h i32) (local $dst i32)', indent)
+        self.emit('  (local $bytes i32)', indent)
+        self.emit('  local.get $h1', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.set $s1', indent)
+        self.emit('  local.get $h2', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.set $s2', indent)
+        self.emit('  local.get $s1', indent)
+        self.emit('  local.get $s2', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.set $total', indent)
+        self.emit('  i32.const 0', indent)
+        self.emit('  call $list_new', indent)
+        self.emit('  local.set $new_h', indent)
+        self.emit('  local.get $total', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  call $malloc', indent)
+        self.emit('  local.set $dst', indent)
+        self.emit('  local.get $new_h', indent)
+        self.emit('  local.get $total', indent)
+        self.emit('  i32.store', indent)
+        self.emit('  local.get $new_h', indent)
+        self.emit('  local.get $dst', indent)
+        self.emit('  i32.store offset=4', indent)
+        self.emit('  local.get $new_h', indent)
+        self.emit('  local.get $total', indent)
+        self.emit('  i32.store offset=8', indent)
+        self.emit('  local.get $dst', indent)
+        self.emit('  local.get $h1', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.get $s1', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  local.tee $bytes', indent)
+        self.emit('  call $mem_copy', indent)
+        self.emit('  local.get $dst', indent)
+        self.emit('  local.get $bytes', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.get $h2', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.get $s2', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  call $mem_copy', indent)
+        self.emit('  local.get $new_h', indent)
+        self.emit(')', indent)
+
+        if self.value_repr == 'tagged':
+            self._emit_tagged_value_helpers()
+        else:
+            self._emit_boxed_value_helpers()
+
+    # --- BOXED VALUES: элемент полиморфного списка — указатель на ячейку {type, value} ---
+    def _emit_boxed_value_helpers(self):
+        indent = 1
         # $list_add_poly: Добавляет ячейку {type, value}
         self.emit('(func $list_add_poly (param $head i32) (param $type i32) (param $val i32)', indent)
-        self.emit('  (local $old_size i32) (local $old_ptr i32) (local $new_ptr i32) (local $i i32) (local $cell i32)',
-                  indent)
+        self.emit('  (local $size i32) (local $cell i32)', indent)
 
         # 1. Создаем ячейку (Cell)
         self.emit('  i32.const 8', indent)  # 8 байт: [type, value]
@@ -148,64 +625,75 @@ class WASMCompiler:
         self.emit('  local.get $val', indent)
         self.emit('  i32.store offset=4', indent)  # Store Value at 4
 
-        # 2. Реаллокация
+        # 2. Расширяем массив указателей, если он заполнен
         self.emit('  local.get $head', indent)
-        self.emit('  i32.load', indent)
-        self.emit('  local.set $old_size', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  call $list_reserve', indent)
+        self.emit('  local.set $size', indent)
+
+        # Сохранение указателя на ячейку в конец массива
         self.emit('  local.get $head', indent)
         self.emit('  i32.load offset=4', indent)
-        self.emit('  local.set $old_ptr', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.const 4', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.get $cell', indent)
+        self.emit('  i32.store', indent)
 
-        self.emit('  local.get $old_size', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $size', indent)
         self.emit('  i32.const 1', indent)
         self.emit('  i32.add', indent)
-        self.emit('  i32.const 4', indent)
-        self.emit('  i32.mul', indent)
-        self.emit('  call $malloc', indent)
-        self.emit('  local.set $new_ptr', indent)
+        self.emit('  i32.store', indent)
+        self.emit(')', indent)
 
-        # Копирование
+        # $list_add_cell: Добавляет копию ячейки другого списка (например, результата .get)
+        self.emit('(func $list_add_cell (param $head i32) (param $cell i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $cell', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.get $cell', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  call $list_add_poly', indent)
+        self.emit(')', indent)
+
+        # $list_free: освобождает ячейки, массив и заголовок списка
+        self.emit('(func $list_free (param $head i32)', indent)
+        self.emit('  (local $size i32) (local $ptr i32) (local $i i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.eqz', indent)
+        self.emit('  if', indent)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.set $size', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.set $ptr', indent)
         self.emit('  (block $break (loop $loop', indent)
         self.emit('    local.get $i', indent)
-        self.emit('    local.get $old_size', indent)
+        self.emit('    local.get $size', indent)
         self.emit('    i32.ge_s', indent)
         self.emit('    br_if $break', indent)
-        self.emit('    local.get $new_ptr', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 4', indent)
-        self.emit('    i32.mul', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    local.get $old_ptr', indent)
+        self.emit('    local.get $ptr', indent)
         self.emit('    local.get $i', indent)
         self.emit('    i32.const 4', indent)
         self.emit('    i32.mul', indent)
         self.emit('    i32.add', indent)
         self.emit('    i32.load', indent)
-        self.emit('    i32.store', indent)
+        self.emit('    call $free', indent)
         self.emit('    local.get $i', indent)
         self.emit('    i32.const 1', indent)
         self.emit('    i32.add', indent)
         self.emit('    local.set $i', indent)
         self.emit('    br $loop', indent)
         self.emit('  ))', indent)
-
-        # Сохранение указателя на ячейку в новый массив
-        self.emit('  local.get $new_ptr', indent)
-        self.emit('  local.get $old_size', indent)
-        self.emit('  i32.const 4', indent)
-        self.emit('  i32.mul', indent)
-        self.emit('  i32.add', indent)
-        self.emit('  local.get $cell', indent)
-        self.emit('  i32.store', indent)
-
-        self.emit('  local.get $head', indent)
-        self.emit('  local.get $new_ptr', indent)
-        self.emit('  i32.store offset=4', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  call $free', indent)
         self.emit('  local.get $head', indent)
-        self.emit('  local.get $old_size', indent)
-        self.emit('  i32.const 1', indent)
-        self.emit('  i32.add', indent)
-        self.emit('  i32.store', indent)
+        self.emit('  call $free', indent)
         self.emit(')', indent)
 
         # $list_get
@@ -230,7 +718,62 @@ class WASMCompiler:
         self.emit('  i32.load', indent)  # Возвращаем Cell Ptr
         self.emit(')', indent)
 
-        # $print_list
+        self._emit_print_list(indent, tagged=False)
+
+        # $unbox_i32: Принимает указатель на ячейку, возвращает i32.
+        # Если внутри float, обрезает его.
+        self.emit('(func $unbox_i32 (param $ptr i32) (result i32)', indent)
+        self.emit('  (local $type i32) (local $val i32)', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.load', indent)  # type
+        self.emit('  local.set $type', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.load offset=4', indent)  # bits
+        self.emit('  local.set $val', indent)
+
+        # Если тип == 1 (FLOAT)
+        self.emit('  local.get $type', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.eq', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $val', indent)
+        self.emit('    f32.reinterpret_i32', indent)  # биты -> float
+        self.emit('    i32.trunc_f32_s', indent)  # float -> int
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+
+        # Иначе (INT или STRING) возвращаем как есть
+        self.emit('  local.get $val', indent)
+        self.emit(')', indent)
+
+        # $unbox_f32: Принимает указатель на ячейку, возвращает f32.
+        # Если внутри int, конвертирует в float.
+        self.emit('(func $unbox_f32 (param $ptr i32) (result f32)', indent)
+        self.emit('  (local $type i32) (local $val i32)', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.load', indent)
+        self.emit('  local.set $type', indent)
+        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.set $val', indent)
+
+        # Если тип == 0 (INT)
+        self.emit('  local.get $type', indent)
+        self.emit('  i32.const 0', indent)
+        self.emit('  i32.eq', indent)
+        self.emit('  if', indent)
+        self.emit('    local.get $val', indent)
+        self.emit('    f32.convert_i32_s', indent)  # int -> float
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+
+        # Иначе считаем что там биты float
+        self.emit('  local.get $val', indent)
+        self.emit('  f32.reinterpret_i32', indent)
+        self.emit(')', indent)
+
+    def _emit_print_list(self, indent, tagged):
+        """$print_list для полиморфного списка: ячейки {type, value} по указателям или слоты в массиве."""
         self.emit('(func $print_list (param $head i32)', indent)
         self.emit('  (local $size i32) (local $ptr i32) (local $i i32) (local $cell i32) (local $type i32)', indent)
         self.emit('  local.get $head', indent)
@@ -249,12 +792,14 @@ class WASMCompiler:
         self.emit('    i32.ge_s', indent)
         self.emit('    br_if $break', indent)
 
+        # Ячейка: по указателю из массива или сам 8-байтовый слот массива
         self.emit('    local.get $ptr', indent)
         self.emit('    local.get $i', indent)
-        self.emit('    i32.const 4', indent)
+        self.emit(f'    i32.const {8 if tagged else 4}', indent)
         self.emit('    i32.mul', indent)
         self.emit('    i32.add', indent)
-        self.emit('    i32.load', indent)
+        if not tagged:
+            self.emit('    i32.load', indent)
         self.emit('    local.set $cell', indent)
 
         self.emit('    local.get $cell', indent)
@@ -319,138 +864,209 @@ class WASMCompiler:
         self.emit('  call $print_char', indent)
         self.emit(')', indent)
 
-        # $list_concat
-        self.emit('(func $list_concat (param $h1 i32) (param $h2 i32) (result i32)', indent)
-        self.emit(
-            '  (local $s1 i32) (local $s2 i32) (local $total i32) (local $new_h i32) (local $i i32) (local $src i32) (local $dst i32)',
-            indent)
-        self.emit('  local.get $h1', indent)
-        self.emit('  i32.load', indent)
-        self.emit('  local.set $s1', indent)
-        self.emit('  local.get $h2', indent)
-        self.emit('  i32.load', indent)
-        self.emit('  local.set $s2', indent)
-        self.emit('  local.get $s1', indent)
-        self.emit('  local.get $s2', indent)
-        self.emit('  i32.add', indent)
-        self.emit('  local.set $total', indent)
-        self.emit('  local.get $total', indent)
-        self.emit('  call $list_new', indent)
-        self.emit('  local.set $new_h', indent)
-        self.emit('  local.get $new_h', indent)
-        self.emit('  i32.load offset=4', indent)
-        self.emit('  local.set $dst', indent)
-        self.emit('  local.get $h1', indent)
-        self.emit('  i32.load offset=4', indent)
-        self.emit('  local.set $src', indent)
-        self.emit('  i32.const 0', indent)
-        self.emit('  local.set $i', indent)
-        self.emit('  (block $b1 (loop $l1', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    local.get $s1', indent)
-        self.emit('    i32.ge_s', indent)
-        self.emit('    br_if $b1', indent)
-        self.emit('    local.get $dst', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 4', indent)
-        self.emit('    i32.mul', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    local.get $src', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 4', indent)
-        self.emit('    i32.mul', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    i32.load', indent)
-        self.emit('    i32.store', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 1', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    local.set $i', indent)
-        self.emit('    br $l1', indent)
-        self.emit('  ))', indent)
-        self.emit('  local.get $h2', indent)
+    # --- TAGGED VALUES: элемент полиморфного списка — 8-байтовый слот [type, value] прямо в массиве ---
+    def _emit_tagged_value_helpers(self):
+        """
+        Элемент (Type.ELEMENT) представлен значением i64: младшие 32 бита — тег типа, старшие — значение.
+        В памяти это тот же слот [type, value], поэтому чтение элемента — один i64.load.
+        """
+        indent = 1
+        # $list_add_poly: Записывает {type, value} в следующий слот
+        self.emit('(func $list_add_poly (param $head i32) (param $type i32) (param $val i32)', indent)
+        self.emit('  (local $size i32) (local $slot i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.const 8', indent)
+        self.emit('  call $list_reserve', indent)
+        self.emit('  local.set $size', indent)
+        self.emit('  local.get $head', indent)
         self.emit('  i32.load offset=4', indent)
-        self.emit('  local.set $src', indent)
-        self.emit('  i32.const 0', indent)
-        self.emit('  local.set $i', indent)
-        self.emit('  (block $b2 (loop $l2', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    local.get $s2', indent)
-        self.emit('    i32.ge_s', indent)
-        self.emit('    br_if $b2', indent)
-        self.emit('    local.get $dst', indent)
-        self.emit('    local.get $s1', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    i32.const 4', indent)
-        self.emit('    i32.mul', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    local.get $src', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 4', indent)
-        self.emit('    i32.mul', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    i32.load', indent)
-        self.emit('    i32.store', indent)
-        self.emit('    local.get $i', indent)
-        self.emit('    i32.const 1', indent)
-        self.emit('    i32.add', indent)
-        self.emit('    local.set $i', indent)
-        self.emit('    br $l2', indent)
-        self.emit('  ))', indent)
-        self.emit('  local.get $new_h', indent)
-        self.emit(')', indent)
-
-        # $unbox_i32: Принимает указатель на ячейку, возвращает i32.
-        # Если внутри float, обрезает его.
-        self.emit('(func $unbox_i32 (param $ptr i32) (result i32)', indent)
-        self.emit('  (local $type i32) (local $val i32)', indent)
-        self.emit('  local.get $ptr', indent)
-        self.emit('  i32.load', indent)  # type
-        self.emit('  local.set $type', indent)
-        self.emit('  local.get $ptr', indent)
-        self.emit('  i32.load offset=4', indent)  # bits
-        self.emit('  local.set $val', indent)
-
-        # Если тип == 1 (FLOAT)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.const 8', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  local.tee $slot', indent)
         self.emit('  local.get $type', indent)
+        self.emit('  i32.store', indent)
+        self.emit('  local.get $slot', indent)
+        self.emit('  local.get $val', indent)
+        self.emit('  i32.store offset=4', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $size', indent)
         self.emit('  i32.const 1', indent)
-        self.emit('  i32.eq', indent)
-        self.emit('  if', indent)
-        self.emit('    local.get $val', indent)
-        self.emit('    f32.reinterpret_i32', indent)  # биты -> float
-        self.emit('    i32.trunc_f32_s', indent)  # float -> int
-        self.emit('    return', indent)
-        self.emit('  end', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  i32.store', indent)
+        self.emit(')', indent)
 
-        # Иначе (INT или STRING) возвращаем как есть
+        # $list_add_tagged: Добавляет уже упакованный элемент (например, результат .get)
+        self.emit('(func $list_add_tagged (param $head i32) (param $val i64)', indent)
+        self.emit('  (local $size i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.const 8', indent)
+        self.emit('  call $list_reserve', indent)
+        self.emit('  local.set $size', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.const 8', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  i32.add', indent)
         self.emit('  local.get $val', indent)
+        self.emit('  i64.store', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  local.get $size', indent)
+        self.emit('  i32.const 1', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  i32.store', indent)
         self.emit(')', indent)
 
-        # $unbox_f32: Принимает указатель на ячейку, возвращает f32.
-        # Если внутри int, конвертирует в float.
-        self.emit('(func $unbox_f32 (param $ptr i32) (result f32)', indent)
-        self.emit('  (local $type i32) (local $val i32)', indent)
-        self.emit('  local.get $ptr', indent)
+        # $list_get: Возвращает упакованный элемент (int 0 за пределами списка)
+        self.emit('(func $list_get (param $head i32) (param $index i32) (result i64)', indent)
+        self.emit('  local.get $index', indent)
+        self.emit('  local.get $head', indent)
         self.emit('  i32.load', indent)
-        self.emit('  local.set $type', indent)
-        self.emit('  local.get $ptr', indent)
+        self.emit('  i32.ge_u', indent)
+        self.emit('  if', indent)
+        self.emit('    i64.const 0', indent)
+        self.emit('    return', indent)
+        self.emit('  end', indent)
+        self.emit('  local.get $head', indent)
         self.emit('  i32.load offset=4', indent)
-        self.emit('  local.set $val', indent)
+        self.emit('  local.get $index', indent)
+        self.emit('  i32.const 8', indent)
+        self.emit('  i32.mul', indent)
+        self.emit('  i32.add', indent)
+        self.emit('  i64.load', indent)
+        self.emit(')', indent)
 
-        # Если тип == 0 (INT)
-        self.emit('  local.get $type', indent)
-        self.emit('  i32.const 0', indent)
-        self.emit('  i32.eq', indent)
+        self._emit_print_list(indent, tagged=True)
+
+        # $unbox_i32 / $unbox_f32: Распаковывают i64-элемент с приведением int <-> float
+        for val_type, other_tag, convert in (('i32', 1, ['f32.reinterpret_i32', 'i32.trunc_f32_s']),
+                                             ('f32', 0, ['f32.convert_i32_s'])):
+            self.emit(f'(func $unbox_{val_type} (param $v i64) (result {val_type})', indent)
+            self.emit('  (local $val i32)', indent)
+            self.emit('  local.get $v', indent)
+            self.emit('  i64.const 32', indent)
+            self.emit('  i64.shr_u', indent)
+            self.emit('  i32.wrap_i64', indent)
+            self.emit('  local.set $val', indent)
+            self.emit('  local.get $v', indent)
+            self.emit('  i32.wrap_i64', indent)
+            self.emit(f'  i32.const {other_tag}', indent)
+            self.emit('  i32.eq', indent)
+            self.emit('  if', indent)
+            self.emit('    local.get $val', indent)
+            for op in convert: self.emit(f'    {op}', indent)
+            self.emit('    return', indent)
+            self.emit('  end', indent)
+            self.emit('  local.get $val', indent)
+            if val_type == 'f32': self.emit('  f32.reinterpret_i32', indent)
+            self.emit(')', indent)
+
+    # --- HOMOGENEOUS LIST HELPERS ---
+    def _emit_flat_list_helpers(self):
+        """Хелперы для однородных списков: значения i32/f32 лежат прямо в массиве данных."""
+        indent = 1
+        for val_type, print_func in (('i32', '$print_num'), ('f32', '$print_f32')):
+            # $list_add_<type>
+            self.emit(f'(func $list_add_{val_type} (param $head i32) (param $val {val_type})', indent)
+            self.emit('  (local $size i32)', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.const 4', indent)
+            self.emit('  call $list_reserve', indent)
+            self.emit('  local.set $size', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.load offset=4', indent)
+            self.emit('  local.get $size', indent)
+            self.emit('  i32.const 4', indent)
+            self.emit('  i32.mul', indent)
+            self.emit('  i32.add', indent)
+            self.emit('  local.get $val', indent)
+            self.emit(f'  {val_type}.store', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  local.get $size', indent)
+            self.emit('  i32.const 1', indent)
+            self.emit('  i32.add', indent)
+            self.emit('  i32.store', indent)
+            self.emit(')', indent)
+
+            # $list_get_<type>
+            self.emit(f'(func $list_get_{val_type} (param $head i32) (param $index i32) (result {val_type})', indent)
+            self.emit('  local.get $index', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.load', indent)
+            self.emit('  i32.ge_u', indent)
+            self.emit('  if', indent)
+            self.emit(f'    {val_type}.const 0', indent)
+            self.emit('    return', indent)
+            self.emit('  end', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.load offset=4', indent)
+            self.emit('  local.get $index', indent)
+            self.emit('  i32.const 4', indent)
+            self.emit('  i32.mul', indent)
+            self.emit('  i32.add', indent)
+            self.emit(f'  {val_type}.load', indent)
+            self.emit(')', indent)
+
+            # $print_list_<type>
+            self.emit(f'(func $print_list_{val_type} (param $head i32)', indent)
+            self.emit('  (local $size i32) (local $ptr i32) (local $i i32)', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.load', indent)
+            self.emit('  local.set $size', indent)
+            self.emit('  local.get $head', indent)
+            self.emit('  i32.load offset=4', indent)
+            self.emit('  local.set $ptr', indent)
+            self.emit('  i32.const 91', indent)
+            self.emit('  call $print_char', indent)
+            self.emit('  (block $break (loop $loop', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    local.get $size', indent)
+            self.emit('    i32.ge_s', indent)
+            self.emit('    br_if $break', indent)
+            self.emit('    local.get $ptr', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.const 4', indent)
+            self.emit('    i32.mul', indent)
+            self.emit('    i32.add', indent)
+            self.emit(f'    {val_type}.load', indent)
+            self.emit(f'    call {print_func}', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.const 1', indent)
+            self.emit('    i32.add', indent)
+            self.emit('    local.get $size', indent)
+            self.emit('    i32.lt_s', indent)
+            self.emit('    if', indent)
+            self.emit('      i32.const 44', indent)
+            self.emit('      call $print_char', indent)
+            self.emit('      i32.const 32', indent)
+            self.emit('      call $print_char', indent)
+            self.emit('    end', indent)
+            self.emit('    local.get $i', indent)
+            self.emit('    i32.const 1', indent)
+            self.emit('    i32.add', indent)
+            self.emit('    local.set $i', indent)
+            self.emit('    br $loop', indent)
+            self.emit('  ))', indent)
+            self.emit('  i32.const 93', indent)
+            self.emit('  call $print_char', indent)
+            self.emit('  i32.const 10', indent)
+            self.emit('  call $print_char', indent)
+            self.emit(')', indent)
+
+        # $list_free_flat: у однородного списка нет ячеек — освобождаем массив и заголовок
+        self.emit('(func $list_free_flat (param $head i32)', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.eqz', indent)
         self.emit('  if', indent)
-        self.emit('    local.get $val', indent)
-        self.emit('    f32.convert_i32_s', indent)  # int -> float
         self.emit('    return', indent)
         self.emit('  end', indent)
-
-        # Иначе считаем что там биты float
-        self.emit('  local.get $val', indent)
-        self.emit('  f32.reinterpret_i32', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  i32.load offset=4', indent)
+        self.emit('  call $free', indent)
+        self.emit('  local.get $head', indent)
+        self.emit('  call $free', indent)
         self.emit(')', indent)
 
     def _prescan_function_signatures(self, functions):
@@ -460,6 +1076,7 @@ class WASMCompiler:
         self.void_functions.add('print_string')
         self.void_functions.add('print_num')
         self.void_functions.add('print_char')
+        self.void_functions.add('out_of_memory')
         self.void_functions.add('swap')
         for func in functions:
             mangled_name = f"{func.name}_{len(func.parameters)}"
@@ -472,83 +1089,302 @@ class WASMCompiler:
 
     def _has_return_value(self, stmts):
         for stmt in stmts:
-            if isinstance(stmt, ReturnStatement) and stmt.values: return True
-            if isinstance(stmt, IfStatement):
-                if self._has_return_value(stmt.then_body) or self._has_return_value(stmt.else_body): return True
-            elif isinstance(stmt, (WhileStatement, ForStatement)):
-                if self._has_return_value(stmt.body): return True
-            elif isinstance(stmt, SwitchStatement):
-                for case in stmt.cases:
-                    if self._has_return_value(case.body): return True
-                if stmt.default_case and self._has_return_value(stmt.default_case): return True
+            if stmt.__class__ is ReturnStatement:
+                if stmt.values: return True
+                continue
+            bodies = STATEMENT_BODIES.get(stmt.__class__)
+            if bodies and any(self._has_return_value(body) for body in bodies(stmt)): return True
         return False
 
     def _visit_statement(self, stmt, indent):
         self.visit(stmt, indent)
+        cls = stmt.__class__
         should_drop = False
-        if isinstance(stmt, (Literal, Variable, BinaryOp, UnaryOp)):
+        if cls in self.VALUE_NODES:
             should_drop = True
-        elif isinstance(stmt, FunctionCall):
+        elif cls is FunctionCall:
             mangled_name = f"{stmt.name}_{len(stmt.arguments)}"
             if stmt.name != 'write' and stmt.name != 'swap' and mangled_name not in self.void_functions:
                 should_drop = True
-        elif isinstance(stmt, MethodCall):
+        elif cls is MethodCall:
             if stmt.method_name == 'get' or stmt.method_name == 'len': should_drop = True
         if should_drop: self.emit('drop', indent)
 
     def _scan_and_declare_locals(self, stmts):
         if not stmts: return
         for stmt in stmts:
-            if isinstance(stmt, Assignment):
-                rhs_node = stmt.values[0] if stmt.values else None
-                guessed_type = self._infer_type(rhs_node)
-                for target_name in stmt.targets:
-                    if not self.symbols.lookup(target_name):
-                        wasm_type = 'f32' if guessed_type == Type.FLOAT else 'i32'
-                        self.symbols.declare(target_name, guessed_type)
-                        self.emit(f'(local $var_{target_name}_{self.symbols.locals_count - 1} {wasm_type})', 2)
-            elif isinstance(stmt, IfStatement):
-                self._scan_and_declare_locals(stmt.then_body)
-                self._scan_and_declare_locals(stmt.else_body)
-            elif isinstance(stmt, WhileStatement):
-                self._scan_and_declare_locals(stmt.body)
-            elif isinstance(stmt, ForStatement):
-                loop_id = self.for_loop_counter
-                self.for_loop_counter += 1
-                self.emit(f'(local $for_idx_{loop_id} i32)', 2)
-                self.emit(f'(local $for_len_{loop_id} i32)', 2)
-                self.emit(f'(local $for_ptr_{loop_id} i32)', 2)
-                for target_name in stmt.targets:
-                    if not self.symbols.lookup(target_name):
-                        self.symbols.declare(target_name, Type.ELEMENT)
-                        self.emit(f'(local $var_{target_name}_{self.symbols.locals_count - 1} i32)', 2)
-                self._scan_and_declare_locals(stmt.body)
-            elif isinstance(stmt, SwitchStatement):
-                for case in stmt.cases: self._scan_and_declare_locals(case.body)
-                if stmt.default_case: self._scan_and_declare_locals(stmt.default_case)
-
-    def _infer_type(self, node):
+            declare = self.LOCAL_DECLARERS.get(stmt.__class__)
+            if declare: declare(self, stmt)
+            bodies = STATEMENT_BODIES.get(stmt.__class__)
+            if bodies:
+                for body in bodies(stmt): self._scan_and_declare_locals(body)
+
+    def _declare_assignment_locals(self, stmt: Assignment):
+        rhs_node = stmt.values[0] if stmt.values else None
+        guessed_type = self._infer_type(rhs_node)
+        for target_name in stmt.targets:
+            if not self.symbols.lookup(target_name):
+                wasm_type = self._wasm_type(guessed_type)
+                self.symbols.declare(target_name, guessed_type)
+                self.emit(f'(local $var_{target_name}_{self.symbols.locals_count - 1} {wasm_type})', 2)
+
+    def _declare_for_locals(self, stmt: ForStatement):
+        loop_id = self.for_loop_counter
+        self.for_loop_counter += 1
+        self.emit(f'(local $for_idx_{loop_id} i32)', 2)
+        self.emit(f'(local $for_len_{loop_id} i32)', 2)
+        self.emit(f'(local $for_ptr_{loop_id} i32)', 2)
+        element_type = self._list_kind(stmt.iterables[0]) or Type.ELEMENT
+        for target_name in stmt.targets:
+            if not self.symbols.lookup(target_name):
+                wasm_type = self._wasm_type(element_type)
+                self.symbols.declare(target_name, element_type)
+                self.emit(f'(local $var_{target_name}_{self.symbols.locals_count - 1} {wasm_type})', 2)
+
+    def _declare_switch_locals(self, stmt: SwitchStatement):
+        self.emit(f'(local $switch_{self.switch_counter} i32)', 2)
+        self.switch_counter += 1
+
+    # Операторы, объявляющие локальные переменные (вложенные тела обходятся по STATEMENT_BODIES)
+    LOCAL_DECLARERS = {
+        Assignment: _declare_assignment_locals,
+        ForStatement: _declare_for_locals,
+        SwitchStatement: _declare_switch_locals,
+    }
+
+    def _find_owned_lists(self, stmts, params=()):
+        """
+        Переменные, единолично владеющие своим списком: им присваивается только литерал [],
+        а сам список используется лишь через .add/.len и write(). Ячейки и массив такого
+        списка никуда не утекают, поэтому при повторном присваивании старый список освобождается.
+        """
+        candidates = set()
+        escaped = set(params)
+
+        def scan_expr(node, printed=False):
+            if isinstance(node, Variable):
+                if not printed: escaped.add(node.name)
+            elif isinstance(node, BinaryOp):
+                scan_expr(node.left)
+                scan_expr(node.right)
+            elif isinstance(node, UnaryOp):
+                scan_expr(node.operand)
+            elif isinstance(node, FunctionCall):
+                for arg in node.arguments: scan_expr(arg, printed=node.name == 'write')
+            elif isinstance(node, MethodCall):
+                if node.method_name not in ('add', 'len'): escaped.add(node.object_name)
+                for arg in node.arguments: scan_expr(arg)
+            elif isinstance(node, MemberAccess):
+                escaped.add(node.object_name)
+
+        def scan_body(body):
+            for stmt in body or []:
+                if isinstance(stmt, Assignment):
+                    single = len(stmt.targets) == 1 and len(stmt.values) == 1
+                    for target_name in stmt.targets:
+                        value = stmt.values[0] if single else None
+                        if isinstance(value, Literal) and value.type == Type.LIST:
+                            candidates.add(target_name)
+                        else:
+                            escaped.add(target_name)
+                    for value in stmt.values: scan_expr(value)
+                elif isinstance(stmt, IfStatement):
+                    scan_expr(stmt.condition)
+                    scan_body(stmt.then_body)
+                    scan_body(stmt.else_body)
+                elif isinstance(stmt, WhileStatement):
+                    scan_expr(stmt.condition)
+                    scan_body(stmt.body)
+                elif isinstance(stmt, ForStatement):
+                    escaped.update(stmt.targets)
+                    for iterable in stmt.iterables: scan_expr(iterable)
+                    scan_body(stmt.body)
+                elif isinstance(stmt, SwitchStatement):
+                    scan_expr(stmt.expression)
+                    for case in stmt.cases:
+                        scan_expr(case.value)
+                        scan_body(case.body)
+                    scan_body(stmt.default_case)
+                elif isinstance(stmt, ReturnStatement):
+                    for value in stmt.values or []: scan_expr(value)
+                else:
+                    scan_expr(stmt)
+
+        scan_body(stmts)
+        return candidates - escaped
+
+    def _infer_list_kinds(self, stmts, params=()):
+        """
+        Выбирает раскладку для каждой переменной-списка функции: Type.INT / Type.FLOAT, если в
+        список попадают только целые (bool) или только дробные значения, — тогда элементы хранятся
+        прямо в массиве без ячеек. Остальные списки (и те, что уходят в функции) остаются полиморфными.
+        Переменные, которые могут ссылаться на один список или копируются через конкатенацию,
+        получают общую раскладку. Типы элементов зависят от раскладок (ls.get), поэтому
+        анализ повторяется до неподвижной точки.
+        """
+        kinds = {}
+        while True:
+            self.list_kinds = kinds
+            env = {name: Type.UNKNOWN for name in params}
+            parent = {}
+            elem_types = {}
+            poly = set(params)
+            # Списки, которые обходит for с данной переменной; opaque_loops — переменные, которые обходят
+            # список-выражение без переменной (его раскладка неизвестна)
+            loop_lists = {}
+            opaque_loops = set()
+
+            def var_type(name):
+                return env.get(name, Type.INT)
+
+            def find(name):
+                while parent.get(name, name) != name:
+                    name = parent[name]
+                return name
+
+            def link(a, b):
+                parent[find(a)] = find(b)
+
+            def list_vars(node):
+                if isinstance(node, Variable):
+                    return [node.name] if var_type(node.name) == Type.LIST else []
+                if isinstance(node, BinaryOp):
+                    return list_vars(node.left) + list_vars(node.right)
+                return []
+
+            def declare(name, value_type):
+                if name not in env: env[name] = value_type
+
+            def scan_expr(node):
+                # Возвращает list_vars(node): для цепочек операций они собираются снизу вверх,
+                # а не пересчитываются по всему поддереву на каждом уровне
+                if isinstance(node, BinaryOp):
+                    names = scan_expr(node.left) + scan_expr(node.right)
+                    for name in names[1:]: link(names[0], name)
+                    return names
+                if isinstance(node, Variable):
+                    return list_vars(node)
+                if isinstance(node, UnaryOp):
+                    scan_expr(node.operand)
+                elif isinstance(node, FunctionCall):
+                    if node.name == 'swap':
+                        names = [arg.name for arg in node.arguments if isinstance(arg, Variable)]
+                        if len(names) == 2 and Type.LIST in (var_type(names[0]), var_type(names[1])):
+                            link(names[0], names[1])
+                        return []
+                    for arg in node.arguments:
+                        if node.name != 'write' and isinstance(arg, Variable): poly.update(list_vars(arg))
+                        scan_expr(arg)
+                elif isinstance(node, MethodCall):
+                    if node.method_name == 'add' and node.arguments:
+                        arg = node.arguments[0]
+                        poly.update(list_vars(arg))
+                        elem_types.setdefault(node.object_name, set()).add(self._infer_type(arg, var_type))
+                    elif node.method_name not in ('get', 'len'):
+                        poly.add(node.object_name)
+                    for arg in node.arguments: scan_expr(arg)
+                elif isinstance(node, MemberAccess):
+                    poly.add(node.object_name)
+                return []
+
+            def scan_body(body):
+                for stmt in body or []:
+                    if isinstance(stmt, Assignment):
+                        for value in stmt.values: scan_expr(value)
+                        guessed_type = self._infer_type(stmt.values[0] if stmt.values else None, var_type)
+                        for target_name in stmt.targets: declare(target_name, guessed_type)
+                        paired = len(stmt.targets) == len(stmt.values)
+                        for i, target_name in enumerate(stmt.targets):
+                            value = stmt.values[i] if paired else None
+                            value_type = self._infer_type(value, var_type) if paired else Type.UNKNOWN
+                            if var_type(target_name) != Type.LIST and value_type != Type.LIST:
+                                continue
+                            if isinstance(value, Literal) and value.type == Type.LIST:
+                                continue
+                            if isinstance(value, (Variable, BinaryOp)) and value_type == Type.LIST:
+                                for name in list_vars(value): link(target_name, name)
+                            else:
+                                poly.add(target_name)
+                    elif isinstance(stmt, IfStatement):
+                        scan_expr(stmt.condition)
+                        scan_body(stmt.then_body)
+                        scan_body(stmt.else_body)
+                    elif isinstance(stmt, WhileStatement):
+                        scan_expr(stmt.condition)
+                        scan_body(stmt.body)
+                    elif isinstance(stmt, ForStatement):
+                        for iterable in stmt.iterables: scan_expr(iterable)
+                        names = list_vars(stmt.iterables[0]) if stmt.iterables else []
+                        element_type = self._list_kind(stmt.iterables[0]) if stmt.iterables else None
+                        for target_name in stmt.targets:
+                            # У переменной цикла одна локальная на функцию: все списки, которые она обходит,
+                            # получают общую раскладку, а уже объявленный элемент — полиморфную
+                            if var_type(target_name) == Type.ELEMENT: poly.update(names)
+                            declare(target_name, element_type or Type.ELEMENT)
+                            seen = loop_lists.setdefault(target_name, [])
+                            if not names: opaque_loops.add(target_name)
+                            for name in names:
+                                if seen: link(name, seen[0])
+                                seen.append(name)
+                        scan_body(stmt.body)
+                    elif isinstance(stmt, SwitchStatement):
+                        scan_expr(stmt.expression)
+                        for case in stmt.cases:
+                            scan_expr(case.value)
+                            scan_body(case.body)
+                        scan_body(stmt.default_case)
+                    elif isinstance(stmt, ReturnStatement):
+                        for value in stmt.values or []:
+                            poly.update(list_vars(value))
+                            scan_expr(value)
+                    else:
+                        scan_expr(stmt)
+
+            scan_body(stmts)
+            for target_name in opaque_loops: poly.update(loop_lists[target_name])
+
+            groups = {}
+            for name, value_type in env.items():
+                if value_type == Type.LIST: groups.setdefault(find(name), []).append(name)
+            new_kinds = {}
+            for names in groups.values():
+                if poly.intersection(names): continue
+                added = set()
+                for name in names: added |= elem_types.get(name, set())
+                if added and added <= {Type.INT, Type.BOOL}:
+                    kind = Type.INT
+                elif added == {Type.FLOAT}:
+                    kind = Type.FLOAT
+                else:
+                    continue
+                for name in names: new_kinds[name] = kind
+
+            if new_kinds == kinds:
+                return kinds
+            kinds = new_kinds
+
+    def _list_kind(self, node):
+        """Раскладка списка-выражения: Type.INT, Type.FLOAT или None для полиморфного списка."""
+        if isinstance(node, Variable):
+            return self.list_kinds.get(node.name)
+        if isinstance(node, BinaryOp):
+            return self._list_kind(node.left) or self._list_kind(node.right)
+        return None
+
+    def _infer_type(self, node, var_type=None):
         if node is None: return Type.INT
         if isinstance(node, Literal): return node.type
         if isinstance(node, Variable):
-            info = self.symbols.lookup(node.name)
-            return info[1] if info else Type.INT
+            if var_type: return var_type(node.name)
+            return self._variable_type(node)
         if isinstance(node, BinaryOp):
-            l = self._infer_type(node.left)
-            r = self._infer_type(node.right)
-            if l == Type.LIST or r == Type.LIST: return Type.LIST
-            if l == Type.FLOAT or r == Type.FLOAT: return Type.FLOAT
-            if node.operator in ['==', '!=', '<', '>', '<=', '>=']: return Type.BOOL
-            return Type.INT
+            l = self._infer_type(node.left, var_type)
+            r = self._infer_type(node.right, var_type)
+            return self._binary_type(node.operator, l, r)
 
         # --- Обработка вызовов методов ---
         if isinstance(node, MethodCall):
-            if node.method_name == 'get':
-                return Type.ELEMENT
-            if node.method_name == 'len':
-                return Type.INT
-            # add и другие void методы можно считать INT или VOID
-            return Type.INT
+            return self._method_type(node)
 
         # Обработка вызовов функций (на будущее)
         if isinstance(node, FunctionCall):
@@ -556,23 +1392,96 @@ class WASMCompiler:
 
         return Type.INT
 
-    def _collect_strings(self, node):
-        if isinstance(node, Literal) and node.type == Type.STRING:
-            if node.value not in self.strings:
-                self.strings[node.value] = self.string_offset_counter
-                self.string_offset_counter += len(node.value.encode('utf-8')) + 1
-        elif hasattr(node, '__dict__'):
-            for key, value in node.__dict__.items():
-                if isinstance(value, list):
-                    for item in value:
-                        if isinstance(item, ASTNode): self._collect_strings(item)
-                elif isinstance(value, ASTNode):
-                    self._collect_strings(value)
+    def _variable_type(self, node):
+        info = self.symbols.lookup(node.name)
+        return info[1] if info else Type.INT
+
+    _binary_type = staticmethod(binary_type)
+
+    def _method_type(self, node):
+        if node.method_name == 'get':
+            return self.list_kinds.get(node.object_name, Type.ELEMENT)
+        if node.method_name == 'len':
+            return Type.INT
+        # add и другие void методы можно считать INT или VOID
+        return Type.INT
+
+    def _annotate_types(self, node):
+        """
+        Аннотация типов: тип каждого узла вычисляется один раз, снизу вверх, и сохраняется в
+        node.inferred_type (правила те же, что в _infer_type). Вызывается после объявления локальных
+        переменных функции — кодогенерация читает аннотации вместо повторного вывода по всему поддереву.
+        """
+        children = NODE_CHILDREN.get(node.__class__)
+        if children is not None:
+            for child in children(node): self._annotate_types(child)
+        rule = self.TYPE_RULES.get(node.__class__)
+        node.inferred_type = rule(self, node) if rule else Type.INT
+
+    # Правила аннотации по классу узла; у остальных узлов тип INT, как в _infer_type
+    TYPE_RULES = {
+        Literal: lambda self, node: node.type,
+        Variable: _variable_type,
+        BinaryOp: lambda self, node: self._binary_type(node.operator, node.left.inferred_type,
+                                                       node.right.inferred_type),
+        MethodCall: _method_type,
+    }
+
+    def _collect_strings(self, program: Program):
+        """Уникальные строковые литералы программы в порядке появления (обход по NODE_CHILDREN, без рекурсии)."""
+        strings = {}
+        stack = [program]
+        while stack:
+            node = stack.pop()
+            cls = node.__class__
+            if cls is Literal and node.type == Type.STRING:
+                strings.setdefault(node.value)
+            children = NODE_CHILDREN.get(cls)
+            if children is not None:
+                stack.extend(reversed(children(node)))
+        return list(strings)
+
+    def _layout_strings(self, strings):
+        """
+        Раскладывает строки (с завершающим нулем) с адреса 0 и возвращает конец пула.
+        Строка, совпадающая с окончанием другой, отдельно не хранится: она указывает в хвост более длинной.
+        """
+        encoded = {value: value.encode('utf-8') for value in strings}
+        # Сортировка по перевернутым байтам ставит каждую строку рядом с теми, окончанием которых она является
+        owner_of = {}
+        owner = None
+        for value in sorted(strings, key=lambda v: encoded[v][::-1], reverse=True):
+            if owner is not None and encoded[owner].endswith(encoded[value]):
+                owner_of[value] = owner
+            else:
+                owner = value
+        offset = 0
+        for value in strings:
+            if value not in owner_of:
+                self.strings[value] = offset
+                self.string_data.append((offset, value))
+                offset += len(encoded[value]) + 1
+        for value, owner in owner_of.items():
+            self.strings[value] = self.strings[owner] + len(encoded[owner]) - len(encoded[value])
+        return offset
+
+    def _escape_data(self, value):
+        """Строка для сегмента данных WAT: кавычки, обратная косая черта и управляющие символы экранируются."""
+        out = []
+        for char in value:
+            if char == '"' or char == '\\':
+                out.append('\\' + char)
+            elif char < ' ' or char == '\x7f':
+                out.append(f'\\{ord(char):02X}')
+            else:
+                out.append(char)
+        return ''.join(out)
 
     def visit(self, node: ASTNode, indent=0):
-        method_name = f'visit_{node.node_type.name}'
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node, indent)
+        visitor = self.VISITORS.get(node.__class__)
+        if visitor is None:
+            return self.generic_visit(node, indent)
+        return visitor(self, node, indent)
 
     def generic_visit(self, node, indent):
         print(f"Warning: No visitor for {node.node_type}")
@@ -599,8 +1508,13 @@ class WASMCompiler:
             self.current_func_return_type = Type.VOID
         self.emit(f'(func ${mangled_name}{params_str}{result_str}', indent)
         self.for_loop_counter = 0
+        self.switch_counter = 0
+        self.list_kinds = self._infer_list_kinds(node.body, [p.name for p in node.parameters])
         self._scan_and_declare_locals(node.body)
         self.for_loop_counter = 0
+        self.switch_counter = 0
+        self.owned_lists = self._find_owned_lists(node.body, [p.name for p in node.parameters])
+        for stmt in node.body: self._annotate_types(stmt)
         for stmt in node.body: self._visit_statement(stmt, indent + 1)
         if not is_void and not isinstance(node.body[-1], ReturnStatement):
             if "f32" in result_str:
@@ -618,10 +1532,12 @@ class WASMCompiler:
                 self.emit('drop', indent)
                 continue
             wasm_name, v_type, is_global, is_ref = info
-            if v_type == Type.INT and self.last_expr_type == Type.FLOAT:
-                self.emit('i32.trunc_f32_s', indent)
-            elif v_type == Type.FLOAT and self.last_expr_type == Type.INT:
-                self.emit('f32.convert_i32_s', indent)
+            self._emit_coerce(self.last_expr_type, v_type, indent)
+            if target_name in self.owned_lists:
+                # Прежний список больше недостижим
+                flat = target_name in self.list_kinds or self.value_repr == 'tagged'
+                self.emit(f'{"global" if is_global else "local"}.get {wasm_name}', indent)
+                self.emit('call $list_free_flat' if flat else 'call $list_free', indent)
 
             # if is_ref:
             #     if v_type == Type.FLOAT:
@@ -634,15 +1550,56 @@ class WASMCompiler:
             #         self.emit(f'local.get {wasm_name}', indent)
             #         self.emit('global.get $temp_i32', indent)
             #         self.emit('i32.store', indent)
-            elif is_global:
+            if is_global:
                 self.emit(f'global.set {wasm_name}', indent)
             else:
                 self.emit(f'local.set {wasm_name}', indent)
 
+    def _wasm_type(self, var_type):
+        if var_type == Type.FLOAT: return 'f32'
+        if var_type == Type.ELEMENT and self.value_repr == 'tagged': return 'i64'
+        return 'i32'
+
+    def _emit_coerce(self, src_type, dst_type, indent):
+        """Приводит значение на стеке к типу dst_type: int <-> float, распаковка/упаковка элемента."""
+        if src_type == dst_type: return
+        if src_type == Type.ELEMENT:
+            if dst_type == Type.FLOAT:
+                self.emit('call $unbox_f32', indent)
+            elif dst_type in (Type.INT, Type.BOOL, Type.LIST):
+                # Список в полиморфном списке хранится как целое: значение — указатель на заголовок
+                self.emit('call $unbox_i32', indent)
+        elif dst_type == Type.ELEMENT:
+            if self.value_repr == 'tagged' and src_type in (Type.INT, Type.BOOL, Type.FLOAT, Type.STRING):
+                if src_type == Type.FLOAT: self.emit('i32.reinterpret_f32', indent)
+                self.emit('i64.extend_i32_u', indent)
+                self.emit('i64.const 32', indent)
+                self.emit('i64.shl', indent)
+                tag = self._type_code(src_type)
+                if tag:
+                    self.emit(f'i64.const {tag}', indent)
+                    self.emit('i64.or', indent)
+        elif dst_type in (Type.INT, Type.BOOL) and src_type == Type.FLOAT:
+            self.emit('i32.trunc_f32_s', indent)
+        elif dst_type == Type.FLOAT and src_type in (Type.INT, Type.BOOL):
+            self.emit('f32.convert_i32_s', indent)
+
+    def _type_code(self, value_type):
+        """Тег типа в ячейке/слоте полиморфного списка."""
+        if value_type == Type.FLOAT: return 1
+        if value_type == Type.STRING: return 2
+        return 0
+
+    def _slot_size(self, node):
+        """Размер слота массива данных списка-выражения."""
+        if self._list_kind(node) is None and self.value_repr == 'tagged': return 8
+        return 4
+
     def visit_LITERAL(self, node: Literal, indent):
         self.last_expr_type = node.type
         if node.type == Type.INT:
-            self.emit(f'i32.const {node.value}', indent)
+            # Литерал вне диапазона i32 берется по модулю 2^32, как и при свертке констант
+            self.emit(f'i32.const {wrap_i32(node.value)}', indent)
         elif node.type == Type.FLOAT:
             self.emit(f'f32.const {node.value}', indent)
         elif node.type == Type.BOOL:
@@ -685,8 +1642,8 @@ class WASMCompiler:
             self.emit(f'local.get {wasm_name}', indent)
 
     def visit_BINARY_OP(self, node: BinaryOp, indent):
-        left_type = self._infer_type(node.left)
-        right_type = self._infer_type(node.right)
+        left_type = node.left.inferred_type
+        right_type = node.right.inferred_type
 
         def unbox_if_needed(val_type, target_is_float):
             if val_type == Type.ELEMENT:
@@ -697,13 +1654,16 @@ class WASMCompiler:
                 else:
                     # Иначе приводим к int (даже если там float)
                     self.emit('call $unbox_i32', indent)
-            elif val_type == Type.INT and target_is_float:
+            elif val_type in (Type.INT, Type.BOOL) and target_is_float:
                 self.emit('f32.convert_i32_s', indent)
 
         if left_type == Type.LIST or right_type == Type.LIST:
             self.visit(node.left, indent)
+            self._emit_coerce(left_type, Type.LIST, indent)
             self.visit(node.right, indent)
+            self._emit_coerce(right_type, Type.LIST, indent)
             if node.operator == '+':
+                self.emit(f'i32.const {self._slot_size(node)}', indent)
                 self.emit('call $list_concat', indent)
                 self.last_expr_type = Type.LIST
             return
@@ -715,7 +1675,7 @@ class WASMCompiler:
         unbox_if_needed(right_type, is_float_op)
         op_code = self._get_binary_opcode(node.operator, is_float_op)
         self.emit(op_code, indent)
-        self.last_expr_type = Type.FLOAT if is_float_op else Type.INT
+        self.last_expr_type = Type.FLOAT if is_float_op and node.operator not in COMPARISON_OPERATORS else Type.INT
 
     def _get_binary_opcode(self, op, is_float):
         if is_float:
@@ -725,6 +1685,8 @@ class WASMCompiler:
             if op == '/': return 'f32.div'
             if op == '<': return 'f32.lt'
             if op == '>': return 'f32.gt'
+            if op == '<=': return 'f32.le'
+            if op == '>=': return 'f32.ge'
             if op == '==': return 'f32.eq'
             if op == '!=': return 'f32.ne'
             return 'f32.add'
@@ -738,16 +1700,21 @@ class WASMCompiler:
             if op == '!=': return 'i32.ne'
             if op == '<': return 'i32.lt_s'
             if op == '>': return 'i32.gt_s'
+            if op == '<=': return 'i32.le_s'
+            if op == '>=': return 'i32.ge_s'
             if op == '&&': return 'i32.and'
             if op == '||': return 'i32.or'
             return 'i32.add'
 
     def visit_UNARY_OP(self, node: UnaryOp, indent):
         self.visit(node.operand, indent)
+        self._emit_coerce(node.operand.inferred_type, Type.INT, indent)
         if node.operator == '!': self.emit('i32.eqz', indent)
+        self.last_expr_type = Type.INT
 
     def visit_IF_STATEMENT(self, node: IfStatement, indent):
         self.visit(node.condition, indent)
+        self._emit_coerce(node.condition.inferred_type, Type.INT, indent)
         self.emit('if', indent)
         for stmt in node.then_body: self._visit_statement(stmt, indent + 1)
         if node.else_body:
@@ -762,6 +1729,7 @@ class WASMCompiler:
         self.emit(f'block {break_label}', indent)
         self.emit(f'loop {cont_label}', indent + 1)
         self.visit(node.condition, indent + 2)
+        self._emit_coerce(node.condition.inferred_type, Type.INT, indent + 2)
         self.emit('i32.eqz', indent + 2)
         self.emit(f'br_if {break_label}', indent + 2)
         for stmt in node.body: self._visit_statement(stmt, indent + 2)
@@ -777,13 +1745,11 @@ class WASMCompiler:
         len_var = f"$for_len_{loop_id}"
         ptr_var = f"$for_ptr_{loop_id}"
         self.visit(node.iterables[0], indent)
+        self._emit_coerce(node.iterables[0].inferred_type, Type.LIST, indent)
         self.emit(f'local.set {ptr_var}', indent)
         self.emit(f'local.get {ptr_var}', indent)
         self.emit('i32.load', indent)
         self.emit(f'local.set {len_var}', indent)
-        self.emit(f'local.get {ptr_var}', indent)
-        self.emit('i32.load offset=4', indent)
-        self.emit(f'local.set {ptr_var}', indent)
         self.emit('i32.const 0', indent)
         self.emit(f'local.set {idx_var}', indent)
         break_label = f"$break_for_{loop_id}"
@@ -799,12 +1765,18 @@ class WASMCompiler:
         info = self.symbols.lookup(target_name)
         if info:
             user_var = info[0]
+            kind = self._list_kind(node.iterables[0])
+            load_op = 'f32.load' if kind == Type.FLOAT else f'{self._wasm_type(kind or Type.ELEMENT)}.load'
+            # Массив данных перечитывается из заголовка: тело цикла может расширить список
             self.emit(f'local.get {ptr_var}', indent + 2)
+            self.emit('i32.load offset=4', indent + 2)
             self.emit(f'local.get {idx_var}', indent + 2)
-            self.emit('i32.const 4', indent + 2)
+            self.emit(f'i32.const {self._slot_size(node.iterables[0])}', indent + 2)
             self.emit('i32.mul', indent + 2)
             self.emit('i32.add', indent + 2)
-            self.emit('i32.load', indent + 2)
+            self.emit(load_op, indent + 2)
+            # Переменная могла быть объявлена присваиванием другого типа
+            self._emit_coerce(kind or Type.ELEMENT, info[1], indent + 2)
             self.emit(f'local.set {user_var}', indent + 2)
         for stmt in node.body: self._visit_statement(stmt, indent + 2)
         self.emit(f'local.get {idx_var}', indent + 2)
@@ -825,31 +1797,42 @@ class WASMCompiler:
                 self.visit(node.values[0], indent)
             else:
                 self.visit(node.values, indent)
-            if self.current_func_return_type == Type.INT and self.last_expr_type == Type.FLOAT:
-                self.emit('i32.trunc_f32_s', indent)
-            elif self.current_func_return_type == Type.FLOAT and self.last_expr_type == Type.INT:
-                self.emit('f32.convert_i32_s', indent)
+            self._emit_coerce(self.last_expr_type, self.current_func_return_type, indent)
         self.emit('return', indent)
 
     def visit_CALL(self, node: FunctionCall, indent):
         if node.name == 'write':
             for arg in node.arguments:
-                target_type = self._infer_type(arg)
+                target_type = arg.inferred_type
                 self.visit(arg, indent)
                 if target_type == Type.LIST:
-                    self.emit('call $print_list', indent)
+                    kind = self._list_kind(arg)
+                    if kind == Type.INT:
+                        self.emit('call $print_list_i32', indent)
+                    elif kind == Type.FLOAT:
+                        self.emit('call $print_list_f32', indent)
+                    else:
+                        self.emit('call $print_list', indent)
                 elif target_type == Type.STRING:
                     self.emit('call $print_string', indent)
                 elif target_type == Type.FLOAT:
                     self.emit('call $print_f32', indent)
                 elif target_type == Type.ELEMENT:
-                    self.emit('i32.load offset=4', indent)  # Unbox for printing
+                    # Unbox for printing
+                    if self.value_repr == 'tagged':
+                        self.emit('i64.const 32', indent)
+                        self.emit('i64.shr_u', indent)
+                        self.emit('i32.wrap_i64', indent)
+                    else:
+                        self.emit('i32.load offset=4', indent)
                     self.emit('call $print_i32', indent)
                 else:
                     self.emit('call $print_i32', indent)
+            self.last_expr_type = Type.VOID
             return
         if node.name == 'read':
             self.emit('call $read_i32', indent)
+            self.last_expr_type = Type.INT
             return
         if node.name == 'swap':
             arg1 = node.arguments[0]
@@ -878,7 +1861,7 @@ class WASMCompiler:
             return
         mangled_name = f"{node.name}_{len(node.arguments)}"
         for arg in node.arguments:
-            arg_type = self._infer_type(arg)
+            arg_type = arg.inferred_type
             self.visit(arg, indent)
 
             # Если передаем ELEMENT, нужно его распаковать.
@@ -887,39 +1870,112 @@ class WASMCompiler:
             if arg_type == Type.ELEMENT:
                 self.emit('call $unbox_i32', indent)
         self.emit(f'call ${mangled_name}', indent)
+        self.last_expr_type = Type.VOID if mangled_name in self.void_functions else Type.INT
 
 
     def visit_SWITCH_STATEMENT(self, node: SwitchStatement, indent):
-        temp_var = self.symbols.declare(f"switch_temp_{len(self.loop_stack)}", Type.INT)
-        self.emit(f'(local {temp_var} i32)', indent)
-        self.visit(node.expression, indent)
-        self.emit(f'local.set {temp_var}', indent)
-
-        def build_cases(cases, index):
-            if index >= len(cases):
-                if node.default_case:
-                    for stmt in node.default_case: self._visit_statement(stmt, indent + 1)
-                return
-            case = cases[index]
-            self.emit(f'local.get {temp_var}', indent)
-            self.visit(case.value, indent)
-            self.emit('i32.eq', indent)
-            self.emit('if', indent)
+        """
+        Тела веток лежат друг за другом во вложенных блоках: выход из блока $case_i ведет к телу i-й ветки,
+        из $case_default — к ветке default. Ветки не проваливаются в следующие; break выходит из switch.
+        Переход к ветке выбирается через br_table, бинарным поиском или цепочкой сравнений (_switch_dispatch).
+        """
+        switch_id = self.switch_counter
+        self.switch_counter += 1
+        temp_var = f'$switch_{switch_id}'
+        end_label = f'$switch_end_{switch_id}'
+        default_label = f'$case_default_{switch_id}'
+        case_labels = [f'$case_{i}_{switch_id}' for i in range(len(node.cases))]
+
+        self.emit(f'block {end_label}', indent)
+        self.visit(node.expression, indent + 1)
+        self._emit_coerce(node.expression.inferred_type, Type.INT, indent + 1)
+        self.emit(f'local.set {temp_var}', indent + 1)
+        self.emit(f'block {default_label}', indent + 1)
+        for label in reversed(case_labels): self.emit(f'block {label}', indent + 1)
+        self._switch_dispatch(node.cases, case_labels, default_label, temp_var, indent + 2)
+
+        self.loop_stack.append((end_label, None))
+        for case in node.cases:
+            self.emit('end', indent + 1)
             for stmt in case.body: self._visit_statement(stmt, indent + 1)
-            self.emit('else', indent)
-            build_cases(cases, index + 1)
-            self.emit('end', indent)
+            self.emit(f'br {end_label}', indent + 1)
+        self.emit('end', indent + 1)
+        for stmt in node.default_case or (): self._visit_statement(stmt, indent + 1)
+        self.loop_stack.pop()
+        self.emit('end', indent)
+
+    def _switch_dispatch(self, cases, case_labels, default_label, temp_var, indent):
+        keys = [_int_case_key(case.value) for case in cases]
+        if None in keys:
+            # Произвольные выражения: сравнения по порядку, значения вычисляются до первого совпадения
+            for case, label in zip(cases, case_labels):
+                self.emit(f'local.get {temp_var}', indent)
+                self.visit(case.value, indent)
+                self._emit_coerce(case.value.inferred_type, Type.INT, indent)
+                self.emit('i32.eq', indent)
+                self.emit(f'br_if {label}', indent)
+            self.emit(f'br {default_label}', indent)
+            return
+
+        # Повторное значение недостижимо: срабатывает первая ветка с ним
+        targets = {}
+        for key, label in zip(keys, case_labels): targets.setdefault(key, label)
+        low, high = min(targets), max(targets)
+        if len(targets) >= self.JUMP_TABLE_MIN_CASES and high - low + 1 <= 2 * len(targets):
+            table = ' '.join(targets.get(key, default_label) for key in range(low, high + 1))
+            self.emit(f'local.get {temp_var}', indent)
+            if low:
+                self.emit(f'i32.const {low}', indent)
+                self.emit('i32.sub', indent)
+            self.emit(f'br_table {table} {default_label}', indent)
+            return
+        self._switch_search(sorted(targets.items()), default_label, temp_var, indent)
+
+    def _switch_search(self, items, default_label, temp_var, indent):
+        """Бинарный поиск по отсортированным (значение, метка): каждая ветвь заканчивается переходом."""
+        if len(items) <= self.SWITCH_LINEAR_CASES:
+            for key, label in items:
+                self.emit(f'local.get {temp_var}', indent)
+                self.emit(f'i32.const {key}', indent)
+                self.emit('i32.eq', indent)
+                self.emit(f'br_if {label}', indent)
+            self.emit(f'br {default_label}', indent)
+            return
+        middle = len(items) // 2
+        self.emit(f'local.get {temp_var}', indent)
+        self.emit(f'i32.const {items[middle][0]}', indent)
+        self.emit('i32.lt_s', indent)
+        self.emit('if', indent)
+        self._switch_search(items[:middle], default_label, temp_var, indent + 1)
+        self.emit('end', indent)
+        self._switch_search(items[middle:], default_label, temp_var, indent)
 
-        build_cases(node.cases, 0)
+    def _emit_list_header(self, info, indent):
+        """Кладет на стек заголовок списка из переменной (элемент другого списка распаковывается)."""
+        var_name, var_type, _, _ = info
+        self.emit(f'local.get {var_name}', indent)
+        self._emit_coerce(var_type, Type.LIST, indent)
 
     def visit_METHOD_CALL(self, node: MethodCall, indent):
         if node.method_name == "add":
             info = self.symbols.lookup(node.object_name)
             if not info: return
-            var_name, _, _, _ = info
-            self.emit(f'local.get {var_name}', indent)
+            self._emit_list_header(info, indent)
             arg_node = node.arguments[0]
-            arg_type = self._infer_type(arg_node)
+            kind = self.list_kinds.get(node.object_name)
+            if kind is not None:
+                # Однородный список: значение кладется прямо в массив
+                self.visit(arg_node, indent)
+                self.emit('call $list_add_f32' if kind == Type.FLOAT else 'call $list_add_i32', indent)
+                self.last_expr_type = Type.VOID
+                return
+            arg_type = arg_node.inferred_type
+            if arg_type == Type.ELEMENT:
+                # Элемент другого списка уже упакован — копируем ячейку/слот целиком
+                self.visit(arg_node, indent)
+                self.emit('call $list_add_tagged' if self.value_repr == 'tagged' else 'call $list_add_cell', indent)
+                self.last_expr_type = Type.VOID
+                return
             type_code = 0
             if arg_type == Type.FLOAT:
                 type_code = 1
@@ -933,20 +1989,44 @@ class WASMCompiler:
         elif node.method_name == "len":
             info = self.symbols.lookup(node.object_name)
             if not info: return
-            var_name, _, _, _ = info
-            self.emit(f'local.get {var_name}', indent)
+            self._emit_list_header(info, indent)
             self.emit('i32.load', indent)
             self.last_expr_type = Type.INT
         elif node.method_name == "get":
             info = self.symbols.lookup(node.object_name)
             if not info: return
-            var_name, _, _, _ = info
-            self.emit(f'local.get {var_name}', indent)
+            self._emit_list_header(info, indent)
             if len(node.arguments) > 0:
                 self.visit(node.arguments[0], indent)
             else:
                 self.emit('i32.const 0', indent)
-            self.emit('call $list_get', indent)
-            self.last_expr_type = Type.ELEMENT
+            kind = self.list_kinds.get(node.object_name)
+            if kind == Type.INT:
+                self.emit('call $list_get_i32', indent)
+            elif kind == Type.FLOAT:
+                self.emit('call $list_get_f32', indent)
+            else:
+                self.emit('call $list_get', indent)
+            self.last_expr_type = kind or Type.ELEMENT
         else:
-            print(f"Unknown method {node.method_name}")
\ No newline at end of file
+            print(f"Unknown method {node.method_name}")
+
+    # Диспетчеризация по классу узла: один поиск в словаре на узел.
+    # MemberAccess (node_type VARIABLE) обрабатывается, как и раньше, visit_VARIABLE
+    VISITORS = {
+        Function: visit_FUNCTION,
+        Assignment: visit_ASSIGNMENT,
+        Literal: visit_LITERAL,
+        Variable: visit_VARIABLE,
+        MemberAccess: visit_VARIABLE,
+        BinaryOp: visit_BINARY_OP,
+        UnaryOp: visit_UNARY_OP,
+        IfStatement: visit_IF_STATEMENT,
+        WhileStatement: visit_WHILE_STATEMENT,
+        ForStatement: visit_FOR_STATEMENT,
+        BreakStatement: visit_BREAK_STATEMENT,
+        ReturnStatement: visit_RETURN_STATEMENT,
+        FunctionCall: visit_CALL,
+        SwitchStatement: visit_SWITCH_STATEMENT,
+        MethodCall: visit_METHOD_CALL,
+    }
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import pickle
+import stat
+import sys
+import tempfile
+
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.SemanticContext import SemanticContext
+
+from gen.ListLangLexer import ListLangLexer
+from gen.ListLangParser import ListLangParser
+from .cache import PACKAGE_ROOT, default_cache_dir
+
+# Кэш DFA предсказания ANTLR между запусками компилятора.
+# ANTLR строит DFA лениво и хранит его в атрибутах классов (decisionsToDFA, sharedContextCache), поэтому внутри
+# одного процесса «прогрев» сохраняется сам; здесь эти таблицы сохраняются в файл и загружаются при старте.
+#
+# ATN не сериализуется: состояния ATN, синглтоны рантайма (EMPTY, NONE, ERROR) записываются ссылками
+# (persistent_id) и при загрузке связываются с уже построенными объектами текущего процесса — иначе
+# проверки `is` внутри рантайма перестают работать.
+
+RECOGNIZERS = {'parser': ListLangParser, 'lexer': ListLangLexer}
+
+_SINGLETONS = {
+    'EMPTY_CONTEXT': PredictionContext.EMPTY,
+    'SEMANTIC_NONE': SemanticContext.NONE,
+    'PARSER_ERROR': ATNSimulator.ERROR,
+    'LEXER_ERROR': LexerATNSimulator.ERROR,
+}
+
+# Классы рантайма ANTLR, из которых состоят DFA; файл кэша, ссылающийся на что-либо еще, не загружается
+_ALLOWED_CLASSES = {
+    'antlr4.dfa.DFA': {'DFA'},
+    'antlr4.dfa.DFAState': {'DFAState', 'PredPrediction'},
+    'antlr4.atn.ATNConfig': {'ATNConfig', 'LexerATNConfig'},
+    'antlr4.atn.ATNConfigSet': {'ATNConfigSet', 'OrderedATNConfigSet'},
+    'antlr4.PredictionContext': {'PredictionContextCache', 'SingletonPredictionContext', 'EmptyPredictionContext',
+                                 'ArrayPredictionContext'},
+    'antlr4.atn.SemanticContext': {'Predicate', 'PrecedencePredicate', 'AND', 'OR'},
+    'antlr4.atn.LexerActionExecutor': {'LexerActionExecutor'},
+    'antlr4.atn.LexerAction': {'LexerActionType', 'LexerSkipAction', 'LexerTypeAction', 'LexerPushModeAction',
+                               'LexerPopModeAction', 'LexerMoreAction', 'LexerModeAction', 'LexerCustomAction',
+                               'LexerChannelAction', 'LexerIndexedCustomAction'},
+}
+
+
+def dfa_cache_path(directory=None):
+    """Файл кэша зависит от сгенерированных лексера и парсера, версии рантайма ANTLR и Python."""
+    h = hashlib.sha256()
+    for name in ('ListLangLexer.py', 'ListLangParser.py'):
+        with open(os.path.join(PACKAGE_ROOT, 'gen', name), 'rb') as f:
+            h.update(f.read())
+    h.update(f'{_runtime_version()}|{sys.version_info[:2]}'.encode('utf-8'))
+    return os.path.join(directory or default_cache_dir(), f'dfa-{h.hexdigest()[:16]}.pickle')
+
+
+def _runtime_version():
+    try:
+        from importlib.metadata import version
+        return version('antlr4-python3-runtime')
+    except Exception:
+        return 'unknown'
+
+
+def dfa_state_count():
+    return sum(len(dfa.states) for cls in RECOGNIZERS.values() for dfa in cls.decisionsToDFA)
+
+
+class _DFAPickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.refs = {id(obj): ('singleton', key) for key, obj in _SINGLETONS.items()}
+        for kind, cls in RECOGNIZERS.items():
+            for state in cls.atn.states:
+                if state is not None:
+                    self.refs[id(state)] = ('state', kind, state.stateNumber)
+
+    def persistent_id(self, obj):
+        return self.refs.get(id(obj))
+
+
+class _DFAUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name not in _ALLOWED_CLASSES.get(module, ()):
+            raise pickle.UnpicklingError(f"{module}.{name} is not allowed in the DFA cache")
+        return super().find_class(module, name)
+
+    def persistent_load(self, pid):
+        if pid[0] == 'singleton':
+            return _SINGLETONS[pid[1]]
+        _, kind, number = pid
+        return RECOGNIZERS[kind].atn.states[number]
+
+
+def save_dfa_cache(path):
+    """Сохраняет текущие DFA лексера и парсера (атомарно); ошибки записи игнорируются."""
+    payload = {kind: (cls.decisionsToDFA, getattr(cls, 'sharedContextCache', None))
+               for kind, cls in RECOGNIZERS.items()}
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            _DFAPickler(f).dump(payload)
+        os.replace(tmp_path, path)
+        return True
+    except (OSError, pickle.PicklingError, RecursionError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def _trusted(f):
+    """Файл принадлежит текущему пользователю и недоступен для записи группе и остальным."""
+    info = os.fstat(f.fileno())
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        return False
+    # Без os.getuid (Windows) владелец не проверяется
+    return not hasattr(os, 'getuid') or info.st_uid == os.getuid()
+
+
+def load_dfa_cache(path):
+    """Подставляет сохраненные DFA в классы лексера и парсера. Вызывать до создания их экземпляров.
+
+    Каталог кэша может быть общим, поэтому файл чужого пользователя или доступный другим для записи
+    не загружается, а распаковка ограничена классами DFA рантайма ANTLR.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if not _trusted(f):
+                return False
+            payload = _DFAUnpickler(f).load()
+        if any(len(payload[kind][0]) != len(cls.decisionsToDFA) for kind, cls in RECOGNIZERS.items()):
+            return False
+    except Exception:
+        # Отсутствующий или поврежденный кэш — просто холодный старт
+        return False
+    for kind, (dfas, context_cache) in payload.items():
+        cls = RECOGNIZERS[kind]
+        cls.decisionsToDFA[:] = dfas
+        if context_cache is not None:
+            cls.sharedContextCache = context_cache
+    return True
@@ -0,0 +1,1034 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .ast_nodes import *
+from .compiler import NODE_CHILDREN, binary_type
+from .optimizer import variable_types, fold_binary, fold_not, wrap_i32
+
+# Трехадресный код для -O2. Тело функции (и основная программа) понижается в четверки (op, arg1, arg2, result),
+# разбитые на базовые блоки с графом потока управления; над графом работают распространение копий, устранение
+# общих подвыражений, вынос инвариантов из циклов и удаление бесполезного кода. Затем IR поднимается обратно
+# в AST, и кодогенерация остается прежней: значение, нужное в нескольких местах, становится локальной переменной
+# `t.N` (точка не встречается в именах ListLang), а используемое один раз подставляется обратно в выражение.
+
+BINARY_OPERATORS = frozenset(('+', '-', '*', '/', '%', '&&', '||', '==', '!=', '<', '>', '<=', '>='))
+COMMUTATIVE_OPERATORS = frozenset(('+', '*', '&&', '||', '==', '!='))
+# Операции, у которых arg2 — список операндов
+LIST_OPERAND_OPS = frozenset(('call', 'method', 'assign', 'return', 'for'))
+# Операции, у которых arg1 — единственный операнд
+SINGLE_OPERAND_OPS = frozenset(('!', 'copy', 'if', 'switch'))
+# Четверки, задающие переход в конце блока; в AST они становятся условием или заголовком оператора
+CONTROL_OPS = frozenset(('if', 'switch', 'for', 'iter'))
+# Типы значений, с которыми работают оптимизации: параметры без объявленного типа компилируются как i32
+# (кортеж, а не множество: проверка членства не вызывает Enum.__hash__)
+VALUE_TYPES = (Type.INT, Type.FLOAT, Type.BOOL, Type.UNKNOWN)
+ZERO_VALUES = {Type.INT: 0, Type.BOOL: False, Type.FLOAT: 0.0}
+TEMP_PREFIX = 't.'
+MAX_ROUNDS = 4
+
+
+class IRError(Exception):
+    """IR нельзя поднять обратно в AST без изменения смысла программы."""
+
+
+def is_temp(operand):
+    return operand.__class__ is str and operand.startswith(TEMP_PREFIX)
+
+
+class Quad:
+    """
+    Четверка (op, arg1, arg2, result). Операнд — имя переменной (str) или Literal.
+
+    op — бинарный оператор, '!', 'copy' (result = arg1), 'call' (arg1 — имя функции, arg2 — аргументы),
+    'method' (arg1 — имя списка, arg2 — аргументы), 'expr' (arg1 — узел AST, который IR не разбирает),
+    'assign' (множественное присваивание: arg1 — цели, arg2 — значения), 'swap', 'return' (arg2 — значения),
+    'break', а также управляющие 'if', 'switch' (arg2 — значения веток), 'for' (arg2 — итерируемые) и
+    'iter' (arg1 — переменные цикла). origin — узел AST, из которого получена четверка; declares — это
+    первое присваивание переменной, по которому компилятор объявляет ее тип.
+    """
+    __slots__ = ('op', 'arg1', 'arg2', 'result', 'origin', 'declares')
+
+    def __init__(self, op, arg1=None, arg2=None, result=None, origin=None):
+        self.op = op
+        self.arg1 = arg1
+        self.arg2 = arg2
+        self.result = result
+        self.origin = origin
+        self.declares = False
+
+    def operands(self):
+        op = self.op
+        if op in BINARY_OPERATORS: return (self.arg1, self.arg2)
+        if op in SINGLE_OPERAND_OPS: return (self.arg1,)
+        if op in LIST_OPERAND_OPS: return self.arg2 or ()
+        return ()
+
+    def map_operands(self, function):
+        op = self.op
+        if op in BINARY_OPERATORS:
+            self.arg1, self.arg2 = function(self.arg1), function(self.arg2)
+        elif op in SINGLE_OPERAND_OPS:
+            self.arg1 = function(self.arg1)
+        elif op in LIST_OPERAND_OPS and self.arg2:
+            self.arg2 = [function(operand) for operand in self.arg2]
+
+    def defs(self):
+        if self.result is not None: return {self.result}
+        op = self.op
+        if op == 'swap': return {self.arg1, self.arg2}
+        if op == 'assign' or op == 'iter': return set(self.arg1)
+        return set()
+
+    def uses(self):
+        names = {operand for operand in self.operands() if operand.__class__ is str}
+        op = self.op
+        if op == 'method': names.add(self.arg1)
+        elif op == 'swap': names.update((self.arg1, self.arg2))
+        elif op == 'expr': names.update(ast_names(self.arg1))
+        elif op == 'switch':
+            for value in self.arg2: names.update(ast_names(value))
+        return names
+
+    def __repr__(self):
+        arg1 = self.arg1.__class__.__name__ if isinstance(self.arg1, ASTNode) and self.arg1.__class__ is not Literal \
+            else _show(self.arg1)
+        return f"({self.op}, {arg1}, {_show(self.arg2)}, {self.result})"
+
+
+def _show(operand):
+    if operand.__class__ is Literal: return repr(operand.value)
+    if operand.__class__ is list: return '[' + ', '.join(_show(item) for item in operand) + ']'
+    return '' if operand is None else str(operand)
+
+
+def clone(node):
+    """Поверхностная копия узла AST (без выведенного типа)."""
+    cls = node.__class__
+    new = cls.__new__(cls)
+    for name in cls._fields: setattr(new, name, getattr(node, name))
+    new.inferred_type = None
+    return new
+
+
+def ast_names(node):
+    """Имена переменных, которые читает выражение AST."""
+    names = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        cls = node.__class__
+        if cls is Variable: names.add(node.name)
+        elif cls is MethodCall or cls is MemberAccess: names.add(node.object_name)
+        children = NODE_CHILDREN.get(cls)
+        if children is not None: stack.extend(children(node))
+    return names
+
+
+def ast_effects(node):
+    """(читаемые переменные, записываемые переменные, побочные эффекты, чтение памяти списков) узла AST.
+    Деление считается побочным эффектом (ловушка при делении на ноль), сложение — чтением памяти
+    (конкатенация списков)."""
+    reads, writes = set(), set()
+    impure = memory = False
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        cls = node.__class__
+        if cls is Variable:
+            reads.add(node.name)
+        elif cls is Assignment:
+            writes.update(node.targets)
+        elif cls is FunctionCall:
+            if node.name == 'swap':
+                writes.update(arg.name for arg in node.arguments if arg.__class__ is Variable)
+            else:
+                impure = True
+        elif cls is MethodCall:
+            reads.add(node.object_name)
+            if node.method_name == 'get' or node.method_name == 'len': memory = True
+            else: impure = True
+        elif cls is MemberAccess:
+            reads.add(node.object_name)
+            memory = True
+        elif cls is BinaryOp:
+            if node.operator == '/' or node.operator == '%': impure = True
+            elif node.operator == '+': memory = True
+        elif cls is Literal and node.type == Type.LIST:
+            impure = True
+        children = NODE_CHILDREN.get(cls)
+        if children is not None: stack.extend(children(node))
+    return reads, writes, impure, memory
+
+
+@dataclass(slots=True, eq=False)
+class BasicBlock:
+    index: int
+    quads: List[Quad] = field(default_factory=list)
+    successors: List['BasicBlock'] = field(default_factory=list)
+    predecessors: List['BasicBlock'] = field(default_factory=list)
+    is_header: bool = False  # заголовок цикла: поднимается в выражение, а не в операторы
+
+
+# Области — структура исходного тела поверх базовых блоков. Последовательность (items) — список блоков
+# и областей в порядке текста.
+
+@dataclass(slots=True, eq=False)
+class IfRegion:
+    origin: IfStatement
+    block: BasicBlock  # блок, заканчивающийся четверкой 'if'
+    then_items: list
+    else_items: Optional[list]
+
+
+@dataclass(slots=True, eq=False)
+class WhileRegion:
+    origin: WhileStatement
+    preheader: BasicBlock
+    header: BasicBlock
+    body: list
+    declared: int  # сколько переменных объявлено до цикла (см. FunctionIR.declaration_order)
+
+
+@dataclass(slots=True, eq=False)
+class ForRegion:
+    origin: ForStatement
+    preheader: BasicBlock  # заканчивается четверкой 'for' с итерируемыми значениями
+    head: BasicBlock
+    body: list
+    declared: int
+
+
+@dataclass(slots=True, eq=False)
+class SwitchRegion:
+    origin: SwitchStatement
+    block: BasicBlock  # блок, заканчивающийся четверкой 'switch'
+    cases: list
+    default: Optional[list]
+
+
+class FunctionIR:
+    """Трехадресный код тела функции: базовые блоки, граф потока управления и дерево областей."""
+
+    def __init__(self, stmts, params=()):
+        self.types = variable_types(stmts, params)
+        self.params = frozenset(param.name for param in params)
+        self.blocks = []
+        self.temp_count = 0
+        # Порядковый номер первого присваивания переменной (параметры — -1)
+        self.declaration_order = dict.fromkeys(self.params, -1)
+        self._break_targets = []
+        self.hoisted = set()  # четверки, вынесенные из циклов
+        self.exit = self._new_block()
+        self.entry = self._new_block()
+        self.items = self._lower_body(stmts, self.entry)
+        self._link(self.current, self.exit)
+
+    def type_of(self, operand):
+        if operand.__class__ is Literal: return operand.type
+        return self.types.get(operand)
+
+    def dump(self):
+        lines = []
+        for block in self.blocks:
+            successors = ', '.join(str(succ.index) for succ in block.successors)
+            lines.append(f"B{block.index}{' header' if block.is_header else ''} -> [{successors}]")
+            lines.extend(f"    {quad!r}" for quad in block.quads)
+        return '\n'.join(lines)
+
+    # --- Понижение AST ---
+
+    def _new_block(self, is_header=False):
+        block = BasicBlock(len(self.blocks), is_header=is_header)
+        self.blocks.append(block)
+        return block
+
+    @staticmethod
+    def _link(source, target):
+        source.successors.append(target)
+        target.predecessors.append(source)
+
+    def _emit(self, quad):
+        self.current.quads.append(quad)
+        self._declare(quad)
+        return quad
+
+    def _declare(self, quad):
+        for name in quad.defs():
+            if name not in self.declaration_order and not is_temp(name):
+                self.declaration_order[name] = len(self.declaration_order)
+                quad.declares = True
+
+    def _new_temp(self, value_type):
+        self.temp_count += 1
+        temp = f"{TEMP_PREFIX}{self.temp_count}"
+        self.types[temp] = value_type
+        return temp
+
+    def _emit_value(self, op, arg1, arg2, value_type, origin):
+        temp = self._new_temp(value_type)
+        self._emit(Quad(op, arg1, arg2, temp, origin))
+        return temp
+
+    def _lower_body(self, stmts, entry):
+        """Понижает последовательность операторов, начиная с блока entry; self.current — ее последний блок."""
+        self.current = entry
+        items = [entry]
+        for stmt in stmts:
+            lower = self.STATEMENT_LOWERING.get(stmt.__class__)
+            if lower is not None: lower(self, stmt, items)
+            else: self._value(stmt)
+        return items
+
+    def _value(self, node):
+        """Понижает выражение; возвращает операнд с его значением (None для swap)."""
+        cls = node.__class__
+        if cls is Variable:
+            return node.name
+        if cls is Literal and node.type != Type.LIST:
+            return node
+        if cls is BinaryOp:
+            left, right = self._operand(node.left), self._operand(node.right)
+            left_type, right_type = self.type_of(left), self.type_of(right)
+            value_type = binary_type(node.operator, left_type, right_type) if left_type and right_type else None
+            return self._emit_value(node.operator, left, right, value_type, node)
+        if cls is UnaryOp:
+            return self._emit_value(node.operator, self._operand(node.operand), None, Type.INT, node)
+        if cls is FunctionCall:
+            args = node.arguments
+            if node.name == 'swap' and len(args) == 2 and args[0].__class__ is Variable \
+                    and args[1].__class__ is Variable:
+                self._emit(Quad('swap', args[0].name, args[1].name, origin=node))
+                return None
+            return self._emit_value('call', node.name, [self._operand(arg) for arg in args], None, node)
+        if cls is MethodCall:
+            args = [self._operand(arg) for arg in node.arguments]
+            value_type = Type.INT if node.method_name == 'len' else None
+            return self._emit_value('method', node.object_name, args, value_type, node)
+        return self._emit_value('expr', node, None, None, node)
+
+    def _operand(self, node):
+        operand = self._value(node)
+        if operand is None: raise IRError("swap used as a value")
+        return operand
+
+    def _lower_assignment(self, stmt: Assignment, items):
+        if len(stmt.targets) == 1 and len(stmt.values) == 1:
+            target = stmt.targets[0]
+            value = self._operand(stmt.values[0])
+            quads = self.current.quads
+            if is_temp(value) and quads and quads[-1].result == value:
+                # Значение вычисляется сразу в переменную, без промежуточной копии
+                quads[-1].result = target
+                self._declare(quads[-1])
+            else:
+                self._emit(Quad('copy', value, None, target, stmt))
+        else:
+            values = [self._operand(value) for value in stmt.values]
+            self._emit(Quad('assign', list(stmt.targets), values, None, stmt))
+
+    def _lower_if(self, stmt: IfStatement, items):
+        self._emit(Quad('if', self._operand(stmt.condition), origin=stmt))
+        block = self.current
+        join = self._new_block()
+        then_entry = self._new_block()
+        self._link(block, then_entry)
+        then_items = self._lower_body(stmt.then_body, then_entry)
+        self._link(self.current, join)
+        else_items = None
+        if stmt.else_body:
+            else_entry = self._new_block()
+            self._link(block, else_entry)
+            else_items = self._lower_body(stmt.else_body, else_entry)
+            self._link(self.current, join)
+        else:
+            self._link(block, join)
+        items.append(IfRegion(stmt, block, then_items, else_items))
+        items.append(join)
+        self.current = join
+
+    def _lower_loop_body(self, header, body):
+        """Тело цикла с заголовком header; возвращает (блок выхода, последовательность тела)."""
+        exit_block = self._new_block()
+        body_entry = self._new_block()
+        self._link(header, body_entry)
+        self._link(header, exit_block)
+        self._break_targets.append(exit_block)
+        body_items = self._lower_body(body, body_entry)
+        self._break_targets.pop()
+        self._link(self.current, header)
+        return exit_block, body_items
+
+    def _lower_while(self, stmt: WhileStatement, items):
+        declared = len(self.declaration_order)
+        preheader = self._new_block()
+        self._link(self.current, preheader)
+        header = self._new_block(is_header=True)
+        self._link(preheader, header)
+        self.current = header
+        self._emit(Quad('if', self._operand(stmt.condition), origin=stmt))
+        exit_block, body = self._lower_loop_body(header, stmt.body)
+        items.append(WhileRegion(stmt, preheader, header, body, declared))
+        items.append(exit_block)
+        self.current = exit_block
+
+    def _lower_for(self, stmt: ForStatement, items):
+        declared = len(self.declaration_order)
+        preheader = self._new_block()
+        self._link(self.current, preheader)
+        self.current = preheader
+        iterables = [self._operand(iterable) for iterable in stmt.iterables]
+        self._emit(Quad('for', None, iterables, origin=stmt))
+        head = self._new_block(is_header=True)
+        self._link(preheader, head)
+        self.current = head
+        self._emit(Quad('iter', list(stmt.targets), origin=stmt))
+        exit_block, body = self._lower_loop_body(head, stmt.body)
+        items.append(ForRegion(stmt, preheader, head, body, declared))
+        items.append(exit_block)
+        self.current = exit_block
+
+    def _lower_switch(self, stmt: SwitchStatement, items):
+        values = [case.value for case in stmt.cases]
+        self._emit(Quad('switch', self._operand(stmt.expression), values, origin=stmt))
+        block = self.current
+        exit_block = self._new_block()
+        self._break_targets.append(exit_block)
+        cases = []
+        for case in stmt.cases:
+            entry = self._new_block()
+            self._link(block, entry)
+            cases.append(self._lower_body(case.body, entry))
+            self._link(self.current, exit_block)
+        default = None
+        if stmt.default_case:
+            entry = self._new_block()
+            self._link(block, entry)
+            default = self._lower_body(stmt.default_case, entry)
+            self._link(self.current, exit_block)
+        else:
+            self._link(block, exit_block)
+        self._break_targets.pop()
+        items.append(SwitchRegion(stmt, block, cases, default))
+        items.append(exit_block)
+        self.current = exit_block
+
+    def _lower_break(self, stmt: BreakStatement, items):
+        # break вне цикла и switch компилятор пропускает
+        self._emit(Quad('break', bool(self._break_targets), origin=stmt))
+        if self._break_targets:
+            self._link(self.current, self._break_targets[-1])
+            self._start_unreachable(items)
+
+    def _lower_return(self, stmt: ReturnStatement, items):
+        values = None if stmt.values is None else [self._operand(value) for value in stmt.values]
+        self._emit(Quad('return', None, values, origin=stmt))
+        self._link(self.current, self.exit)
+        self._start_unreachable(items)
+
+    def _start_unreachable(self, items):
+        self.current = self._new_block()
+        items.append(self.current)
+
+    STATEMENT_LOWERING = {
+        Assignment: _lower_assignment,
+        IfStatement: _lower_if,
+        WhileStatement: _lower_while,
+        ForStatement: _lower_for,
+        SwitchStatement: _lower_switch,
+        BreakStatement: _lower_break,
+        ReturnStatement: _lower_return,
+    }
+
+    # --- Анализ потока данных ---
+
+    def reverse_postorder(self):
+        """Блоки, достижимые из входа, в обратном порядке обхода в глубину."""
+        order, seen = [], {self.entry.index}
+        stack = [(self.entry, iter(self.entry.successors))]
+        while stack:
+            block, successors = stack[-1]
+            for successor in successors:
+                if successor.index not in seen:
+                    seen.add(successor.index)
+                    stack.append((successor, iter(successor.successors)))
+                    break
+            else:
+                stack.pop()
+                order.append(block)
+        order.reverse()
+        return order
+
+    def _available(self, order, transfer):
+        """Прямой анализ «на всех путях»: факты (frozenset) на выходе каждого блока до неподвижной точки.
+        None — еще не посещенный блок (все факты)."""
+        out = {block.index: None for block in order}
+        changed = True
+        while changed:
+            changed = False
+            for block in order:
+                facts = frozenset(transfer(block, self._meet(block, out)))
+                if facts != out[block.index]:
+                    out[block.index] = facts
+                    changed = True
+        return out
+
+    def _meet(self, block, out):
+        if block is self.entry: return frozenset()
+        facts = None
+        for predecessor in block.predecessors:
+            predecessor_out = out.get(predecessor.index)
+            if predecessor_out is not None:
+                facts = predecessor_out if facts is None else facts & predecessor_out
+        return facts or frozenset()
+
+    def liveness(self):
+        """Множества переменных, живых на входе каждого блока."""
+        summaries = {}
+        for block in self.blocks:
+            used, defined = set(), set()
+            for quad in block.quads:
+                used |= quad.uses() - defined
+                defined |= quad.defs()
+            summaries[block.index] = (used, defined)
+        live_in = {block.index: set() for block in self.blocks}
+        changed = True
+        while changed:
+            changed = False
+            for block in reversed(self.blocks):
+                live_out = set()
+                for successor in block.successors: live_out |= live_in[successor.index]
+                used, defined = summaries[block.index]
+                live = used | (live_out - defined)
+                if live != live_in[block.index]:
+                    live_in[block.index] = live
+                    changed = True
+        return live_in
+
+    def is_pure(self, quad):
+        """Четверку можно удалить или вычислить в другом месте: нет вызовов, памяти и ловушек."""
+        op = quad.op
+        if op == 'copy':
+            source_type = self.type_of(quad.arg1)
+            return source_type in VALUE_TYPES or source_type == Type.STRING
+        if op == '!':
+            # i32.trunc_f32_s дает ловушку вне диапазона i32
+            return self.type_of(quad.arg1) in (Type.INT, Type.BOOL, Type.UNKNOWN)
+        if op in BINARY_OPERATORS:
+            left, right = self.type_of(quad.arg1), self.type_of(quad.arg2)
+            if left not in VALUE_TYPES or right not in VALUE_TYPES: return False
+            if (op == '/' or op == '%') and Type.FLOAT not in (left, right):
+                # i32.div_s / i32.rem_s: ловушка при делении на 0 и I32_MIN / -1
+                divisor = quad.arg2
+                return divisor.__class__ is Literal and wrap_i32(int(divisor.value)) not in (0, -1)
+            return True
+        return False
+
+    def value_type(self, quad):
+        op = quad.op
+        if op == 'copy': return self.type_of(quad.arg1)
+        if op == '!': return Type.INT
+        if op in BINARY_OPERATORS:
+            left, right = self.type_of(quad.arg1), self.type_of(quad.arg2)
+            return binary_type(op, left, right) if left and right else None
+        return None
+
+    @staticmethod
+    def _key(operand):
+        if operand.__class__ is Literal:
+            # repr различает 0.0 и -0.0
+            return (operand.type, repr(operand.value), operand.value)
+        return operand
+
+    @staticmethod
+    def _operand_of(key):
+        return key if key.__class__ is str else Literal(key[2], key[0])
+
+    # --- Свертка констант ---
+
+    def fold_constants(self):
+        """Операции над литералами, появившимися после распространения копий, заменяются их значением."""
+        changed = False
+        for block in self.blocks:
+            for quad in block.quads:
+                op = quad.op
+                if op in BINARY_OPERATORS and quad.arg1.__class__ is Literal and quad.arg2.__class__ is Literal:
+                    folded = fold_binary(op, quad.arg1, quad.arg2)
+                elif op == '!' and quad.arg1.__class__ is Literal:
+                    folded = fold_not(quad.arg1)
+                else:
+                    continue
+                if folded is not None:
+                    value, value_type = folded
+                    quad.op, quad.arg1, quad.arg2 = 'copy', Literal(value, value_type), None
+                    changed = True
+        return changed
+
+    # --- Распространение копий ---
+
+    def propagate_copies(self):
+        """После `x = y` (y — переменная или литерал того же типа) использования x заменяются на y,
+        пока ни x, ни y не переопределены ни на одном пути."""
+        order = self.reverse_postorder()
+        out = self._available(order, self._copy_transfer)
+        changed = False
+        for block in order:
+            changed |= self._copy_transfer(block, self._meet(block, out), rewrite=True)
+        return changed
+
+    def _copy_transfer(self, block, facts, rewrite=False):
+        copies = dict(facts)
+        changed = False
+
+        def substitute(operand):
+            nonlocal changed
+            key = copies.get(operand) if operand.__class__ is str else None
+            if key is None: return operand
+            changed = True
+            return self._operand_of(key)
+
+        for quad in block.quads:
+            # Имя списка в 'method' и итерируемые 'for' остаются: копируются только скаляры
+            if rewrite and copies and quad.op != 'method' and quad.op != 'for':
+                quad.map_operands(substitute)
+            if copies:
+                defs = quad.defs()
+                if defs: copies = {name: key for name, key in copies.items() if name not in defs and key not in defs}
+            if quad.op == 'copy':
+                target, source = quad.result, quad.arg1
+                key = copies.get(source, source) if source.__class__ is str else self._key(source)
+                if key != target and self.type_of(target) in VALUE_TYPES \
+                        and self.type_of(source) == self.type_of(target):
+                    copies[target] = key
+        return changed if rewrite else copies.items()
+
+    # --- Общие подвыражения ---
+
+    def eliminate_common_subexpressions(self):
+        """Выражение, уже вычисленное на всех путях в переменную своего типа, заменяется копией этой
+        переменной, если ни один операнд с тех пор не переопределен."""
+        order = self.reverse_postorder()
+        keys = {}
+        for block in order:
+            for quad in block.quads:
+                key = self._expression_key(quad)
+                if key is not None: keys[quad] = key
+        # Факты заводятся только для выражений, встречающихся хотя бы дважды
+        counts = Counter(keys.values())
+        self._expressions = {quad: key for quad, key in keys.items() if counts[key] > 1}
+        if not self._expressions: return False
+        out = self._available(order, self._cse_transfer)
+        changed = False
+        for block in order:
+            changed |= self._cse_transfer(block, self._meet(block, out), rewrite=True)
+        return changed
+
+    def _expression_key(self, quad):
+        if (quad.op not in BINARY_OPERATORS and quad.op != '!') or not self.is_pure(quad): return None
+        left = self._key(quad.arg1)
+        right = None if quad.arg2 is None else self._key(quad.arg2)
+        if quad.op in COMMUTATIVE_OPERATORS and str(right) < str(left): left, right = right, left
+        return quad.op, left, right
+
+    def _cse_transfer(self, block, facts, rewrite=False):
+        available = set(facts)  # (переменная, ключ выражения)
+        changed = False
+        for quad in block.quads:
+            key = self._expressions.get(quad)
+            holder_type = self.value_type(quad) if key is not None else None
+            if key is not None and rewrite:
+                holder = next((name for name, held in available if held == key and name != quad.result), None)
+                if holder is not None:
+                    quad.op, quad.arg1, quad.arg2 = 'copy', holder, None
+                    changed = True
+            if available:
+                defs = quad.defs()
+                if defs:
+                    available = {(name, held) for name, held in available
+                                 if name not in defs and held[1] not in defs and held[2] not in defs}
+            # Заголовок цикла поднимается в условие, переменной для него не будет
+            if key is not None and not block.is_header and quad.result not in (key[1], key[2]) \
+                    and holder_type in VALUE_TYPES and self.type_of(quad.result) == holder_type:
+                available.add((quad.result, key))
+        return changed if rewrite else available
+
+    # --- Удаление бесполезного кода ---
+
+    def eliminate_dead_code(self):
+        """Удаляет чистые четверки, результат которых нигде не читается. Первое присваивание переменной
+        остается (по нему компилятор объявляет ее тип), но присваивает нуль ее типа."""
+        changed = False
+        while True:
+            live_in = self.liveness()
+            removed = False
+            for block in self.blocks:
+                live = set()
+                for successor in block.successors: live |= live_in[successor.index]
+                kept = []
+                for quad in reversed(block.quads):
+                    defs = quad.defs()
+                    if defs and not (defs & live) and self.is_pure(quad):
+                        if not quad.declares:
+                            removed = True
+                            continue
+                        removed |= self._clear(quad)
+                    live -= defs
+                    live |= quad.uses()
+                    kept.append(quad)
+                if len(kept) != len(block.quads):
+                    kept.reverse()
+                    block.quads = kept
+            if not removed: return changed
+            changed = True
+
+    def _clear(self, quad):
+        value_type = self.type_of(quad.result)
+        zero = ZERO_VALUES.get(value_type)
+        if zero is None or (quad.op == 'copy' and quad.arg1.__class__ is Literal): return False
+        quad.op, quad.arg1, quad.arg2 = 'copy', Literal(zero, value_type), None
+        return True
+
+    # --- Вынос инвариантов из циклов ---
+
+    def hoist_invariants(self):
+        """
+        Чистые вычисления, операнды которых не меняются в цикле, переносятся в блок перед циклом (предзаголовок);
+        `ls.len()` — если в цикле нет присваиваний ls и операций, которые могут изменить список (add, вызов функции).
+        Вложенные циклы обрабатываются первыми, так что инвариант внешнего цикла выходит из обоих.
+        """
+        return self._hoist_items(self.items)
+
+    def _hoist_items(self, items):
+        changed = False
+        for item in items:
+            cls = item.__class__
+            if cls is IfRegion:
+                changed |= self._hoist_items(item.then_items)
+                if item.else_items is not None: changed |= self._hoist_items(item.else_items)
+            elif cls is SwitchRegion:
+                for case in item.cases: changed |= self._hoist_items(case)
+                if item.default is not None: changed |= self._hoist_items(item.default)
+            elif cls is WhileRegion or cls is ForRegion:
+                changed |= self._hoist_items(item.body)
+                changed |= self._hoist_loop(item)
+        return changed
+
+    def _hoist_loop(self, loop):
+        blocks = [loop.header if loop.__class__ is WhileRegion else loop.head, *self._region_blocks(loop.body)]
+        defined = set()
+        mutates_lists = False
+        for block in blocks:
+            for quad in block.quads:
+                defined |= quad.defs()
+                if (quad.op == 'method' and quad.origin.method_name not in ('get', 'len')) \
+                        or (quad.op == 'call' and quad.arg1 != 'write'):
+                    mutates_lists = True
+        hoisted = []
+        for block in blocks:
+            kept = []
+            for quad in block.quads:
+                if not self._is_invariant(quad, defined, mutates_lists, loop.declared):
+                    kept.append(quad)
+                elif is_temp(quad.result):
+                    hoisted.append(quad)
+                    defined.discard(quad.result)
+                else:
+                    # Переменная по-прежнему присваивается в цикле, но уже готовым значением
+                    temp = self._new_temp(self.value_type(quad) if quad.op != 'method' else Type.INT)
+                    hoisted.append(Quad(quad.op, quad.arg1, quad.arg2, temp, quad.origin))
+                    quad.op, quad.arg1, quad.arg2 = 'copy', temp, None
+                    kept.append(quad)
+            block.quads = kept
+        if not hoisted: return False
+        # Вынесенное раньше стоит в начале предзаголовка, за ним — вычисление итерируемых for
+        quads = loop.preheader.quads
+        position = next((i for i, quad in enumerate(quads) if quad not in self.hoisted), len(quads))
+        quads[position:position] = hoisted
+        self.hoisted.update(hoisted)
+        return True
+
+    def _is_invariant(self, quad, defined, mutates_lists, declared):
+        op = quad.op
+        if op == 'method':
+            if quad.origin.method_name != 'len' or mutates_lists or quad.arg1 in defined: return False
+            names = (quad.arg1,)
+        elif (op in BINARY_OPERATORS or op == '!') and self.is_pure(quad):
+            names = [operand for operand in quad.operands() if operand.__class__ is str]
+        else:
+            return False
+        # Переменная должна быть объявлена до цикла: иначе временная перед циклом прочитала бы
+        # еще не объявленную локальную
+        order = self.declaration_order
+        return not any(name in defined or (not is_temp(name) and order.get(name, declared) >= declared)
+                       for name in names)
+
+    def _region_blocks(self, items):
+        for item in items:
+            cls = item.__class__
+            if cls is BasicBlock:
+                yield item
+            elif cls is IfRegion:
+                yield from self._region_blocks(item.then_items)
+                if item.else_items is not None: yield from self._region_blocks(item.else_items)
+            elif cls is SwitchRegion:
+                for case in item.cases: yield from self._region_blocks(case)
+                if item.default is not None: yield from self._region_blocks(item.default)
+            else:
+                yield item.preheader
+                yield item.header if cls is WhileRegion else item.head
+                yield from self._region_blocks(item.body)
+
+    def optimize(self):
+        for _ in range(MAX_ROUNDS):
+            changed = self.propagate_copies()
+            changed |= self.fold_constants()
+            changed |= self.eliminate_common_subexpressions()
+            changed |= self.hoist_invariants()
+            changed |= self.propagate_copies()
+            changed |= self.eliminate_dead_code()
+            if not changed: break
+        return self
+
+    # --- Подъем в AST ---
+
+    def to_ast(self):
+        """Операторы AST, вычисляющие то же, что и IR."""
+        self._use_counts, self._use_blocks = {}, {}
+        for block in self.blocks:
+            for quad in block.quads:
+                # Временные встречаются только среди операндов; (*, t.1, t.1) — два использования
+                for name in quad.operands():
+                    if is_temp(name):
+                        self._use_counts[name] = self._use_counts.get(name, 0) + 1
+                        self._use_blocks[name] = block
+        self._control = {}
+        self._declared = set(self.params)
+        stmts = self._raise_items(self.items)
+        return self._prune(stmts, set(self.params), False)[0]
+
+    def _raise_items(self, items):
+        stmts = []
+        for item in items:
+            if item.__class__ is BasicBlock: stmts.extend(self._raise_block(item))
+            else: stmts.extend(self.REGION_RAISING[item.__class__](self, item))
+        return stmts
+
+    def _raise_block(self, block):
+        pending = {}  # временная -> выражение, которое подставится в ее единственное использование
+        stmts = []
+        for quad in block.quads:
+            op = quad.op
+            if op in CONTROL_OPS:
+                if op == 'for': self._control[block] = [self._tree(operand, pending) for operand in quad.arg2]
+                elif op != 'iter': self._control[block] = self._tree(quad.arg1, pending)
+                continue
+            stmt = self._statement(quad, block, pending)
+            if stmt is None: continue
+            self._flush(pending, stmt, stmts)
+            stmts.append(stmt)
+            if stmt.__class__ is Assignment: self._declared.update(stmt.targets)
+        if pending: raise IRError(f"values left unused in block {block.index}")
+        if block.is_header and stmts: raise IRError(f"loop header {block.index} needs statements")
+        return stmts
+
+    def _statement(self, quad, block, pending):
+        op = quad.op
+        if op == 'break' or op == 'swap':
+            return quad.origin
+        if op == 'return':
+            stmt = clone(quad.origin)
+            stmt.values = None if quad.arg2 is None else [self._tree(operand, pending) for operand in quad.arg2]
+            return stmt
+        if op == 'assign':
+            stmt = clone(quad.origin)
+            stmt.targets = list(quad.arg1)
+            stmt.values = [self._tree(operand, pending) for operand in quad.arg2]
+            return stmt
+        value = self._expression(quad, pending)
+        result = quad.result
+        if is_temp(result):
+            count = self._use_counts.get(result, 0)
+            if count == 0:
+                return None if self.is_pure(quad) else value
+            if count == 1 and self._use_blocks[result] is block:
+                pending[result] = value
+                return None
+            return self._materialize(result, value, quad.origin)
+        return self._assignment(result, value, quad.origin)
+
+    def _expression(self, quad, pending):
+        op = quad.op
+        if op == 'copy': return self._tree(quad.arg1, pending)
+        if op == 'expr': return quad.arg1
+        # Узел исходного дерева переиспользуется, если его операнды не изменились
+        origin = quad.origin
+        if op in BINARY_OPERATORS:
+            left = self._tree(quad.arg1, pending, origin.left)
+            right = self._tree(quad.arg2, pending, origin.right)
+            if left is origin.left and right is origin.right: return origin
+            node = clone(origin)
+            node.left, node.right = left, right
+        elif op == '!':
+            operand = self._tree(quad.arg1, pending, origin.operand)
+            if operand is origin.operand: return origin
+            node = clone(origin)
+            node.operand = operand
+        else:
+            arguments = [self._tree(operand, pending, original)
+                         for operand, original in zip(quad.arg2, origin.arguments)]
+            if all(new is old for new, old in zip(arguments, origin.arguments)): return origin
+            node = clone(origin)
+            node.arguments = arguments
+        return node
+
+    @staticmethod
+    def _tree(operand, pending, original=None):
+        """Выражение операнда. Литерал-операнд встречается в IR один раз и переиспользуется как есть."""
+        if operand.__class__ is Literal: return operand
+        value = pending.pop(operand, None)
+        if value is not None: return value
+        if original.__class__ is Variable and original.name == operand: return original
+        return Variable(operand)
+
+    @staticmethod
+    def _assignment(target, value, origin):
+        stmt = Assignment([target], [value])
+        if origin is not None: stmt.line, stmt.column = origin.line, origin.column
+        return stmt
+
+    def _materialize(self, temp, value, origin):
+        """Присваивание временной переменной; компилятор должен вывести для нее тот же тип, что и IR."""
+        if self.types.get(temp) not in VALUE_TYPES or not ast_names(value) <= self._declared:
+            raise IRError(f"cannot declare {temp}")
+        self._declared.add(temp)
+        return self._assignment(temp, value, origin)
+
+    def _flush(self, pending, stmt, stmts):
+        """Вычисляет до оператора stmt отложенные значения, которые нельзя переносить через него."""
+        if not pending: return
+        _, writes, impure, memory = ast_effects(stmt)
+        last = -1
+        for i, value in enumerate(pending.values()):
+            reads, _, value_impure, value_memory = ast_effects(value)
+            if reads & writes or (value_impure and (impure or memory)) or (value_memory and impure): last = i
+        for temp in list(pending)[:last + 1]:
+            value = pending.pop(temp)
+            stmts.append(self._materialize(temp, value, value))
+
+    def _raise_if(self, region: IfRegion):
+        stmt = clone(region.origin)
+        stmt.condition = self._control.pop(region.block)
+        stmt.then_body = self._raise_items(region.then_items)
+        stmt.else_body = [] if region.else_items is None else self._raise_items(region.else_items)
+        return [stmt]
+
+    def _raise_while(self, region: WhileRegion):
+        stmts = self._raise_block(region.preheader)
+        self._raise_block(region.header)
+        stmt = clone(region.origin)
+        stmt.condition = self._control.pop(region.header)
+        stmt.body = self._raise_items(region.body)
+        stmts.append(stmt)
+        return stmts
+
+    def _raise_for(self, region: ForRegion):
+        stmts = self._raise_block(region.preheader)
+        self._raise_block(region.head)
+        stmt = clone(region.origin)
+        stmt.iterables = self._control.pop(region.preheader)
+        self._declared.update(stmt.targets)
+        stmt.body = self._raise_items(region.body)
+        stmts.append(stmt)
+        return stmts
+
+    def _raise_switch(self, region: SwitchRegion):
+        stmt = clone(region.origin)
+        stmt.expression = self._control.pop(region.block)
+        stmt.cases = [CaseBlock(case.value, self._raise_items(items))
+                      for case, items in zip(region.origin.cases, region.cases)]
+        if region.default is not None: stmt.default_case = self._raise_items(region.default)
+        return [stmt]
+
+    REGION_RAISING = {
+        IfRegion: _raise_if,
+        WhileRegion: _raise_while,
+        ForRegion: _raise_for,
+        SwitchRegion: _raise_switch,
+    }
+
+    # --- Недостижимый код ---
+
+    def _prune(self, stmts, declared, breakable):
+        """Убирает операторы после break/return и ветки с константным условием, если в них не объявляются
+        переменные и нет return со значением. Возвращает (операторы, последовательность завершается переходом)."""
+        kept = []
+        terminated = False
+        for stmt in stmts:
+            if terminated and self._removable((stmt,), declared): continue
+            cls = stmt.__class__
+            condition = getattr(stmt, 'condition', None) if cls is IfStatement or cls is WhileStatement else None
+            constant = condition.__class__ is Literal and condition.type in (Type.INT, Type.BOOL)
+            truthy = constant and wrap_i32(int(condition.value)) != 0
+            if cls is IfStatement:
+                if constant:
+                    taken, dropped = (stmt.then_body, stmt.else_body) if truthy else (stmt.else_body, stmt.then_body)
+                    if self._removable(dropped, declared):
+                        body, ends = self._prune(taken, declared, breakable)
+                        kept.extend(body)
+                        terminated |= ends
+                        continue
+                stmt.then_body, then_ends = self._prune(stmt.then_body, declared, breakable)
+                stmt.else_body, else_ends = self._prune(stmt.else_body, declared, breakable)
+                terminated |= then_ends and else_ends
+            elif cls is WhileStatement:
+                if constant and not truthy and self._removable(stmt.body, declared): continue
+                stmt.body = self._prune(stmt.body, declared, True)[0]
+            elif cls is ForStatement:
+                declared.update(stmt.targets)
+                stmt.body = self._prune(stmt.body, declared, True)[0]
+            elif cls is SwitchStatement:
+                for case in stmt.cases: case.body = self._prune(case.body, declared, True)[0]
+                if stmt.default_case: stmt.default_case = self._prune(stmt.default_case, declared, True)[0]
+            elif cls is Assignment:
+                declared.update(stmt.targets)
+            elif cls is ReturnStatement:
+                terminated = True
+            elif cls is BreakStatement:
+                terminated |= breakable
+            kept.append(stmt)
+        return kept, terminated
+
+    @staticmethod
+    def _removable(stmts, declared):
+        stack = list(stmts)
+        while stack:
+            node = stack.pop()
+            cls = node.__class__
+            if cls is Assignment or cls is ForStatement:
+                if any(name not in declared and not is_temp(name) for name in node.targets): return False
+            elif cls is ReturnStatement:
+                if node.values: return False
+            children = NODE_CHILDREN.get(cls)
+            if children is not None: stack.extend(children(node))
+        return True
+
+
+class IROptimizer:
+    """
+    Оптимизации над трехадресным кодом (run.py -O2): распространение копий и констант, устранение общих
+    подвыражений, вынос инвариантов из циклов и удаление бесполезного кода. Если тело нельзя поднять обратно
+    в AST, не меняя типов переменных, оно остается как есть.
+    """
+
+    def optimize(self, program: Program):
+        for func in program.functions:
+            func.body = self._optimize_body(func.body, func.parameters)
+        program.statements = self._optimize_body(program.statements, ())
+        return program
+
+    @staticmethod
+    def _optimize_body(stmts, params):
+        try:
+            return FunctionIR(stmts, params).optimize().to_ast()
+        except IRError:
+            return stmts
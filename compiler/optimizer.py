@@ -0,0 +1,275 @@
+import math
+import struct
+
+from .ast_nodes import *
+from .compiler import NODE_CHILDREN, STATEMENT_BODIES, COMPARISON_OPERATORS, binary_type, wrap_i32
+
+# Оптимизация AST между построением дерева и кодогенерацией (run.py -O).
+# Свертка константных выражений повторяет семантику WASM: i32 с переполнением, деление с отбрасыванием
+# дробной части, округление каждой операции f32. Выражения, которые во время выполнения вызвали бы
+# ловушку (целое деление на ноль) или дали бы inf/nan, не сворачиваются.
+
+I32_MIN = -0x80000000
+SCALAR_TYPES = (Type.INT, Type.FLOAT, Type.BOOL)
+
+
+def round_f32(value):
+    """Ближайшее к value число f32; OverflowError, если оно вне диапазона f32."""
+    return struct.unpack('<f', struct.pack('<f', value))[0]
+
+
+def _literal_value(node):
+    """Значение литерала так, как его видит WASM: i32 для int/bool, f32 для float; None для прочих."""
+    if node.type == Type.INT: return wrap_i32(node.value)
+    if node.type == Type.BOOL: return 1 if node.value else 0
+    if node.type == Type.FLOAT: return round_f32(node.value)
+    return None
+
+
+def _fold_i32(operator, a, b):
+    if operator == '+': return wrap_i32(a + b)
+    if operator == '-': return wrap_i32(a - b)
+    if operator == '*': return wrap_i32(a * b)
+    if operator == '/':
+        # i32.div_s: ловушка при делении на 0 и при I32_MIN / -1
+        if b == 0 or (a == I32_MIN and b == -1): return None
+        quotient = abs(a) // abs(b)
+        return quotient if (a < 0) == (b < 0) else -quotient
+    if operator == '%':
+        if b == 0: return None
+        remainder = abs(a) % abs(b)
+        return -remainder if a < 0 else remainder
+    # && и || компилируются в побитовые i32.and / i32.or
+    if operator == '&&': return a & b
+    if operator == '||': return a | b
+    return _compare(operator, a, b)
+
+
+def _fold_f32(operator, a, b):
+    if operator in COMPARISON_OPERATORS: return _compare(operator, a, b)
+    if operator == '+': result = a + b
+    elif operator == '-': result = a - b
+    elif operator == '*': result = a * b
+    elif operator == '/' and b != 0: result = a / b
+    else: return None
+    try:
+        result = round_f32(result)
+    except OverflowError:
+        return None
+    return result if math.isfinite(result) else None
+
+
+def _compare(operator, a, b):
+    if operator == '==': return a == b
+    if operator == '!=': return a != b
+    if operator == '<': return a < b
+    if operator == '>': return a > b
+    if operator == '<=': return a <= b
+    if operator == '>=': return a >= b
+    return None
+
+
+def fold_binary(operator, left, right):
+    """(значение, тип) операции над двумя литералами; None, если ее нельзя свернуть."""
+    a, b = _literal_value(left), _literal_value(right)
+    if a is None or b is None: return None
+    if Type.FLOAT in (left.type, right.type):
+        # Целый операнд приводится f32.convert_i32_s
+        result = _fold_f32(operator, round_f32(a), round_f32(b))
+    else:
+        result = _fold_i32(operator, a, b)
+    return None if result is None else (result, binary_type(operator, left.type, right.type))
+
+
+def fold_not(operand):
+    """(значение, тип) выражения !operand для литерала; None, если его нельзя свернуть."""
+    value = _literal_value(operand)
+    if value is None: return None
+    if operand.type == Type.FLOAT:
+        # i32.trunc_f32_s: ловушка вне диапазона i32
+        if not -2147483649.0 < value < 2147483648.0: return None
+        value = int(value)
+    return int(value == 0), Type.INT
+
+
+# Поля узла, которые переписываются: (одиночные дочерние узлы, списки узлов); ветки switch — отдельно.
+# Литералы и прочие листья не переписываются.
+REWRITE_FIELDS = {
+    Assignment: ((), ('values',)),
+    IfStatement: (('condition',), ('then_body', 'else_body')),
+    WhileStatement: (('condition',), ('body',)),
+    ForStatement: ((), ('iterables', 'body')),
+    SwitchStatement: (('expression',), ('default_case',)),
+    ReturnStatement: ((), ('values',)),
+    BinaryOp: (('left', 'right'), ()),
+    UnaryOp: (('operand',), ()),
+    FunctionCall: ((), ('arguments',)),
+    MethodCall: ((), ('arguments',)),
+}
+
+
+def variable_types(stmts, params=()):
+    """Типы параметров и локальных переменных тела так, как их объявит компилятор (None — неизвестен)."""
+    return ASTOptimizer()._variable_types(stmts, params)
+
+
+class ASTOptimizer:
+    """
+    Свертка констант, алгебраические тождества и подстановка литеральных переменных.
+
+    Тождества (x + 0, x - 0, x * 1, x / 1) применяются, только если тип x известен и совпадает с типом
+    результата: иначе исчезло бы приведение (распаковка элемента списка, int -> float).
+    Подставляется переменная, которой во всей функции присваивается ровно один раз — литералом, в операторе
+    верхнего уровня тела; замена делается в операторах, идущих после этого присваивания.
+    """
+
+    def __init__(self):
+        self.var_types = {}
+        self.constants = {}
+        self.by_reference = {}
+
+    def optimize(self, program: Program):
+        self.by_reference = {
+            f"{func.name}_{len(func.parameters)}": [i for i, p in enumerate(func.parameters) if p.by_reference]
+            for func in program.functions
+        }
+        for func in program.functions:
+            self._optimize_body(func.body, func.parameters)
+        self._optimize_body(program.statements, ())
+        return program
+
+    def _optimize_body(self, stmts, params):
+        self.var_types = self._variable_types(stmts, params)
+        writes = self._count_writes(stmts)
+        for param in params: writes[param.name] = None
+        self.constants = {}
+        for i, stmt in enumerate(stmts):
+            stmts[i] = stmt = self._rewrite(stmt)
+            if stmt.__class__ is Assignment and len(stmt.targets) == 1 and len(stmt.values) == 1:
+                target, value = stmt.targets[0], stmt.values[0]
+                if value.__class__ is Literal and value.type in SCALAR_TYPES and writes.get(target) == 1:
+                    self.constants[target] = value
+
+    # --- Типы переменных ---
+
+    def _variable_types(self, stmts, params):
+        self.var_types = {param.name: param.type for param in params}
+        self._scan_types(stmts)
+        return self.var_types
+
+    def _scan_types(self, stmts):
+        """Тип переменной — тип первого присваивания в порядке объявления локальных переменных компилятором."""
+        for stmt in stmts:
+            cls = stmt.__class__
+            if cls is Assignment:
+                value_type = self._expr_type(stmt.values[0]) if stmt.values else None
+                for target in stmt.targets: self.var_types.setdefault(target, value_type)
+            elif cls is ForStatement:
+                for target in stmt.targets: self.var_types.setdefault(target, None)
+            bodies = STATEMENT_BODIES.get(cls)
+            if bodies:
+                for body in bodies(stmt): self._scan_types(body)
+
+    def _expr_type(self, node):
+        """Тип выражения, если он известен без кодогенерации; иначе None."""
+        cls = node.__class__
+        if cls is Literal: return node.type
+        if cls is Variable: return self.var_types.get(node.name)
+        if cls is UnaryOp: return Type.INT
+        if cls is BinaryOp:
+            left, right = self._expr_type(node.left), self._expr_type(node.right)
+            if left is None or right is None: return None
+            return binary_type(node.operator, left, right)
+        return None
+
+    def _count_writes(self, stmts):
+        """Число присваиваний каждой переменной; None — переменная меняется не только присваиванием
+        (переменная цикла for, аргумент swap или &-параметра)."""
+        writes = {}
+        stack = list(stmts)
+        while stack:
+            node = stack.pop()
+            cls = node.__class__
+            if cls is Assignment:
+                for name in node.targets:
+                    count = writes.get(name, 0)
+                    writes[name] = None if count is None else count + 1
+            elif cls is ForStatement:
+                # Переменная цикла меняется на каждой итерации
+                for name in node.targets: writes[name] = None
+            elif cls is FunctionCall:
+                positions = range(len(node.arguments)) if node.name == 'swap' \
+                    else self.by_reference.get(f"{node.name}_{len(node.arguments)}", ())
+                for i in positions:
+                    if node.arguments[i].__class__ is Variable: writes[node.arguments[i].name] = None
+            children = NODE_CHILDREN.get(cls)
+            if children is not None: stack.extend(children(node))
+        return writes
+
+    # --- Переписывание ---
+
+    def _rewrite(self, node):
+        """Переписывает узел снизу вверх и возвращает его замену (или сам узел)."""
+        cls = node.__class__
+        if cls is Variable:
+            constant = self.constants.get(node.name)
+            return node if constant is None else self._literal(constant.value, constant.type, node)
+        fields = REWRITE_FIELDS.get(cls)
+        if fields is None:
+            return node
+        nodes, lists = fields
+        rewrite = self._rewrite
+        for name in nodes:
+            setattr(node, name, rewrite(getattr(node, name)))
+        for name in lists:
+            items = getattr(node, name)
+            if items: items[:] = [rewrite(item) for item in items]
+        if cls is SwitchStatement:
+            for case in node.cases:
+                case.value = rewrite(case.value)
+                case.body[:] = [rewrite(stmt) for stmt in case.body]
+        fold = self.FOLDERS.get(cls)
+        return fold(self, node) if fold else node
+
+    @staticmethod
+    def _literal(value, value_type, origin):
+        literal = Literal(value, value_type)
+        literal.line, literal.column = origin.line, origin.column
+        return literal
+
+    def _fold_binary(self, node: BinaryOp):
+        left, right = node.left, node.right
+        if left.__class__ is Literal and right.__class__ is Literal:
+            folded = fold_binary(node.operator, left, right)
+            return node if folded is None else self._literal(*folded, node)
+        return self._simplify_identity(node)
+
+    def _simplify_identity(self, node: BinaryOp):
+        operator, left, right = node.operator, node.left, node.right
+        if right.__class__ is Literal:
+            constant, other = right, left
+        elif left.__class__ is Literal and operator in ('+', '*'):
+            constant, other = left, right
+        else:
+            return node
+        value = _literal_value(constant)
+        other_type = self._expr_type(other)
+        if value is None or other_type not in (Type.INT, Type.FLOAT) \
+                or binary_type(operator, other_type, constant.type) != other_type:
+            return node
+        # x + 0 для f32 не тождество: -0.0 + 0.0 == 0.0
+        if (value == 0 and (operator == '-' or (operator == '+' and other_type == Type.INT))) \
+                or (value == 1 and operator in ('*', '/')):
+            return other
+        return node
+
+    def _fold_unary(self, node: UnaryOp):
+        operand = node.operand
+        if node.operator != '!' or operand.__class__ is not Literal: return node
+        folded = fold_not(operand)
+        return node if folded is None else self._literal(*folded, node)
+
+    FOLDERS = {
+        BinaryOp: _fold_binary,
+        UnaryOp: _fold_unary,
+    }
@@ -0,0 +1,583 @@
+import struct
+
+# Встроенный ассемблер WAT -> WASM для подмножества WAT, которое генерирует WASMCompiler. Кодогенерация по-прежнему
+# пишет текст; ассемблер разбирает его прямо из памяти (текст или поток строк) вместо записи .wat на диск и вызова wabt.
+
+MAGIC = b'\x00asm\x01\x00\x00\x00'
+
+SEC_TYPE, SEC_IMPORT, SEC_FUNCTION, SEC_MEMORY, SEC_GLOBAL, SEC_EXPORT, SEC_START, SEC_CODE, SEC_DATA = \
+    1, 2, 3, 5, 6, 7, 8, 10, 11
+
+VAL_TYPES = {'i32': 0x7F, 'i64': 0x7E, 'f32': 0x7D, 'f64': 0x7C}
+EXPORT_KINDS = {'func': 0, 'table': 1, 'memory': 2, 'global': 3}
+BLOCK_EMPTY = 0x40
+
+# Инструкции без непосредственных операндов
+SIMPLE_OPS = {
+    'unreachable': 0x00, 'nop': 0x01, 'else': 0x05, 'end': 0x0B, 'return': 0x0F, 'drop': 0x1A, 'select': 0x1B,
+}
+for _i, _name in enumerate(['eqz', 'eq', 'ne', 'lt_s', 'lt_u', 'gt_s', 'gt_u', 'le_s', 'le_u', 'ge_s', 'ge_u']):
+    SIMPLE_OPS[f'i32.{_name}'] = 0x45 + _i
+    SIMPLE_OPS[f'i64.{_name}'] = 0x50 + _i
+for _i, _name in enumerate(['eq', 'ne', 'lt', 'gt', 'le', 'ge']):
+    SIMPLE_OPS[f'f32.{_name}'] = 0x5B + _i
+    SIMPLE_OPS[f'f64.{_name}'] = 0x61 + _i
+for _i, _name in enumerate(['clz', 'ctz', 'popcnt', 'add', 'sub', 'mul', 'div_s', 'div_u', 'rem_s', 'rem_u',
+                            'and', 'or', 'xor', 'shl', 'shr_s', 'shr_u', 'rotl', 'rotr']):
+    SIMPLE_OPS[f'i32.{_name}'] = 0x67 + _i
+    SIMPLE_OPS[f'i64.{_name}'] = 0x79 + _i
+for _i, _name in enumerate(['abs', 'neg', 'ceil', 'floor', 'trunc', 'nearest', 'sqrt', 'add', 'sub', 'mul', 'div',
+                            'min', 'max', 'copysign']):
+    SIMPLE_OPS[f'f32.{_name}'] = 0x8B + _i
+    SIMPLE_OPS[f'f64.{_name}'] = 0x99 + _i
+for _i, _name in enumerate(['i32.wrap_i64', 'i32.trunc_f32_s', 'i32.trunc_f32_u', 'i32.trunc_f64_s', 'i32.trunc_f64_u',
+                            'i64.extend_i32_s', 'i64.extend_i32_u', 'i64.trunc_f32_s', 'i64.trunc_f32_u',
+                            'i64.trunc_f64_s', 'i64.trunc_f64_u', 'f32.convert_i32_s', 'f32.convert_i32_u',
+                            'f32.convert_i64_s', 'f32.convert_i64_u', 'f32.demote_f64', 'f64.convert_i32_s',
+                            'f64.convert_i32_u', 'f64.convert_i64_s', 'f64.convert_i64_u', 'f64.promote_f32',
+                            'i32.reinterpret_f32', 'i64.reinterpret_f64', 'f32.reinterpret_i32',
+                            'f64.reinterpret_i64']):
+    SIMPLE_OPS[_name] = 0xA7 + _i
+
+# Доступ к памяти: опкод и естественное выравнивание (log2)
+MEMORY_OPS = {
+    'i32.load': (0x28, 2), 'i64.load': (0x29, 3), 'f32.load': (0x2A, 2), 'f64.load': (0x2B, 3),
+    'i32.load8_s': (0x2C, 0), 'i32.load8_u': (0x2D, 0), 'i32.load16_s': (0x2E, 1), 'i32.load16_u': (0x2F, 1),
+    'i64.load8_s': (0x30, 0), 'i64.load8_u': (0x31, 0), 'i64.load16_s': (0x32, 1), 'i64.load16_u': (0x33, 1),
+    'i64.load32_s': (0x34, 2), 'i64.load32_u': (0x35, 2),
+    'i32.store': (0x36, 2), 'i64.store': (0x37, 3), 'f32.store': (0x38, 2), 'f64.store': (0x39, 3),
+    'i32.store8': (0x3A, 0), 'i32.store16': (0x3B, 1),
+    'i64.store8': (0x3C, 0), 'i64.store16': (0x3D, 1), 'i64.store32': (0x3E, 2),
+}
+
+# Инструкции bulk memory (префикс 0xFC) вместе с индексами памяти
+BULK_OPS = {'memory.copy': b'\xfc\x0a\x00\x00', 'memory.fill': b'\xfc\x0b\x00'}
+
+LOCAL_OPS = {'local.get': 0x20, 'local.set': 0x21, 'local.tee': 0x22}
+GLOBAL_OPS = {'global.get': 0x23, 'global.set': 0x24}
+BLOCK_OPS = {'block': 0x02, 'loop': 0x03, 'if': 0x04}
+BRANCH_OPS = {'br': 0x0C, 'br_if': 0x0D}
+
+
+class WasmAssemblyError(ValueError):
+    pass
+
+
+# --- Кодирование ---
+def uleb(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def sleb(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if (value == 0 and not byte & 0x40) or (value == -1 and byte & 0x40):
+            out.append(byte)
+            return bytes(out)
+        out.append(byte | 0x80)
+
+
+def vec(items):
+    return uleb(len(items)) + b''.join(items)
+
+
+def name_bytes(data):
+    return uleb(len(data)) + data
+
+
+def section(sec_id, payload):
+    return bytes([sec_id]) + uleb(len(payload)) + payload
+
+
+# --- Разбор текста ---
+def tokenize(lines):
+    """Разбивает WAT на токены: '(', ')', строки в кавычках и атомы."""
+    for line in lines:
+        i, n = 0, len(line)
+        while i < n:
+            c = line[i]
+            if c in ' \t\r\n':
+                i += 1
+            elif c in '()':
+                yield c
+                i += 1
+            elif c == ';' and line.startswith(';;', i):
+                break
+            elif c == '"':
+                j = i + 1
+                while j < n and line[j] != '"':
+                    j += 2 if line[j] == '\\' else 1
+                if j >= n:
+                    raise WasmAssemblyError(f"Unterminated string: {line[i:]}")
+                yield line[i:j + 1]
+                i = j + 1
+            else:
+                j = i
+                while j < n and line[j] not in ' \t\r\n()"':
+                    j += 1
+                yield line[i:j]
+                i = j
+
+
+def parse_sexpr(tokens):
+    """Собирает токены в вложенные списки; возвращает список верхнеуровневых выражений."""
+    stack = [[]]
+    for tok in tokens:
+        if tok == '(':
+            stack.append([])
+        elif tok == ')':
+            if len(stack) == 1:
+                raise WasmAssemblyError("Unbalanced ')'")
+            node = stack.pop()
+            stack[-1].append(node)
+        else:
+            stack[-1].append(tok)
+    if len(stack) != 1:
+        raise WasmAssemblyError("Unbalanced '('")
+    return stack[0]
+
+
+def parse_string(tok):
+    """Раскрывает экранирование строкового литерала WAT в байты."""
+    body = tok[1:-1]
+    out = bytearray()
+    i = 0
+    escapes = {'n': 0x0A, 't': 0x09, 'r': 0x0D, '"': 0x22, "'": 0x27, '\\': 0x5C}
+    while i < len(body):
+        c = body[i]
+        if c != '\\':
+            out += c.encode('utf-8')
+            i += 1
+            continue
+        nxt = body[i + 1:i + 2]
+        if nxt in escapes:
+            out.append(escapes[nxt])
+            i += 2
+        elif nxt == 'u' and body[i + 2:i + 3] == '{':
+            end = body.index('}', i)
+            out += chr(int(body[i + 3:end], 16)).encode('utf-8')
+            i = end + 1
+        else:
+            try:
+                out.append(int(body[i + 1:i + 3], 16))
+            except ValueError:
+                raise WasmAssemblyError(f"Bad escape in string {tok}") from None
+            i += 3
+    return bytes(out)
+
+
+def parse_int(tok, bits):
+    try:
+        value = int(tok.replace('_', ''), 0)
+    except ValueError:
+        raise WasmAssemblyError(f"Bad integer literal: {tok}") from None
+    if not -(1 << (bits - 1)) <= value < (1 << bits):
+        raise WasmAssemblyError(f"Integer literal out of range for i{bits}: {tok}")
+    # Беззнаковая запись (0xFFFFFFFF) кодируется как знаковая
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+
+def parse_float(tok):
+    text = tok.replace('_', '')
+    try:
+        if 'x' in text.lower() and 'inf' not in text:
+            return float.fromhex(text)
+        return float(text)
+    except ValueError:
+        raise WasmAssemblyError(f"Bad float literal: {tok}") from None
+
+
+def is_id(tok):
+    return isinstance(tok, str) and tok.startswith('$')
+
+
+def is_label_ref(tok):
+    return isinstance(tok, str) and (tok.startswith('$') or tok.isdigit())
+
+
+# --- Ассемблер ---
+class WasmAssembler:
+    def __init__(self):
+        self.types = []
+        self.imports = []
+        self.funcs = []
+        self.memories = []
+        self.globals = []
+        self.exports = []
+        self.datas = []
+        self.start = None
+        self.func_index = {}
+        self.global_index = {}
+        self.memory_index = {}
+
+    def assemble(self, wat):
+        """wat: текст модуля или итерируемое строк (например, StringIO с выводом WASMCompiler.compile)."""
+        lines = wat.splitlines() if isinstance(wat, str) else wat
+        exprs = parse_sexpr(tokenize(lines))
+        if len(exprs) != 1 or not isinstance(exprs[0], list) or exprs[0][:1] != ['module']:
+            raise WasmAssemblyError("Expected a single (module ...)")
+        fields = exprs[0][1:]
+        if fields and is_id(fields[0]):
+            fields = fields[1:]
+
+        self._index_fields(fields)
+        for field in fields:
+            kind = field[0]
+            handler = getattr(self, f'_field_{kind}', None)
+            if handler is None:
+                raise WasmAssemblyError(f"Unsupported module field: {kind}")
+            handler(field)
+        return self._encode_module()
+
+    # Индексы функций, глобальных переменных и памяти нужны до разбора тел (вызовы вперед)
+    def _index_fields(self, fields):
+        imported = [f for f in fields if f[0] == 'import']
+        defined = [f for f in fields if f[0] == 'func']
+        for i, field in enumerate(imported):
+            desc = field[3]
+            if desc[0] != 'func':
+                raise WasmAssemblyError(f"Unsupported import kind: {desc[0]}")
+            if len(desc) > 1 and is_id(desc[1]):
+                self.func_index[desc[1]] = i
+        for i, field in enumerate(defined):
+            if len(field) > 1 and is_id(field[1]):
+                self.func_index[field[1]] = len(imported) + i
+        for i, field in enumerate(f for f in fields if f[0] == 'global'):
+            if is_id(field[1]):
+                self.global_index[field[1]] = i
+        for i, field in enumerate(f for f in fields if f[0] == 'memory'):
+            if is_id(field[1]):
+                self.memory_index[field[1]] = i
+
+    def _type_index(self, params, results):
+        sig = (tuple(params), tuple(results))
+        if sig not in self.types:
+            self.types.append(sig)
+        return self.types.index(sig)
+
+    def _val_type(self, tok):
+        if tok not in VAL_TYPES:
+            raise WasmAssemblyError(f"Unknown value type: {tok}")
+        return tok
+
+    def _signature(self, items):
+        """Разбирает (param ...)/(result ...); возвращает (имена параметров, типы, результаты, остаток)."""
+        names, params, results = [], [], []
+        rest = list(items)
+        while rest and isinstance(rest[0], list) and rest[0][0] in ('param', 'result'):
+            head, *args = rest.pop(0)
+            if head == 'param':
+                if args and is_id(args[0]):
+                    names.append(args[0])
+                    params.append(self._val_type(args[1]))
+                else:
+                    for t in args:
+                        names.append(None)
+                        params.append(self._val_type(t))
+            else:
+                results.extend(self._val_type(t) for t in args)
+        return names, params, results, rest
+
+    def _resolve(self, ref, table, what):
+        if ref.isdigit():
+            return int(ref)
+        if ref not in table:
+            raise WasmAssemblyError(f"Unknown {what}: {ref}")
+        return table[ref]
+
+    def _field_import(self, field):
+        _, module, field_name, desc = field
+        items = desc[2:] if len(desc) > 1 and is_id(desc[1]) else desc[1:]
+        _, params, results, rest = self._signature(items)
+        if rest:
+            raise WasmAssemblyError(f"Unexpected tokens in import: {rest}")
+        self.imports.append((parse_string(module), parse_string(field_name), self._type_index(params, results)))
+
+    def _field_memory(self, field):
+        items = field[2:] if is_id(field[1]) else field[1:]
+        index = len(self.memories)
+        limits = []
+        for item in items:
+            if isinstance(item, list) and item[0] == 'export':
+                self.exports.append((parse_string(item[1]), EXPORT_KINDS['memory'], index))
+            else:
+                limits.append(parse_int(item, 32) & 0xFFFFFFFF)
+        if len(limits) == 1:
+            self.memories.append(b'\x00' + uleb(limits[0]))
+        elif len(limits) == 2:
+            self.memories.append(b'\x01' + uleb(limits[0]) + uleb(limits[1]))
+        else:
+            raise WasmAssemblyError(f"Bad memory limits: {field}")
+
+    def _field_global(self, field):
+        items = field[2:] if is_id(field[1]) else field[1:]
+        index = len(self.globals)
+        while isinstance(items[0], list) and items[0][0] == 'export':
+            self.exports.append((parse_string(items[0][1]), EXPORT_KINDS['global'], index))
+            items = items[1:]
+        gtype, init = items[0], items[1:]
+        if isinstance(gtype, list) and gtype[0] == 'mut':
+            header = bytes([VAL_TYPES[self._val_type(gtype[1])], 1])
+        else:
+            header = bytes([VAL_TYPES[self._val_type(gtype)], 0])
+        self.globals.append(header + self._const_expr(init))
+
+    def _field_export(self, field):
+        _, export_name, (kind, ref) = field
+        tables = {'func': self.func_index, 'memory': self.memory_index, 'global': self.global_index}
+        if kind not in tables:
+            raise WasmAssemblyError(f"Unsupported export kind: {kind}")
+        self.exports.append((parse_string(export_name), EXPORT_KINDS[kind], self._resolve(ref, tables[kind], kind)))
+
+    def _field_start(self, field):
+        self.start = self._resolve(field[1], self.func_index, 'function')
+
+    def _field_data(self, field):
+        items = field[2:] if is_id(field[1]) else field[1:]
+        if items and isinstance(items[0], list) and items[0][0] == 'memory':
+            items = items[1:]
+        offset = items[0]
+        if offset[0] == 'offset':
+            offset = offset[1:]
+        else:
+            offset = [offset]
+        payload = b''.join(parse_string(s) for s in items[1:])
+        self.datas.append(b'\x00' + self._const_expr(offset) + name_bytes(payload))
+
+    def _const_expr(self, items):
+        return FunctionBody(self, []).encode_expr(items) + b'\x0b'
+
+    def _field_func(self, field):
+        items = field[1:]
+        if items and is_id(items[0]):
+            items = items[1:]
+        index = len(self.imports) + len(self.funcs)
+        while items and isinstance(items[0], list) and items[0][0] == 'export':
+            self.exports.append((parse_string(items[0][1]), EXPORT_KINDS['func'], index))
+            items = items[1:]
+        names, params, results, rest = self._signature(items)
+
+        local_names, local_types = list(names), list(params)
+        while rest and isinstance(rest[0], list) and rest[0][0] == 'local':
+            _, *args = rest.pop(0)
+            if args and is_id(args[0]):
+                local_names.append(args[0])
+                local_types.append(self._val_type(args[1]))
+            else:
+                for t in args:
+                    local_names.append(None)
+                    local_types.append(self._val_type(t))
+
+        body = FunctionBody(self, local_names)
+        code = body.encode_expr(rest) + b'\x0b'
+        if body.labels:
+            raise WasmAssemblyError(f"Unclosed block in function {field[1]}")
+
+        # Локальные сжимаются в группы подряд идущих одинаковых типов
+        groups = []
+        for t in local_types[len(params):]:
+            if groups and groups[-1][1] == t:
+                groups[-1][0] += 1
+            else:
+                groups.append([1, t])
+        locals_enc = vec([uleb(n) + bytes([VAL_TYPES[t]]) for n, t in groups])
+        self.funcs.append((self._type_index(params, results), locals_enc + code))
+
+    def _encode_module(self):
+        out = bytearray(MAGIC)
+        types = [b'\x60' + vec([bytes([VAL_TYPES[t]]) for t in params]) + vec([bytes([VAL_TYPES[t]]) for t in results])
+                 for params, results in self.types]
+        out += section(SEC_TYPE, vec(types))
+        if self.imports:
+            out += section(SEC_IMPORT, vec([name_bytes(m) + name_bytes(f) + b'\x00' + uleb(t)
+                                            for m, f, t in self.imports]))
+        out += section(SEC_FUNCTION, vec([uleb(t) for t, _ in self.funcs]))
+        if self.memories:
+            out += section(SEC_MEMORY, vec(self.memories))
+        if self.globals:
+            out += section(SEC_GLOBAL, vec(self.globals))
+        if self.exports:
+            out += section(SEC_EXPORT, vec([name_bytes(n) + bytes([k]) + uleb(i) for n, k, i in self.exports]))
+        if self.start is not None:
+            out += section(SEC_START, uleb(self.start))
+        out += section(SEC_CODE, vec([uleb(len(body)) + body for _, body in self.funcs]))
+        if self.datas:
+            out += section(SEC_DATA, vec(self.datas))
+        return bytes(out)
+
+
+class FunctionBody:
+    """Кодирует последовательность инструкций (плоскую и в скобочной форме) одной функции."""
+
+    def __init__(self, asm, local_names):
+        self.asm = asm
+        self.locals = {n: i for i, n in enumerate(local_names) if n is not None}
+        self.labels = []
+
+    def encode_expr(self, items):
+        out = bytearray()
+        i = 0
+        while i < len(items):
+            item = items[i]
+            i += 1
+            if isinstance(item, list):
+                out += self._folded(item)
+                continue
+            op = item
+            if op in BLOCK_OPS:
+                label, blocktype, i = self._block_header(items, i)
+                out.append(BLOCK_OPS[op])
+                out += blocktype
+                self.labels.append(label)
+            elif op == 'end':
+                if not self.labels:
+                    raise WasmAssemblyError("'end' without an open block")
+                self.labels.pop()
+                out.append(SIMPLE_OPS[op])
+                if i < len(items) and is_id(items[i]):
+                    i += 1
+            elif op == 'else':
+                out.append(SIMPLE_OPS[op])
+                if i < len(items) and is_id(items[i]):
+                    i += 1
+            else:
+                imms = []
+                while i < len(items) and self._is_immediate(op, items[i], imms):
+                    imms.append(items[i])
+                    i += 1
+                out += self._plain(op, imms)
+        return bytes(out)
+
+    def _is_immediate(self, op, tok, taken):
+        if not isinstance(tok, str):
+            return False
+        if op in MEMORY_OPS:
+            return tok.startswith('offset=') or tok.startswith('align=')
+        if op == 'br_table':
+            return is_label_ref(tok)
+        if op in LOCAL_OPS or op in GLOBAL_OPS or op in BRANCH_OPS or op == 'call' or op.endswith('.const'):
+            return not taken
+        return False
+
+    def _block_header(self, items, i):
+        label = None
+        if i < len(items) and is_id(items[i]):
+            label = items[i]
+            i += 1
+        results = []
+        while i < len(items) and isinstance(items[i], list) and items[i][0] == 'result':
+            results.extend(items[i][1:])
+            i += 1
+        if not results:
+            blocktype = bytes([BLOCK_EMPTY])
+        elif len(results) == 1:
+            blocktype = bytes([VAL_TYPES[self.asm._val_type(results[0])]])
+        else:
+            raise WasmAssemblyError("Multi-value blocks are not supported")
+        return label, blocktype, i
+
+    def _folded(self, item):
+        op = item[0]
+        if op in ('block', 'loop'):
+            label, blocktype, i = self._block_header(item, 1)
+            self.labels.append(label)
+            body = self.encode_expr(item[i:])
+            self.labels.pop()
+            return bytes([BLOCK_OPS[op]]) + blocktype + body + b'\x0b'
+        if op == 'if':
+            label, blocktype, i = self._block_header(item, 1)
+            rest = item[i:]
+            cond = [x for x in rest if not (isinstance(x, list) and x[0] in ('then', 'else'))]
+            then = next((x[1:] for x in rest if isinstance(x, list) and x[0] == 'then'), [])
+            other = next((x[1:] for x in rest if isinstance(x, list) and x[0] == 'else'), None)
+            out = bytearray(self.encode_expr(cond))
+            out.append(BLOCK_OPS['if'])
+            out += blocktype
+            self.labels.append(label)
+            out += self.encode_expr(then)
+            if other is not None:
+                out.append(SIMPLE_OPS['else'])
+                out += self.encode_expr(other)
+            self.labels.pop()
+            out.append(SIMPLE_OPS['end'])
+            return bytes(out)
+        # (op imm... (operand)...): сначала операнды, затем сама инструкция
+        imms = [x for x in item[1:] if not isinstance(x, list)]
+        operands = [x for x in item[1:] if isinstance(x, list)]
+        out = bytearray()
+        for operand in operands:
+            out += self._folded(operand)
+        out += self._plain(op, imms)
+        return bytes(out)
+
+    def _label_depth(self, ref):
+        if ref.isdigit():
+            return int(ref)
+        for depth, label in enumerate(reversed(self.labels)):
+            if label == ref:
+                return depth
+        raise WasmAssemblyError(f"Unknown label: {ref}")
+
+    def _one(self, op, imms):
+        if len(imms) != 1:
+            raise WasmAssemblyError(f"'{op}' expects one immediate, got {imms}")
+        return imms[0]
+
+    def _plain(self, op, imms):
+        if op in SIMPLE_OPS:
+            if imms:
+                raise WasmAssemblyError(f"'{op}' takes no immediates, got {imms}")
+            return bytes([SIMPLE_OPS[op]])
+        if op in LOCAL_OPS:
+            return bytes([LOCAL_OPS[op]]) + uleb(self.asm._resolve(self._one(op, imms), self.locals, 'local'))
+        if op in GLOBAL_OPS:
+            return bytes([GLOBAL_OPS[op]]) + uleb(self.asm._resolve(self._one(op, imms), self.asm.global_index,
+                                                                     'global'))
+        if op == 'call':
+            return b'\x10' + uleb(self.asm._resolve(self._one(op, imms), self.asm.func_index, 'function'))
+        if op in BRANCH_OPS:
+            return bytes([BRANCH_OPS[op]]) + uleb(self._label_depth(self._one(op, imms)))
+        if op == 'br_table':
+            if not imms:
+                raise WasmAssemblyError("'br_table' needs at least a default label")
+            depths = [uleb(self._label_depth(ref)) for ref in imms]
+            return b'\x0e' + vec(depths[:-1]) + depths[-1]
+        if op == 'i32.const':
+            return b'\x41' + sleb(parse_int(self._one(op, imms), 32))
+        if op == 'i64.const':
+            return b'\x42' + sleb(parse_int(self._one(op, imms), 64))
+        if op == 'f32.const':
+            return b'\x43' + struct.pack('<f', parse_float(self._one(op, imms)))
+        if op == 'f64.const':
+            return b'\x44' + struct.pack('<d', parse_float(self._one(op, imms)))
+        if op in MEMORY_OPS:
+            opcode, align = MEMORY_OPS[op]
+            offset = 0
+            for imm in imms:
+                key, value = imm.split('=', 1)
+                if key == 'offset':
+                    offset = parse_int(value, 32) & 0xFFFFFFFF
+                else:
+                    align = int(value).bit_length() - 1
+            return bytes([opcode]) + uleb(align) + uleb(offset)
+        if op in ('memory.size', 'memory.grow'):
+            return (b'\x3f' if op == 'memory.size' else b'\x40') + b'\x00'
+        if op in BULK_OPS:
+            return BULK_OPS[op]
+        raise WasmAssemblyError(f"Unsupported instruction: {op}")
+
+
+def assemble(wat):
+    """Собирает WAT (текст или список строк) в байты модуля WebAssembly."""
+    return WasmAssembler().assemble(wat)
@@ -1,39 +1,181 @@
 import sys
 import os
 import argparse
+import io
+import struct
 import subprocess
-from wabt import Wabt
-from antlr4 import InputStream, CommonTokenStream
+import time
+from antlr4 import InputStream, CommonTokenStream, BailErrorStrategy, PredictionMode
+from antlr4.error.Errors import ParseCancellationException
 
 from gen.ListLangLexer import ListLangLexer
+from ListLangFastLexer import ListLangFastLexer
 from gen.ListLangParser import ListLangParser
-from compiler.ast_builder import ASTBuilder
+from compiler.ast_builder import ASTBuilder, ASTListener
 from compiler.compiler import WASMCompiler
+from compiler.wat_assembler import assemble
+from compiler.optimizer import ASTOptimizer
+from compiler.ir import IROptimizer
+from compiler.cache import CompileCache
+from compiler import dfa_cache
 
 
-def compile_source(source_code):
+RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "runner.js")
+
+# Лексеры выдают одинаковые токены: 'fast' — на регулярных выражениях, 'antlr' — сгенерированный ANTLR
+LEXERS = {'fast': ListLangFastLexer, 'antlr': ListLangLexer}
+
+
+def parse_tree(stream, two_stage=True, build_tree=True):
+    """Строит дерево разбора.
+
+    Двухэтапный разбор: сначала быстрый SLL-режим предсказания с BailErrorStrategy (без сообщений об ошибках);
+    если он не справился (синтаксическая ошибка или конфликт, требующий полного контекста), поток токенов
+    перематывается и разбор повторяется в полном LL-режиме со стандартной обработкой ошибок.
+    build_tree=False — дерево не строится, AST собирает ASTListener во время разбора.
+    Возвращает (tree, parser) или (listener, parser).
+    """
+    if two_stage:
+        parser, result = _new_parser(stream, build_tree)
+        parser._interp.predictionMode = PredictionMode.SLL
+        parser._errHandler = BailErrorStrategy()
+        parser.removeErrorListeners()
+        try:
+            tree = parser.program()
+            return (tree if build_tree else result), parser
+        except ParseCancellationException:
+            stream.seek(0)
+
+    parser, result = _new_parser(stream, build_tree)
+    tree = parser.program()
+    return (tree if build_tree else result), parser
+
+
+def _new_parser(stream, build_tree):
+    parser = ListLangParser(stream)
+    if build_tree:
+        return parser, None
+    # Без дерева разбора: контексты правил не связываются с родителями и освобождаются сразу после выхода
+    listener = ASTListener()
+    parser.buildParseTrees = False
+    parser.addParseListener(listener)
+    return parser, listener
+
+
+def parse_source(source_code, two_stage=True, timings=None, lexer='fast', build_tree=False):
+    """Разбирает исходный код и строит AST; None при ошибке.
+
+    timings — необязательный словарь, в который записывается время этапов в секундах.
+    lexer — ключ LEXERS.
+    build_tree=True — полное дерево разбора и обход ASTBuilder; по умолчанию AST строится во время разбора
+    (этап 'ast' тогда входит в 'parse').
+    """
+    # 1. Лексический и синтаксический анализ
+    start = time.perf_counter()
+    input_stream = InputStream(source_code)
+    stream = CommonTokenStream(LEXERS[lexer](input_stream))
+    stream.fill()
+    lexed = time.perf_counter()
+    result, parser = parse_tree(stream, two_stage, build_tree)
+    parsed = time.perf_counter()
+
+    if parser.getNumberOfSyntaxErrors() > 0:
+        print(f"Syntax Errors found: {parser.getNumberOfSyntaxErrors()}")
+        return None
+
+    # 2. Построение AST
+    if build_tree:
+        ast = ASTBuilder().visit(result)
+    else:
+        ast = result.get_ast()
+    if timings is not None:
+        timings['lex'] = lexed - start
+        timings['parse'] = parsed - lexed
+        timings['ast'] = time.perf_counter() - parsed
+    if not ast:
+        print("Failed to build AST.")
+        return None
+    return ast
+
+
+def optimize_ast(ast, opt_level, timings=None):
+    """Оптимизирует AST на месте: opt_level 0 — без изменений, 1 — ASTOptimizer, 2 — еще и IROptimizer."""
+    if opt_level < 1:
+        return ast
+    start = time.perf_counter()
+    ast = ASTOptimizer().optimize(ast)
+    if opt_level >= 2:
+        ast = IROptimizer().optimize(ast)
+    if timings is not None:
+        timings['optimize'] = time.perf_counter() - start
+    return ast
+
+
+def compile_source(source_code, cache=None, timings=None, two_stage=True, lexer='fast', build_tree=False,
+                   opt_level=0, **compiler_options):
+    """Компилирует исходный код в байты модуля WASM; None при ошибке.
+
+    cache — необязательный CompileCache: при попадании лексер, парсер и компилятор не запускаются.
+    timings — словарь для времени этапов (см. parse_source); two_stage=False — разбор сразу в режиме LL;
+    lexer — 'fast' или 'antlr' (см. LEXERS); build_tree — см. parse_source; opt_level — см. optimize_ast.
+    """
     try:
-        # 1. Лексический и синтаксический анализ
-        input_stream = InputStream(source_code)
-        lexer = ListLangLexer(input_stream)
-        stream = CommonTokenStream(lexer)
-        parser = ListLangParser(stream)
-        tree = parser.program()
-
-        if parser.getNumberOfSyntaxErrors() > 0:
-            print(f"Syntax Errors found: {parser.getNumberOfSyntaxErrors()}")
+        if cache is not None:
+            wasm_code = cache.get(source_code, dict(compiler_options, opt_level=opt_level), 'wasm')
+            if wasm_code is not None:
+                return wasm_code
+        ast = parse_source(source_code, two_stage, timings, lexer, build_tree)
+        if ast is None:
             return None
+        ast = optimize_ast(ast, opt_level, timings)
+        # 3. Кодогенерация в WAT (в памяти) и сборка модуля встроенным ассемблером
+        start = time.perf_counter()
+        wat_buffer = io.StringIO()
+        WASMCompiler(**compiler_options).compile(ast, wat_buffer)
+        generated = time.perf_counter()
+        wat_buffer.seek(0)
+        # Ассемблер читает WAT построчно прямо из буфера
+        wasm_code = assemble(wat_buffer)
+        if timings is not None:
+            timings['codegen'] = generated - start
+            timings['assemble'] = time.perf_counter() - generated
+        if cache is not None:
+            cache.put(source_code, dict(compiler_options, opt_level=opt_level), wasm_code, 'wasm')
+        return wasm_code
 
-        # 2. Построение AST
-        builder = ASTBuilder()
-        ast = builder.visit(tree)
-        if not ast:
-            print("Failed to build AST.")
-            return None
+    except Exception as e:
+        print(f"Compilation Error: {e}")
+        return None
 
+
+def compile_source_to_wat(source_code, cache=None, timings=None, two_stage=True, lexer='fast', build_tree=False,
+                          out=None, opt_level=0, **compiler_options):
+    """Компилирует исходный код в текст WAT (для отладки); None при ошибке.
+
+    out — необязательный текстовый поток (файл): WAT пишется в него по мере генерации, не собираясь в памяти
+    целиком, и возвращается out; результат тогда не кэшируется.
+    """
+    try:
+        if cache is not None:
+            wat_code = cache.get(source_code, dict(compiler_options, opt_level=opt_level), 'wat')
+            if wat_code is not None:
+                if out is None:
+                    return wat_code
+                out.write(wat_code + "\n")
+                return out
+        ast = parse_source(source_code, two_stage, timings, lexer, build_tree)
+        if ast is None:
+            return None
+        ast = optimize_ast(ast, opt_level, timings)
         # 3. Компиляция в WAT
-        compiler = WASMCompiler()
-        wat_code = compiler.compile(ast)
+        start = time.perf_counter()
+        wat_code = WASMCompiler(**compiler_options).compile(ast, out)
+        if timings is not None:
+            timings['codegen'] = time.perf_counter() - start
+        if out is not None:
+            return out
+        if cache is not None:
+            cache.put(source_code, dict(compiler_options, opt_level=opt_level), wat_code, 'wat')
         return wat_code
 
     except Exception as e:
@@ -41,12 +183,107 @@ def compile_source(source_code):
         return None
 
 
+def run_wasm(wasm_code, runner=RUNNER_PATH):
+    """Выполняет модуль через Node.js, передавая байты через stdin; возвращает вывод программы.
+
+    При ошибке выполнения выбрасывает subprocess.CalledProcessError.
+    """
+    result = subprocess.run(
+        ["node", runner, "-"],
+        input=wasm_code,
+        capture_output=True,
+        check=True
+    )
+    return result.stdout.decode('utf-8')
+
+
+class WasmRuntimeError(Exception):
+    def __init__(self, message, output):
+        super().__init__(message)
+        self.output = output
+
+
+class WasmWorker:
+    """Долгоживущий процесс `node runner.js --server`: Node.js и скомпилированные модули остаются «теплыми».
+
+    Использование:
+        with WasmWorker() as worker:
+            output = worker.run(compile_source(code), input="1 2 3")
+    """
+
+    def __init__(self, runner=RUNNER_PATH):
+        self.process = subprocess.Popen(["node", runner, "--server"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def run(self, wasm_code, input=""):
+        """Выполняет модуль; input — числа для read() через пробел. Возвращает вывод программы.
+
+        При ошибке выполнения выбрасывает WasmRuntimeError (вывод до ошибки — в атрибуте output).
+        """
+        data = input.encode('utf-8')
+        self.process.stdin.write(struct.pack('<I', len(wasm_code)) + wasm_code + struct.pack('<I', len(data)) + data)
+        self.process.stdin.flush()
+
+        status, output_len = struct.unpack('<BI', self._read(5))
+        output = self._read(output_len).decode('utf-8')
+        (error_len,) = struct.unpack('<I', self._read(4))
+        error = self._read(error_len).decode('utf-8')
+        if status != 0:
+            raise WasmRuntimeError(error, output)
+        return output
+
+    def _read(self, size):
+        data = self.process.stdout.read(size)
+        if len(data) != size:
+            raise RuntimeError("Node.js worker exited unexpectedly")
+        return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 def main():
     parser = argparse.ArgumentParser(description="ListLang Compiler & Runner")
     parser.add_argument("file", help="Path to the source file (.list)")
-    parser.add_argument("--wat", help="Output WAT filename", default="output.wat")
-    parser.add_argument("--wasm", help="Output WASM filename", default="output.wasm")
-    parser.add_argument("--runner", help="Path to runner.js", default="runner.js")
+    parser.add_argument("--wat", help="Output WAT filename (with --via-wat)", default="output.wat")
+    parser.add_argument("--wasm", help="Also save the WASM module to this file (default with --via-wat: output.wasm)",
+                        default=None)
+    parser.add_argument("--runner", help="Path to runner.js", default=RUNNER_PATH)
+    parser.add_argument("--via-wat", help="Debug: write WAT text and convert it with wabt instead of the "
+                                          "in-process WAT assembler", action="store_true")
+    parser.add_argument("--memory-pages", help="Initial linear memory size in 64 KiB pages", type=int, default=1)
+    parser.add_argument("--max-memory-pages", help="Upper bound for memory growth in 64 KiB pages",
+                        type=int, default=None)
+    parser.add_argument("--values", help="Representation of polymorphic list elements: heap cells or inline "
+                                         "8-byte tagged slots", choices=WASMCompiler.VALUE_REPRS, default="boxed")
+    parser.add_argument("--no-bulk-memory", help="Copy list data with a word loop instead of memory.copy "
+                                                 "(for engines without the bulk-memory proposal)", action="store_true")
+    parser.add_argument("--no-tree-shake", help="Emit every runtime helper and host import, not only the ones "
+                                                "the program can reach", action="store_true")
+    parser.add_argument("-O", dest="opt_level", help="Optimization level: 1 folds constant expressions, simplifies "
+                                                     "identities and propagates literal variables (-O is -O1); 2 also "
+                                                     "runs copy propagation, common subexpression elimination, "
+                                                     "loop-invariant code motion and dead code elimination on "
+                                                     "three-address code",
+                        type=int, nargs="?", const=1, default=0, choices=[0, 1, 2])
+    parser.add_argument("--cache-dir", help="Directory of the compiled-module cache (default: ~/.cache/listlang)",
+                        default=None)
+    parser.add_argument("--no-cache", help="Always recompile, bypassing the compiled-module cache",
+                        action="store_true")
+    parser.add_argument("--full-ll", help="Parse with full LL prediction only, skipping the fast SLL pass",
+                        action="store_true")
+    parser.add_argument("--lexer", help="Lexer implementation: regex-based or the generated ANTLR one",
+                        choices=sorted(LEXERS), default="fast")
+    parser.add_argument("--parse-tree", help="Build the full ANTLR parse tree and walk it to get the AST "
+                                             "(default: build the AST while parsing)", action="store_true")
+    parser.add_argument("--timings", help="Print the time spent in each compilation phase", action="store_true")
 
     args = parser.parse_args()
     source_path = args.file
@@ -60,33 +297,75 @@ def main():
     with open(source_path, 'r', encoding='utf-8') as f:
         code = f.read()
 
-    # 2. Компиляция (ListLang -> WAT)
-    print(f"--- [2/4] Compiling to WAT ---")
-    wat_code = compile_source(code)
+    compiler_options = dict(memory_pages=args.memory_pages, max_memory_pages=args.max_memory_pages,
+                            value_repr=args.values, bulk_memory=not args.no_bulk_memory,
+                            tree_shake=not args.no_tree_shake)
+    cache = None if args.no_cache else CompileCache(args.cache_dir)
+    # DFA предсказания ANTLR, накопленные прошлыми запусками
+    dfa_path = None if args.no_cache else dfa_cache.dfa_cache_path(args.cache_dir)
+    dfa_states = dfa_cache.dfa_state_count()
+    if dfa_path is not None and dfa_cache.load_dfa_cache(dfa_path):
+        dfa_states = dfa_cache.dfa_state_count()
+    timings = {} if args.timings else None
 
-    if not wat_code:
-        print("Error: Compilation failed.")
-        sys.exit(1)
+    if not args.via_wat:
+        # 2-3. Компиляция (ListLang -> WASM) в памяти
+        print(f"--- [2/4] Compiling to WASM ---")
+        wasm_code = compile_source(code, cache=cache, timings=timings, two_stage=not args.full_ll, lexer=args.lexer,
+                                   build_tree=args.parse_tree, opt_level=args.opt_level, **compiler_options)
+        if not wasm_code:
+            print("Error: Compilation failed.")
+            sys.exit(1)
 
-    with open(args.wat, 'w', encoding='utf-8') as f:
-        f.write(wat_code)
-    print(f"Saved to {args.wat}")
+        print(f"--- [3/4] Compiled {len(wasm_code)} bytes ---")
+        if args.wasm:
+            with open(args.wasm, 'wb') as f:
+                f.write(wasm_code)
+            print(f"Saved to {args.wasm}")
+    else:
+        # 2. Компиляция (ListLang -> WAT)
+        print(f"--- [2/4] Compiling to WAT ---")
+        # WAT пишется в файл по мере генерации
+        with open(args.wat, 'w', encoding='utf-8') as f:
+            wat_code = compile_source_to_wat(code, cache=cache, timings=timings, two_stage=not args.full_ll,
+                                             lexer=args.lexer, build_tree=args.parse_tree, out=f,
+                                             opt_level=args.opt_level, **compiler_options)
 
-    # 3. Конвертация (WAT -> WASM) с помощью библиотеки wabt
-    print(f"--- [3/4] Converting to WASM (via python-wabt) ---")
-    try:
-        wabt = Wabt()
-        # Парсим WAT строку
-        # Первый аргумент - имя файла для логов ошибок, второй - содержимое
-        wabt.wat_to_wasm(args.wat, args.wasm)
+        if not wat_code:
+            print("Error: Compilation failed.")
+            sys.exit(1)
+        print(f"Saved to {args.wat}")
 
-        output = wabt.wasm_validate(args.wasm)
-        print(output)
-        print(f"Saved to {args.wasm}")
+        # 3. Конвертация (WAT -> WASM) с помощью библиотеки wabt
+        print(f"--- [3/4] Converting to WASM (via python-wabt) ---")
+        wasm_path = args.wasm or "output.wasm"
+        try:
+            from wabt import Wabt
+            wabt = Wabt()
+            # Парсим WAT строку
+            # Первый аргумент - имя файла для логов ошибок, второй - содержимое
+            wabt.wat_to_wasm(args.wat, wasm_path)
 
-    except Exception as e:
-        print(f"Error during WAT->WASM conversion: {e}")
-        sys.exit(1)
+            output = wabt.wasm_validate(wasm_path)
+            print(output)
+            print(f"Saved to {wasm_path}")
+
+        except Exception as e:
+            print(f"Error during WAT->WASM conversion: {e}")
+            sys.exit(1)
+
+        with open(wasm_path, 'rb') as f:
+            wasm_code = f.read()
+
+    # Сохраняем DFA, только если разбор добавил новые состояния
+    if dfa_path is not None and dfa_cache.dfa_state_count() > dfa_states:
+        dfa_cache.save_dfa_cache(dfa_path)
+
+    if timings is not None:
+        if timings:
+            print("Timings: " + ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in timings.items()))
+        else:
+            print("Timings: compiled module taken from cache")
 
     # 4. Запуск (Node.js -> runner.js)
     print(f"--- [4/4] Running via Node.js ---")
@@ -96,14 +375,7 @@ def main():
         sys.exit(1)
 
     try:
-        result = subprocess.run(
-            ["node", args.runner],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-
-        program_output = result.stdout
+        program_output = run_wasm(wasm_code, args.runner)
 
         print("\n=== PROGRAM OUTPUT ===")
         print(program_output.strip())  # strip чтобы убрать лишние переносы
@@ -117,7 +389,7 @@ def main():
 
     except subprocess.CalledProcessError as e:
         print("Runtime Error (Node.js):")
-        print(e.stderr)
+        print(e.stderr.decode('utf-8', errors='replace'))
         sys.exit(1)
 
 
@@ -1,59 +1,136 @@
 const fs = require('fs');
+const util = require('util');
+const crypto = require('crypto');
 
-async function runWasm() {
-    // 1. Читаем бинарный файл
-    const wasmBuffer = fs.readFileSync('./output.wasm');
-
-    // 2. Определяем память (будет переопределена экспортом из wasm)
-    let memory;
-
-    // 3. Реализуем импорты (функции, которых не хватает в WASM)
-    const importObject = {
+// Импорты модуля; write — куда печатать, input — числа для read_i32
+function makeImports(getMemory, write, input = []) {
+    let inputPos = 0;
+    const println = (...args) => write(util.format(...args) + "\n");
+    return {
         env: {
             // Печать целых чисел
             print_i32: (value) => {
-                console.log("[Output Int]:", value);
+                println("[Output Int]:", value);
             },
             // Печать дробных чисел
             print_f32: (value) => {
-                console.log("[Output Float]:", value);
+                println("[Output Float]:", value);
             },
             // Печать строк (самое сложное, так как передается указатель)
             print_string: (offset) => {
-                const buffer = new Uint8Array(memory.buffer);
+                const buffer = new Uint8Array(getMemory().buffer);
                 let string = "";
                 // Читаем байты, пока не встретим 0 (null-terminator)
                 while (buffer[offset] !== 0) {
                     string += String.fromCharCode(buffer[offset]);
                     offset++;
                 }
-                console.log("[Output String]:", string);
+                println("[Output String]:", string);
             },
-            // Чтение числа (заглушка, так как в nodejs сложно сделать синхронный ввод)
+            // Чтение числа: следующее из переданного ввода, иначе заглушка (синхронный ввод в nodejs сложен)
             read_i32: () => {
+                if (inputPos < input.length) return input[inputPos++];
                 return 42; // Возвращаем фейковое число
             },
             print_char: (char_code) => {
-                process.stdout.write(String.fromCharCode(char_code));
+                write(String.fromCharCode(char_code));
             },
             // Печать числа без переноса строки
             print_num: (value) => {
-                process.stdout.write(value.toString());
+                write(value.toString());
+            },
+            // Вызывается $malloc, когда memory.grow не может выделить память
+            out_of_memory: (size) => {
+                const pages = getMemory().buffer.byteLength / 65536;
+                throw new Error(`Heap exhausted: cannot allocate ${size} bytes (memory: ${pages} pages)`);
             }
         }
     };
+}
 
-    // 4. Инстанцируем модуль
-    const wasmModule = await WebAssembly.instantiate(wasmBuffer, importObject);
-    const { instance } = wasmModule;
+function parseInput(text) {
+    return text.split(/\s+/).filter(s => s.length > 0).map(s => parseInt(s, 10) | 0);
+}
 
-    // 5. Получаем доступ к памяти модуля (чтобы работала print_string)
+async function execute(module, write, input) {
+    let memory;
+    const instance = await WebAssembly.instantiate(module, makeImports(() => memory, write, input));
+    // Доступ к памяти модуля (чтобы работала print_string)
     memory = instance.exports.memory;
-
-    // 6. Запускаем функцию main
-    console.log("--- Starting Program ---");
+    write("--- Starting Program ---\n");
     instance.exports.main();
-    console.log("--- End Program ---");
+    write("--- End Program ---\n");
+}
+
+// Использование: node runner.js [файл.wasm | -]; "-" — модуль читается из stdin
+async function runWasm(source = './output.wasm') {
+    // Читаем бинарный модуль (файл или stdin)
+    const wasmBuffer = fs.readFileSync(source === '-' ? 0 : source);
+    const module = await WebAssembly.compile(wasmBuffer);
+    await execute(module, (s) => process.stdout.write(s));
+}
+
+// Режим сервера: node runner.js --server
+// Запрос:  u32 длина модуля, байты модуля, u32 длина ввода, ввод (UTF-8, числа через пробел)
+// Ответ:   u8 статус (0 — успех, 1 — ошибка), u32 длина вывода, вывод, u32 длина ошибки, текст ошибки
+// Все числа — little-endian. Скомпилированные модули кэшируются по хэшу байтов.
+const MODULE_CACHE_SIZE = 64;
+
+function serve() {
+    const modules = new Map();
+    let pending = Buffer.alloc(0);
+    let busy = Promise.resolve();
+
+    const getModule = async (bytes) => {
+        const key = crypto.createHash('sha1').update(bytes).digest('hex');
+        let module = modules.get(key);
+        if (!module) {
+            module = await WebAssembly.compile(bytes);
+            if (modules.size >= MODULE_CACHE_SIZE) modules.delete(modules.keys().next().value);
+            modules.set(key, module);
+        }
+        return module;
+    };
+
+    const handle = async (bytes, inputText) => {
+        const chunks = [];
+        let status = 0, error = "";
+        try {
+            await execute(await getModule(bytes), (s) => chunks.push(s), parseInput(inputText));
+        } catch (e) {
+            status = 1;
+            error = e && e.message ? e.message : String(e);
+        }
+        const output = Buffer.from(chunks.join(''), 'utf-8');
+        const errorBuf = Buffer.from(error, 'utf-8');
+        const header = Buffer.alloc(5);
+        header.writeUInt8(status, 0);
+        header.writeUInt32LE(output.length, 1);
+        const errorLen = Buffer.alloc(4);
+        errorLen.writeUInt32LE(errorBuf.length, 0);
+        process.stdout.write(Buffer.concat([header, output, errorLen, errorBuf]));
+    };
+
+    process.stdin.on('data', (data) => {
+        pending = Buffer.concat([pending, data]);
+        // Разбираем все полностью полученные запросы
+        while (pending.length >= 4) {
+            const moduleLen = pending.readUInt32LE(0);
+            if (pending.length < 8 + moduleLen) break;
+            const inputLen = pending.readUInt32LE(4 + moduleLen);
+            const total = 8 + moduleLen + inputLen;
+            if (pending.length < total) break;
+            const bytes = pending.subarray(4, 4 + moduleLen);
+            const inputText = pending.subarray(8 + moduleLen, total).toString('utf-8');
+            pending = pending.subarray(total);
+            // Запросы выполняются строго по очереди, ответы идут в том же порядке
+            busy = busy.then(() => handle(bytes, inputText));
+        }
+    });
 }
 
-runWasm();
\ No newline at end of file
+if (process.argv[2] === '--server') {
+    serve();
+} else {
+    runWasm(process.argv[2]);
+}
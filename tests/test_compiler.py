@@ -0,0 +1,119 @@
+import shutil
+import unittest
+
+from run import compile_source, run_wasm
+
+# Программы компилируются в обоих представлениях значений и выполняются через Node.js.
+VALUE_REPRS = ('boxed', 'tagged')
+
+
+def program_output(source, **options):
+    """Строки вывода программы без служебных строк runner.js."""
+    wasm_code = compile_source(source, **options)
+    if wasm_code is None:
+        raise AssertionError(f"compilation failed for {options}")
+    lines = run_wasm(wasm_code).splitlines()
+    return [line for line in lines if line.startswith('[Output')]
+
+
+@unittest.skipUnless(shutil.which('node'), "node is required to run WASM modules")
+class ForLoopVariableTest(unittest.TestCase):
+    """Переменная цикла, которая обходит списки с разной раскладкой элементов."""
+
+    def assert_output(self, source, expected):
+        for value_repr in VALUE_REPRS:
+            for opt_level in (0, 2):
+                with self.subTest(value_repr=value_repr, opt_level=opt_level):
+                    self.assertEqual(program_output(source, value_repr=value_repr, opt_level=opt_level), expected)
+
+    def test_int_and_float_lists(self):
+        # Регрессия: локальная объявлялась по первому списку (i32), второй цикл загружал f32
+        source = (
+            "a = []\n"
+            "a.add(1)\n"
+            "b = []\n"
+            "b.add(1.5)\n"
+            "for x in a:\n"
+            "    write(x)\n"
+            "for x in b:\n"
+            "    write(x)\n"
+        )
+        # Оба списка становятся полиморфными; write элемента печатает i32, как и до раскладок
+        self.assert_output(source, ['[Output Int]: 1', '[Output Int]: 1069547520'])
+
+    def test_flat_and_polymorphic_lists(self):
+        source = (
+            "a = []\n"
+            "a.add(4)\n"
+            "p = []\n"
+            "p.add(2)\n"
+            "p.add(0.5)\n"
+            "s = 0\n"
+            "for x in p:\n"
+            "    s = s + x\n"
+            "for x in a:\n"
+            "    s = s + x\n"
+            "write(s)\n"
+        )
+        self.assert_output(source, ['[Output Int]: 6'])
+
+    def test_variable_declared_by_assignment(self):
+        # Загруженный элемент приводится к типу, с которым переменная объявлена
+        source = (
+            "b = []\n"
+            "b.add(1.5)\n"
+            "b.add(2.5)\n"
+            "y = 7\n"
+            "for y in b:\n"
+            "    write(y)\n"
+            "a = []\n"
+            "a.add(3)\n"
+            "z = 0.5\n"
+            "for z in a:\n"
+            "    write(z)\n"
+        )
+        self.assert_output(source, ['[Output Int]: 1', '[Output Int]: 2', '[Output Float]: 3'])
+
+
+@unittest.skipUnless(shutil.which('node'), "node is required to run WASM modules")
+class ListElementAsListTest(unittest.TestCase):
+    """Элемент полиморфного списка, используемый как список (в tagged-режиме это i64-слот)."""
+
+    def assert_output(self, source, expected):
+        for value_repr in VALUE_REPRS:
+            with self.subTest(value_repr=value_repr):
+                self.assertEqual(program_output(source, value_repr=value_repr), expected)
+
+    def test_scalar_element_used_as_list(self):
+        # Регрессия: в tagged-режиме i64-слот попадал прямо в i32.load и модуль не проходил валидацию
+        for use in ("write(g.len())", "g.add(1)", "for t in g:\n    write(t)"):
+            source = "outer = []\nouter.add(5)\nouter.add(2.5)\ng = outer.get(0)\n" + use + "\n"
+            for value_repr in VALUE_REPRS:
+                with self.subTest(use=use, value_repr=value_repr):
+                    self.assertIsNotNone(compile_source(source, value_repr=value_repr))
+                    program_output(source, value_repr=value_repr)
+
+    def test_nested_list(self):
+        source = (
+            "inner = []\n"
+            "inner.add(7)\n"
+            "inner.add(8)\n"
+            "outer = []\n"
+            "outer.add(inner)\n"
+            "outer.add(2.5)\n"
+            "g = outer.get(0)\n"
+            "write(g.len())\n"
+            "write(g.get(1))\n"
+            "g.add(9)\n"
+            "for t in g:\n"
+            "    write(t)\n"
+            "c = g + inner\n"
+            "write(c.len())\n"
+        )
+        expected = ['[Output Int]: 2', '[Output Int]: 8', '[Output Int]: 7', '[Output Int]: 8', '[Output Int]: 9',
+                    '[Output Int]: 6']
+        self.assert_output(source, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
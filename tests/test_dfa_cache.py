@@ -0,0 +1,99 @@
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from compiler import dfa_cache
+from compiler.cache import PACKAGE_ROOT
+
+SOURCE = (
+    "func scale(a, b):\n"
+    "    return a * b + 1\n"
+    "\n"
+    "L = []\n"
+    "L.add(1.5)\n"
+    "for x in L:\n"
+    "    if x >= 1 && !(x == 2):\n"
+    "        write(scale(x, L.len()) % 3)\n"
+    "    else:\n"
+    "        write(\"small\")\n"
+)
+
+# Каждый этап — в отдельном интерпретаторе: DFA хранятся в атрибутах классов и в одном процессе прогреваются сами.
+# Вывод: загружен ли кэш, число состояний DFA до и после разбора и AST.
+CHILD = """
+import sys
+from compiler import dfa_cache
+import run
+command, path = sys.argv[1:]
+loaded = dfa_cache.load_dfa_cache(path) if command == 'load' else None
+before = dfa_cache.dfa_state_count()
+ast = run.parse_source(sys.stdin.read())
+print(loaded, before, dfa_cache.dfa_state_count())
+print(repr(ast))
+if command == 'save':
+    dfa_cache.save_dfa_cache(path)
+"""
+
+
+def run_child(command, path):
+    result = subprocess.run([sys.executable, "-c", CHILD, command, path], input=SOURCE, capture_output=True,
+                            text=True, cwd=PACKAGE_ROOT, check=True)
+    header, ast = result.stdout.split("\n", 1)
+    loaded, before, after = header.split()
+    return loaded, int(before), int(after), ast
+
+
+class Payload:
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return os.mkdir, (self.marker,)
+
+
+class DFACacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'dfa.pickle')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_reparse_with_loaded_cache(self):
+        _, _, saved_states, _ = run_child('save', self.path)
+        loaded, before, after, cached_ast = run_child('load', self.path)
+        self.assertEqual(loaded, 'True')
+        # Все нужные для разбора состояния уже есть в кэше
+        self.assertEqual((before, after), (saved_states, saved_states))
+        _, _, _, fresh_ast = run_child('none', self.path)
+        self.assertEqual(cached_ast, fresh_ast)
+        self.assertIn('Program', cached_ast)
+
+    def test_writable_by_others(self):
+        run_child('save', self.path)
+        for mode in (0o620, 0o602, 0o666):
+            os.chmod(self.path, mode)
+            with self.subTest(mode=oct(mode)):
+                self.assertFalse(dfa_cache.load_dfa_cache(self.path))
+
+    @unittest.skipUnless(hasattr(os, 'getuid') and os.getuid() == 0, "changing the owner requires root")
+    def test_owned_by_another_user(self):
+        run_child('save', self.path)
+        os.chown(self.path, 65534, -1)
+        self.assertFalse(dfa_cache.load_dfa_cache(self.path))
+
+    def test_foreign_classes_rejected(self):
+        marker = os.path.join(self.directory.name, 'marker')
+        with open(self.path, 'wb') as f:
+            pickle.dump({'parser': (Payload(marker), None)}, f)
+        os.chmod(self.path, 0o600)
+        self.assertFalse(dfa_cache.load_dfa_cache(self.path))
+        self.assertFalse(os.path.exists(marker))
+
+
+if __name__ == '__main__':
+    unittest.main()
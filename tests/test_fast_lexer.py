@@ -0,0 +1,135 @@
+import random
+import unittest
+
+from antlr4 import InputStream, Token
+from antlr4.error.ErrorListener import ErrorListener
+
+from ListLangFastLexer import ListLangFastLexer
+from gen.ListLangLexer import ListLangLexer
+
+# Дифференциальный тест: ListLangFastLexer должен выдавать ровно те же токены и ошибки, что и
+# сгенерированный ListLangLexer (оба — вместе с ListLangDenterHelper).
+
+SAMPLES = [
+    "",
+    "x = 1\n",
+    "func sum(a, b):\n"
+    "    return a + b\n"
+    "\n"
+    "L = []\n"
+    "L.add(1)\n"
+    "L.add(2.5)\n"
+    "for x in L:\n"
+    "    if x > 1 && x != 3:\n"
+    "        write(x)\n"
+    "    else:\n"
+    "        write(\"small\")\n"
+    "i = 0\n"
+    "while i < L.len():\n"
+    "    i = i + 1\n"
+    "switch i:\n"
+    "    case 1:\n"
+    "        break\n"
+    "    default:\n"
+    "        write(sum(i, 2))\n",
+    # Скобки продолжают строку, комментарии и пустые строки не меняют отступ
+    "x = [1,\n"
+    "     2, 3]  # comment\n"
+    "\n"
+    "    # indented comment\n"
+    "y = (x.get(0) *\n"
+    "  2)\n",
+    # Числа, строки с экранированием, ключевые слова как префиксы имен
+    "f = .5 + 5. + 0.25 - 007 % 10 / 3\n"
+    "s = \"a \\\"quoted\\\" \\\\ string\"\n"
+    "iffy = true || false\n"
+    "forx = !returned\n",
+    "a = 1\r\nif a:\r\n\tb = 2\r\n",
+    # Ошибки распознавания: одиночные '|' и '&', '\r' без '\n', незакрытая строка
+    "x = 1 | 2\n"
+    "y = 1 & 2 @ 3\n"
+    "z = $\r"
+    "w = \"unterminated\n"
+    "q = 1\n",
+    # Несогласованный отступ: оба лексера бросают одно и то же исключение
+    "if x:\n"
+    "        a = 1\n"
+    "    b = 2\n",
+    "x = 1",
+]
+
+# Материал для случайных входов: корректные токены, ошибочные символы и пробельные последовательности
+FRAGMENTS = [
+    'func', 'return', 'if', 'else', 'switch', 'case', 'while', 'for', 'in', 'default', 'break', 'true', 'false',
+    'x', 'ls', 'a_1', 'iffy', '0', '00', '7', '42', '3.14', '.5', '5.', '"str"', '"a\\"b"', '"bad',
+    '+', '-', '*', '/', '%', '=', '==', '!=', '<', '<=', '>', '>=', '!', '&&', '||', '&', '|',
+    '(', ')', '[', ']', '{', '}', ',', '.', ':', ';', '# note', '@', '$', '?', '~', '\\',
+    ' ', '  ', '    ', '\t', '\n', '\n', '\n    ', '\n        ', '\r\n', '\r',
+]
+
+
+class RecordingErrorListener(ErrorListener):
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append((line, column, msg))
+
+
+def lex(lexer_class, text):
+    """(токены, сообщения об ошибках, исключение) для текста; токен — кортеж всех значимых полей."""
+    lexer = lexer_class(InputStream(text))
+    listener = RecordingErrorListener()
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(listener)
+    tokens = []
+    failure = None
+    try:
+        while True:
+            token = lexer.nextToken()
+            tokens.append((token.type, token.text, token.line, token.column, token.channel,
+                           token.start, token.stop))
+            if token.type == Token.EOF: break
+    except Exception as e:
+        failure = (type(e), str(e))
+    return tokens, listener.errors, failure
+
+
+def random_input(rng):
+    return ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 60)))
+
+
+class FastLexerDifferentialTest(unittest.TestCase):
+
+    def assert_same(self, text):
+        self.assertEqual(lex(ListLangFastLexer, text), lex(ListLangLexer, text), msg=repr(text))
+
+    def test_samples(self):
+        for text in SAMPLES:
+            with self.subTest(text=text):
+                self.assert_same(text)
+
+    def test_generated_program(self):
+        rng = random.Random(13)
+        lines = []
+        for i in range(400):
+            depth = rng.randint(0, 2)
+            lines.append("    " * depth + rng.choice([
+                f"v{i} = v{i - 1} * {rng.randint(0, 99)} + {rng.random():.3f}",
+                f"if v{i} >= {rng.randint(0, 9)} && !done:",
+                f"write(\"line {i}\")",
+                f"ls.add((v{i} - 1) % 7)  # step {i}",
+                "",
+            ]))
+        self.assert_same("\n".join(lines) + "\n")
+
+    def test_random_inputs(self):
+        rng = random.Random(2024)
+        for _ in range(1500):
+            text = random_input(rng)
+            with self.subTest(text=text):
+                self.assert_same(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,458 @@
+import random
+import shutil
+import unittest
+
+from compiler.ast_nodes import Literal, Type
+from compiler.ir import FunctionIR, Quad, WhileRegion, ForRegion
+from compiler.optimizer import ASTOptimizer, fold_binary, fold_not
+from run import compile_source, parse_source, WasmWorker, WasmRuntimeError
+
+# Оптимизации -O1/-O2 не должны менять поведение программы: вывод (и ловушка, если она есть) совпадает с -O0.
+
+INT_VARS = ['a', 'b', 'c', 'd']
+FLOAT_VARS = ['x', 'y']
+
+
+class ProgramGenerator:
+    """Случайные программы на целых, f32 и списке L: ветвления, циклы, switch, break, вызовы и swap."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        # Уже построенные выражения повторяются, чтобы было что находить устранению общих подвыражений
+        self.pool = []
+        self.lines = []
+
+    def int_expr(self, depth=0):
+        rng = self.rng
+        if self.pool and rng.random() < 0.25: return rng.choice(self.pool)
+        k = rng.random()
+        if depth > 2 or k < 0.3:
+            expr = rng.choice(INT_VARS + [str(rng.randint(0, 9)), '(0 - 3)'])
+        else:
+            op = rng.choice(['+', '-', '*', '+', '-', '/', '%', '<', '==', '&&'])
+            if op in ('/', '%'):
+                expr = f"({self.int_expr(depth + 1)} {op} {rng.choice(['3', '2', '7', '(0 - 1)', '1'])})"
+            elif k < 0.38:
+                expr = f"!{self.int_expr(depth + 1)}"
+            else:
+                expr = f"({self.int_expr(depth + 1)} {op} {self.int_expr(depth + 1)})"
+        if depth == 0: self.pool.append(expr)
+        return expr
+
+    def float_expr(self, depth=0):
+        rng = self.rng
+        k = rng.random()
+        if depth > 2 or k < 0.3: return rng.choice(FLOAT_VARS + ['1.5', '0.25', '2.0'])
+        op = rng.choice(['+', '-', '*'])
+        if k < 0.45: return f"({self.float_expr(depth + 1)} {op} {self.int_expr(depth + 2)})"
+        return f"({self.float_expr(depth + 1)} {op} {self.float_expr(depth + 1)})"
+
+    def block(self, depth, indent, in_loop):
+        rng, lines = self.rng, self.lines
+        pad = '    ' * indent
+        for _ in range(rng.randint(1, 8 if depth == 0 else 4)):
+            k = rng.random()
+            if k < 0.35:
+                lines.append(f"{pad}{rng.choice(INT_VARS)} = {self.int_expr()}")
+            elif k < 0.45:
+                lines.append(f"{pad}{rng.choice(FLOAT_VARS)} = {self.float_expr()}")
+            elif k < 0.55:
+                lines.append(f"{pad}write({rng.choice([self.int_expr(), self.float_expr()])})")
+            elif k < 0.62 and depth < 3:
+                lines.append(f"{pad}if {self.int_expr()}:")
+                self.block(depth + 1, indent + 1, in_loop)
+                if rng.random() < 0.5:
+                    lines.append(f"{pad}else:")
+                    self.block(depth + 1, indent + 1, in_loop)
+            elif k < 0.68 and depth < 2:
+                counter = f"w{depth}{len(lines)}"
+                bound = rng.choice([str(rng.randint(0, 4)), f"L.len() && {counter} < 6",
+                                    f"L.len() - {self.int_expr()} && {counter} < 5"])
+                lines.extend([f"{pad}{counter} = 0", f"{pad}while {counter} < {bound}:",
+                              f"{pad}    {counter} = {counter} + 1"])
+                self.block(depth + 1, indent + 1, True)
+            elif k < 0.72 and depth < 2:
+                lines.append(f"{pad}switch {self.int_expr()}:")
+                for value in rng.sample(range(0, 5), rng.randint(1, 3)):
+                    lines.append(f"{pad}    case {value}:")
+                    self.block(depth + 1, indent + 2, True)
+                if rng.random() < 0.5:
+                    lines.append(f"{pad}    default:")
+                    self.block(depth + 1, indent + 2, True)
+            elif k < 0.76 and depth < 2:
+                lines.extend([f"{pad}for e in L:", f"{pad}    a = a + e"])
+                self.block(depth + 1, indent + 1, True)
+            elif k < 0.79 and in_loop:
+                lines.append(f"{pad}break")
+            elif k < 0.82:
+                lines.append(f"{pad}swap({rng.choice(INT_VARS)}, {rng.choice(INT_VARS)})")
+            elif k < 0.86:
+                lines.append(f"{pad}L.add({self.int_expr()})")
+            elif k < 0.90:
+                lines.append(f"{pad}{rng.choice(INT_VARS)} = L.len() + {self.int_expr()}")
+            elif k < 0.94:
+                lines.append(f"{pad}{rng.choice(INT_VARS)} = f({self.int_expr()}, {self.int_expr()})")
+            elif k < 0.97:
+                lines.append(f"{pad}{rng.choice(INT_VARS)} = {rng.choice(INT_VARS)}")
+            else:
+                lines.append(f"{pad}{rng.choice(FLOAT_VARS)} = {rng.choice(FLOAT_VARS)}")
+
+    def program(self):
+        rng = self.rng
+        body = self.int_expr().translate(str.maketrans('abcd', 'pqpq'))
+        self.lines = ["func f(p, q):", f"    r = {body}", "    s = r", "    if p < q:", "        return s * 2 + r",
+                      "    return s - p * q + p * q",
+                      "L = []", "L.add(1)"] + [f"{name} = {rng.randint(0, 5)}" for name in INT_VARS] + \
+                     ["x = 0.5", "y = 1.25"]
+        self.block(0, 0, False)
+        self.lines += [f"write({name})" for name in INT_VARS + FLOAT_VARS] + ["write(L)"]
+        return '\n'.join(self.lines) + '\n'
+
+
+def lower(source):
+    return FunctionIR(parse_source(source).statements)
+
+
+@unittest.skipUnless(shutil.which('node'), "node is required to run WASM modules")
+class OptimizationLevelsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.worker = WasmWorker()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.close()
+
+    def behaviour(self, source, opt_level):
+        """Вывод программы и признак ловушки."""
+        wasm_code = compile_source(source, opt_level=opt_level)
+        self.assertIsNotNone(wasm_code, msg=f"-O{opt_level} failed to compile:\n{source}")
+        try:
+            return self.worker.run(wasm_code), False
+        except WasmRuntimeError as e:
+            return e.output, True
+
+    def assert_same_behaviour(self, source):
+        expected = self.behaviour(source, 0)
+        for opt_level in (1, 2):
+            with self.subTest(opt_level=opt_level):
+                self.assertEqual(self.behaviour(source, opt_level), expected, msg=source)
+        return expected
+
+    def test_random_programs(self):
+        for seed in range(60):
+            source = ProgramGenerator(seed).program()
+            if compile_source(source) is None: continue
+            with self.subTest(seed=seed):
+                self.assert_same_behaviour(source)
+
+    def test_list_aliases(self):
+        # b и a — один и тот же список: a.len() после b.add нельзя заменить ранее вычисленным значением
+        source = (
+            "a = []\n"
+            "a.add(1)\n"
+            "b = a\n"
+            "n = a.len()\n"
+            "b.add(2)\n"
+            "m = a.len()\n"
+            "write(n)\n"
+            "write(m)\n"
+            "write(b.len())\n"
+        )
+        output, trapped = self.assert_same_behaviour(source)
+        self.assertFalse(trapped)
+        self.assertEqual([line.split()[-1] for line in output.splitlines() if line.startswith('[Output')],
+                         ['1', '2', '2'])
+
+    def test_list_alias_through_call_and_loop(self):
+        source = (
+            "func push(l, v):\n"
+            "    l.add(v)\n"
+            "a = []\n"
+            "a.add(1)\n"
+            "b = a\n"
+            "i = 0\n"
+            "s = 0\n"
+            "while i < 3:\n"
+            "    s = s + a.len()\n"
+            "    push(b, i)\n"
+            "    i = i + 1\n"
+            "c = b\n"
+            "k = a.len() * 2\n"
+            "c.add(7)\n"
+            "write(s)\n"
+            "write(k)\n"
+            "write(a.len() * 2)\n"
+        )
+        output, trapped = self.assert_same_behaviour(source)
+        self.assertFalse(trapped)
+        self.assertEqual([line.split()[-1] for line in output.splitlines() if line.startswith('[Output')],
+                         ['6', '8', '10'])
+
+    def test_trapping_division_is_kept(self):
+        # Результат не используется, но ловушка — наблюдаемое поведение: удалять деление нельзя
+        for divisor in ('b', '0', '(0 - 1)', '4294967295'):
+            source = f"a = 0 - 2147483647 - 1\nb = 0\nwrite(1)\nc = a / {divisor}\nd = a % {divisor}\nwrite(2)\n"
+            with self.subTest(divisor=divisor):
+                self.assertTrue(self.assert_same_behaviour(source)[1])
+
+    def test_division_in_untaken_branch(self):
+        source = (
+            "a = 7\n"
+            "b = 0\n"
+            "if b:\n"
+            "    write(a / b)\n"
+            "i = 0\n"
+            "while i < 0:\n"
+            "    c = a % b\n"
+            "    i = i + 1\n"
+            "write(a / 2 + a / 2)\n"
+        )
+        output, trapped = self.assert_same_behaviour(source)
+        self.assertFalse(trapped)
+
+    def test_zero_trip_loops(self):
+        # Вынесенное из цикла вычисляется и тогда, когда тело не выполняется ни разу
+        source = (
+            "a = 7\n"
+            "b = 0\n"
+            "n = 0\n"
+            "c = 5\n"
+            "L = []\n"
+            "i = 0\n"
+            "while i < n:\n"
+            "    c = a * 3\n"
+            "    d = a / b\n"
+            "    i = i + 1\n"
+            "for e in L:\n"
+            "    c = c + a % b\n"
+            "write(c)\n"
+        )
+        output, trapped = self.assert_same_behaviour(source)
+        self.assertFalse(trapped)
+        self.assertIn('[Output Int]: 5', output)
+
+
+def int_literal(value):
+    return Literal(value, Type.INT)
+
+
+def float_literal(value):
+    return Literal(value, Type.FLOAT)
+
+
+class FoldTest(unittest.TestCase):
+    """fold_binary / fold_not повторяют i32- и f32-семантику WASM и не сворачивают то, что дает ловушку."""
+
+    def test_i32_wraparound(self):
+        self.assertEqual(fold_binary('+', int_literal(2147483647), int_literal(1)), (-2147483648, Type.INT))
+        self.assertEqual(fold_binary('-', int_literal(-2147483648), int_literal(1)), (2147483647, Type.INT))
+        self.assertEqual(fold_binary('*', int_literal(65536), int_literal(65536)), (0, Type.INT))
+        self.assertEqual(fold_binary('*', int_literal(65537), int_literal(65537)), (131073, Type.INT))
+        # Литерал вне диапазона i32 сначала приводится к нему, как i32.const
+        self.assertEqual(fold_binary('+', int_literal(4294967296), int_literal(5)), (5, Type.INT))
+
+    def test_division_truncates_toward_zero(self):
+        for a, b, quotient, remainder in ((7, 2, 3, 1), (-7, 2, -3, -1), (7, -2, -3, 1), (-7, -2, 3, -1)):
+            with self.subTest(a=a, b=b):
+                self.assertEqual(fold_binary('/', int_literal(a), int_literal(b)), (quotient, Type.INT))
+                self.assertEqual(fold_binary('%', int_literal(a), int_literal(b)), (remainder, Type.INT))
+
+    def test_division_by_zero_and_minus_one(self):
+        for op in ('/', '%'):
+            self.assertIsNone(fold_binary(op, int_literal(5), int_literal(0)))
+            self.assertIsNone(fold_binary(op, int_literal(5), Literal(False, Type.BOOL)))
+        self.assertEqual(fold_binary('/', int_literal(5), int_literal(-1)), (-5, Type.INT))
+        self.assertEqual(fold_binary('%', int_literal(5), int_literal(-1)), (0, Type.INT))
+        # i32.div_s(I32_MIN, -1) — ловушка, i32.rem_s(I32_MIN, -1) — 0
+        self.assertIsNone(fold_binary('/', int_literal(-2147483648), int_literal(-1)))
+        self.assertIsNone(fold_binary('/', int_literal(2147483648), int_literal(4294967295)))
+        self.assertEqual(fold_binary('%', int_literal(-2147483648), int_literal(-1)), (0, Type.INT))
+
+    def test_f32_rounding(self):
+        self.assertEqual(fold_binary('+', float_literal(0.1), float_literal(0.2)), (0.30000001192092896, Type.FLOAT))
+        self.assertEqual(fold_binary('+', float_literal(16777216.0), float_literal(1.0)), (16777216.0, Type.FLOAT))
+        # Целый операнд приводится к f32 с округлением
+        self.assertEqual(fold_binary('+', int_literal(16777217), float_literal(0.0)), (16777216.0, Type.FLOAT))
+        self.assertEqual(fold_binary('/', float_literal(1.0), float_literal(3.0)), (0.3333333432674408, Type.FLOAT))
+        # inf и nan не сворачиваются
+        self.assertIsNone(fold_binary('/', float_literal(1.0), float_literal(0.0)))
+        self.assertIsNone(fold_binary('*', float_literal(3e38), float_literal(10.0)))
+
+    def test_comparison_types(self):
+        self.assertEqual(fold_binary('<', int_literal(1), int_literal(2)), (True, Type.BOOL))
+        self.assertEqual(fold_binary('<', float_literal(1.5), int_literal(2)), (True, Type.BOOL))
+        # Сравнение f32-значений: 16777217 при приведении становится 16777216
+        self.assertEqual(fold_binary('==', int_literal(16777217), float_literal(16777216.0)), (True, Type.BOOL))
+        self.assertEqual(fold_binary('==', int_literal(16777217), int_literal(16777216)), (False, Type.BOOL))
+        # Арифметика над результатом сравнения — i32, с float — f32
+        self.assertEqual(fold_binary('+', Literal(True, Type.BOOL), int_literal(1)), (2, Type.INT))
+        self.assertEqual(fold_binary('+', Literal(True, Type.BOOL), float_literal(0.5)), (1.5, Type.FLOAT))
+        self.assertEqual(fold_binary('&&', Literal(True, Type.BOOL), int_literal(3)), (1, Type.INT))
+
+    def test_fold_not(self):
+        self.assertEqual(fold_not(int_literal(0)), (1, Type.INT))
+        self.assertEqual(fold_not(int_literal(4294967296)), (1, Type.INT))
+        self.assertEqual(fold_not(int_literal(-1)), (0, Type.INT))
+        self.assertEqual(fold_not(float_literal(0.5)), (1, Type.INT))
+        self.assertEqual(fold_not(float_literal(2.5)), (0, Type.INT))
+        # i32.trunc_f32_s вне диапазона i32 — ловушка
+        self.assertIsNone(fold_not(float_literal(3e9)))
+        self.assertIsNone(fold_not(Literal("s", Type.STRING)))
+
+
+@unittest.skipUnless(shutil.which('node'), "node is required to run WASM modules")
+class FoldedProgramTest(unittest.TestCase):
+    """Программа со свернутыми (-O1) и несвернутыми (-O0) выражениями выводит одно и то же."""
+
+    EXPRESSIONS = [
+        "2147483647 + 1", "0 - 2147483647 - 2", "65536 * 65536", "65537 * 65537", "4294967296 + 5",
+        "(0 - 7) / 2", "7 / (0 - 2)", "(0 - 7) % 2", "7 % (0 - 2)", "5 / (0 - 1)", "5 % (0 - 1)",
+        "(0 - 2147483647 - 1) % (0 - 1)",
+        "0.1 + 0.2", "16777216.0 + 1.0", "16777217 + 0.0", "1.0 / 3.0", "0.1 * 3", "7 / 2.0", "1.0 / 0.0",
+        "1.5 < 2", "2 == 2.0", "16777217 == 16777216.0", "(1 < 2) + 0.5", "(3 > 2) * 4", "true + 1", "true && 3",
+        "!0", "!5", "!0.0", "!2.5", "!(0 - 1)",
+    ]
+    TRAPPING = ["5 / 0", "5 % 0", "(0 - 2147483647 - 1) / (0 - 1)"]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.worker = WasmWorker()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.worker.close()
+
+    def run_program(self, source, opt_level):
+        try:
+            return self.worker.run(compile_source(source, opt_level=opt_level)), False
+        except WasmRuntimeError as e:
+            return e.output, True
+
+    def test_folded_expressions(self):
+        source = "".join(f"write({expression})\n" for expression in self.EXPRESSIONS)
+        # Без свертки сравнивать нечего: на -O1 аргументы write должны стать литералами
+        folded = ASTOptimizer().optimize(parse_source(source)).statements
+        self.assertEqual([expression for expression, call in zip(self.EXPRESSIONS, folded)
+                          if call.arguments[0].__class__ is not Literal], ["1.0 / 0.0"])
+        expected = self.run_program(source, 0)
+        self.assertFalse(expected[1])
+        self.assertEqual(self.run_program(source, 1), expected)
+
+    def test_trapping_expressions(self):
+        for expression in self.TRAPPING:
+            source = f"write(1)\nwrite({expression})\nwrite(2)\n"
+            with self.subTest(expression=expression):
+                expected = self.run_program(source, 0)
+                self.assertTrue(expected[1])
+                self.assertEqual(self.run_program(source, 1), expected)
+
+
+class LoopInvariantTest(unittest.TestCase):
+    """FunctionIR.hoist_invariants на непреобразованном IR: что попадает в предзаголовок цикла."""
+
+    def hoist(self, source):
+        ir = lower(source)
+        ir.hoist_invariants()
+        loop = next(item for item in ir.items if item.__class__ in (WhileRegion, ForRegion))
+        inside = [loop.header if loop.__class__ is WhileRegion else loop.head, *ir._region_blocks(loop.body)]
+        return [quad.op for quad in loop.preheader.quads], [quad.op for block in inside for quad in block.quads]
+
+    def test_invariant_is_hoisted(self):
+        source = (
+            "a = 3\n"
+            "b = 4\n"
+            "L = []\n"
+            "L.add(1)\n"
+            "i = 0\n"
+            "s = 0\n"
+            "while i < 10:\n"
+            "    s = s + a * b + L.len()\n"
+            "    i = i + 1\n"
+        )
+        before, inside = self.hoist(source)
+        self.assertEqual(before, ['*', 'method'])
+        self.assertNotIn('*', inside)
+        self.assertNotIn('method', inside)
+
+    def test_nested_loops(self):
+        # Инвариант внешнего цикла выходит из обоих
+        source = (
+            "a = 3\n"
+            "i = 0\n"
+            "s = 0\n"
+            "while i < 10:\n"
+            "    j = 0\n"
+            "    while j < 10:\n"
+            "        s = s + a * a\n"
+            "        j = j + 1\n"
+            "    i = i + 1\n"
+        )
+        before, inside = self.hoist(source)
+        self.assertEqual(before, ['*'])
+        self.assertNotIn('*', inside)
+
+    def test_variable_keeps_its_assignment(self):
+        # При нуле итераций c не должна получить новое значение: в цикле остается копия готового значения
+        source = "a = 3\nc = 5\ni = 0\nn = 0\nwhile i < n:\n    c = a * 2\n    i = i + 1\n"
+        before, inside = self.hoist(source)
+        self.assertEqual(before, ['*'])
+        self.assertIn('copy', inside)
+
+    def test_operand_written_in_body(self):
+        source = "a = 3\ni = 0\ns = 0\nwhile i < 10:\n    s = s + a * 2\n    a = a + 1\n    i = i + 1\n"
+        before, inside = self.hoist(source)
+        self.assertEqual(before, [])
+        self.assertIn('*', inside)
+
+    def test_list_changed_in_body(self):
+        source = "L = []\ni = 0\ns = 0\nwhile i < 10:\n    s = s + L.len()\n    L.add(i)\n    i = i + 1\n"
+        before, inside = self.hoist(source)
+        self.assertEqual(before, [])
+        self.assertIn('method', inside)
+
+    def test_trapping_division(self):
+        for divisor in ('b', '0', '(0 - 1)'):
+            source = f"a = 3\nb = 2\ni = 0\ns = 0\nwhile i < 10:\n    s = s + a / {divisor}\n    i = i + 1\n"
+            with self.subTest(divisor=divisor):
+                before, inside = self.hoist(source)
+                self.assertNotIn('/', before)
+                self.assertIn('/', inside)
+
+    def test_variable_declared_in_loop(self):
+        # k впервые присваивается после цикла: в предзаголовке локальная еще не объявлена
+        source = "i = 0\ns = 0\nwhile i < 10:\n    if i > 5:\n        s = k * 2\n    i = i + 1\nk = 4\n"
+        before, inside = self.hoist(source)
+        self.assertEqual(before, [])
+        self.assertIn('*', inside)
+
+
+class DivisorGuardTest(unittest.TestCase):
+    """FunctionIR.is_pure: целочисленное деление чисто только при литеральном делителе, отличном от 0 и -1."""
+
+    def setUp(self):
+        self.ir = lower("a = 7\nb = 3\nx = 1.5\n")
+
+    def is_pure(self, op, divisor, dividend='a'):
+        return self.ir.is_pure(Quad(op, dividend, divisor, 't.100'))
+
+    def test_literal_divisors(self):
+        for op in ('/', '%'):
+            for value, pure in ((3, True), (1, True), (-2, True), (0, False), (-1, False),
+                                (4294967295, False), (4294967296, False), (2147483648, True)):
+                with self.subTest(op=op, value=value):
+                    self.assertEqual(self.is_pure(op, Literal(value, Type.INT)), pure)
+
+    def test_variable_divisor(self):
+        self.assertFalse(self.is_pure('/', 'b'))
+        self.assertFalse(self.is_pure('%', 'b'))
+
+    def test_float_division(self):
+        # f32.div не дает ловушек
+        self.assertTrue(self.is_pure('/', Literal(0.0, Type.FLOAT), dividend='x'))
+        self.assertTrue(self.is_pure('/', 'b', dividend='x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
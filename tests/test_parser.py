@@ -0,0 +1,90 @@
+import io
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from antlr4 import InputStream, CommonTokenStream, BailErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+
+import run
+from ListLangFastLexer import ListLangFastLexer
+
+# Двухэтапный разбор (run.parse_tree): если SLL-проход прерывается, поток перематывается и разбор в режиме LL
+# должен дать то же, что и разбор сразу в LL.
+
+SOURCE = (
+    "func sum(a, b):\n"
+    "    return a + b * 2\n"
+    "\n"
+    "L = []\n"
+    "L.add(1)\n"
+    "for x in L:\n"
+    "    if x > 1 && !(x == 3): write(x)\n"
+    "\n"
+    "    else:\n"
+    "        write(sum(x, L.len()) % 7)\n"
+    "i, j = 0, 1\n"
+    "while i < 10 || j:\n"
+    "    i = i + 1; j = 0\n"
+    "switch i:\n"
+    "    case 1:\n"
+    "        break\n"
+    "    default:\n"
+    "        write(\"done\")\n"
+)
+
+
+class ForcedBail(BailErrorStrategy):
+    """Прерывает SLL-проход на bail_at-м вызове sync — так же, как при конфликте, который SLL не разрешает."""
+
+    bail_at = 1
+    calls = 0
+
+    def sync(self, recognizer):
+        ForcedBail.calls += 1
+        if ForcedBail.calls == self.bail_at:
+            raise ParseCancellationException("forced SLL failure")
+
+
+def token_stream(source):
+    stream = CommonTokenStream(ListLangFastLexer(InputStream(source)))
+    stream.fill()
+    return stream
+
+
+class TwoStageParseTest(unittest.TestCase):
+
+    def test_fallback_after_sll_bail(self):
+        # Корректной программы, на которой SLL-проход прерывается, для этой грамматики не найдено, поэтому сбой
+        # вызывается искусственно: в начале, в середине и в конце разбора (AST, собранный до сбоя, не должен
+        # попасть в результат)
+        for build_tree in (False, True):
+            expected = run.parse_source(SOURCE, two_stage=False, build_tree=build_tree)
+            self.assertIsNotNone(expected)
+            for bail_at in (1, 120, 240):
+                with self.subTest(build_tree=build_tree, bail_at=bail_at), \
+                        mock.patch.object(run, 'BailErrorStrategy', ForcedBail):
+                    ForcedBail.bail_at, ForcedBail.calls = bail_at, 0
+                    ast = run.parse_source(SOURCE, build_tree=build_tree)
+                    self.assertGreaterEqual(ForcedBail.calls, bail_at)
+                    self.assertEqual(repr(ast), repr(expected))
+
+    def test_sll_pass_succeeds(self):
+        stream = token_stream(SOURCE)
+        with mock.patch.object(run, '_new_parser', wraps=run._new_parser) as new_parser:
+            run.parse_tree(stream, build_tree=False)
+        self.assertEqual(new_parser.call_count, 1)
+
+    def test_syntax_error_reported_by_ll_pass(self):
+        source = "x = (1 +\ny = 2\nif x\n    z = 3\n"
+        errors = {}
+        for two_stage in (True, False):
+            with redirect_stderr(io.StringIO()) as stderr:
+                _, parser = run.parse_tree(token_stream(source), two_stage=two_stage, build_tree=False)
+            errors[two_stage] = (parser.getNumberOfSyntaxErrors(), stderr.getvalue())
+        self.assertGreater(errors[True][0], 0)
+        self.assertEqual(errors[True], errors[False])
+
+
+if __name__ == '__main__':
+    unittest.main()